@@ -1,83 +1,85 @@
-import rumps
-import webbrowser
+import argparse
 import threading
-import time
-import json
-from flask import Flask, render_template, jsonify, request, send_from_directory, make_response
+from flask import Flask, request, has_request_context
 from flask_cors import CORS
 from application.logger import setup_logger
+from application.device_watcher import get_device_watcher
+from application.jobs import get_job_queue
+from application.ssh_pool import get_connection_pool
 from application.ssh_manager import SSHManager
-from application.mac_trayicon import TrayApplication
 from backend.routes import setup_routes
-from pathlib import Path
 import os
 import atexit
-import uuid
 
 logger, yubikey_logger = setup_logger()
 
-# Create SSH manager instance
+# One SSH manager shared by the web API and the tray menu
 ssh_manager = SSHManager()
 
-# Global flag for controlling the monitor thread
-monitor_running = True
+frontend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'frontend')
+
+def create_app(manager):
+    """Build the Flask web application around a shared SSHManager"""
+    app = Flask(__name__,
+               static_folder=os.path.join(frontend_dir, 'static'),
+               static_url_path='/static',
+               template_folder=os.path.join(frontend_dir, 'templates'))
+
+    # Allow CORS
+    CORS(app)
+
+    # Setup routes
+    setup_routes(app, manager)
+
+    # Add cleanup endpoint
+    @app.route('/shutdown', methods=['POST'])
+    def shutdown():
+        quit_application()
+        return 'Server shutting down...'
+
+    return app
 
 # Flask web application
-frontend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'frontend')
-app = Flask(__name__, 
-           static_folder=os.path.join(frontend_dir, 'static'),
-           static_url_path='/static',
-           template_folder=os.path.join(frontend_dir, 'templates'))
-
-# Allow CORS
-CORS(app)
-
-# Setup routes
-setup_routes(app)
-
-def yubikey_monitor(ssh_manager):
-    """Background thread to monitor YubiKey status"""
-    global monitor_running
-    prev_status = None
-    while monitor_running:
-        try:
-            current_status = ssh_manager.get_yubikey_status()
-            if current_status != prev_status:
-                yubikey_logger.info(f"YubiKey status changed: {current_status}")
-                prev_status = current_status
-        except Exception as e:
-            yubikey_logger.error(f"Error in YubiKey monitor: {e}")
-        time.sleep(1)
-    yubikey_logger.info("YubiKey monitor thread stopping")
+app = create_app(ssh_manager)
+
+def log_yubikey_change(snapshot):
+    """Log every new YubiKey snapshot published by the watcher"""
+    yubikey_logger.info(f"YubiKey status changed: {ssh_manager.get_yubikey_status()} "
+                        f"(generation {snapshot.generation})")
 
 def run_yubikey_monitor():
-    """Run the YubiKey monitor thread"""
-    monitor_thread = threading.Thread(target=yubikey_monitor, args=(ssh_manager,))
-    monitor_thread.daemon = True  # Make thread a daemon so it exits when main thread exits
-    monitor_thread.start()
-    return monitor_thread
+    """Start the event-driven YubiKey watcher"""
+    watcher = get_device_watcher()
+    watcher.subscribe(log_yubikey_change)
+    watcher.start()
+    return watcher
 
 def cleanup():
     """Cleanup function to handle application shutdown"""
-    global monitor_running
     logger.info("Starting cleanup process...")
-    
-    # Stop the YubiKey monitor thread
-    monitor_running = False
-    
+
+    # Stop the YubiKey watcher
+    get_device_watcher().stop()
+
+    # Stop background job workers
+    get_job_queue().shutdown()
+
+    # Close pooled SSH connections
+    get_connection_pool().close_all()
+
     # Stop Flask server
-    func = request.environ.get('werkzeug.server.shutdown')
+    func = request.environ.get('werkzeug.server.shutdown') if has_request_context() else None
     if func is not None:
         logger.info("Shutting down Flask server...")
         func()
-    
+
     # Clean up any remaining resources
     try:
         import multiprocessing.resource_tracker
         multiprocessing.resource_tracker._resource_tracker.clear()
     except Exception as e:
         logger.error(f"Error cleaning up resources: {e}")
-    
+
     logger.info("Cleanup complete")
 
 def quit_application():
@@ -86,47 +88,51 @@ def quit_application():
     # Force exit after cleanup
     os._exit(0)
 
-def run_app():
+def run_app(host='0.0.0.0', port=5001):
     """Run the Flask application"""
-    app = Flask(__name__,
-                template_folder='frontend/templates',
-                static_folder='frontend/static')
-    setup_routes(app)
-    
-    # Add cleanup endpoint
-    @app.route('/shutdown', methods=['POST'])
-    def shutdown():
-        quit_application()
-        return 'Server shutting down...'
-    
-    app.run(host='0.0.0.0', port=5001, debug=True, use_reloader=False)
+    app.run(host=host, port=port, debug=True, use_reloader=False)
 
 def run_tray():
     """Run the tray application"""
-    app = TrayApplication(quit_callback=quit_application)
-    app.run()
+    # rumps is only needed (and only available) for the macOS menu bar
+    from application.mac_trayicon import TrayApplication
+
+    tray = TrayApplication(quit_callback=quit_application, ssh_manager=ssh_manager)
+    tray.run()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="YubiKey SSH Manager")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--no-tray', action='store_true',
+                        help="serve the web interface only, without the menu bar icon")
+    return parser.parse_args()
 
 if __name__ == "__main__":
+    args = parse_args()
     try:
         # Create necessary directories
         os.makedirs('keys', exist_ok=True)
-        
-        # Start YubiKey monitor in a separate thread
-        monitor_thread = run_yubikey_monitor()
-        
+
         # Register cleanup function to run at exit
         atexit.register(cleanup)
-        
-        # Start Flask in a separate thread
-        flask_thread = threading.Thread(target=run_app)
+
+        # Start Flask first so the web interface answers while devices are enumerated
+        flask_thread = threading.Thread(target=run_app, args=(args.host, args.port), name='flask-server')
         flask_thread.daemon = True
         flask_thread.start()
         logger.info("Flask server started")
-        
-        # Run the tray application in the main thread
-        logger.info("Starting tray application")
-        run_tray()
-        
+
+        # Start the YubiKey watcher
+        run_yubikey_monitor()
+
+        if args.no_tray:
+            flask_thread.join()
+        else:
+            # Run the tray application in the main thread
+            logger.info("Starting tray application")
+            run_tray()
+
     except KeyboardInterrupt:
         logger.info("Received keyboard interrupt, shutting down...")
         quit_application()
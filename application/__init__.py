@@ -1,5 +1,17 @@
-from .logger import setup_logger
-from .ssh_manager import SSHManager
-from .mac_trayicon import TrayApplication
-
 __all__ = ['setup_logger', 'SSHManager', 'TrayApplication']
+
+# Exported names and the submodules that define them. They are imported on
+# first access, so importing any submodule doesn't also load rumps and the
+# SSH and YubiKey libraries.
+_EXPORTS = {
+    'setup_logger': '.logger',
+    'SSHManager': '.ssh_manager',
+    'TrayApplication': '.mac_trayicon',
+}
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    return getattr(import_module(_EXPORTS[name], __name__), name)
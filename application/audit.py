@@ -0,0 +1,105 @@
+"""Audit of ~/.ssh/authorized_keys across the fleet.
+
+Each server's authorized_keys is read over SFTP and its key fingerprints
+matched against the cached public keys of known YubiKeys. Fingerprints
+are remembered per server with the file's size and mtime in
+audit_state.json, so a later audit only downloads files that changed.
+"""
+import os
+import json
+import errno
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .remote_keys import authorized_key_fingerprints
+
+AUTHORIZED_KEYS_PATH = '.ssh/authorized_keys'
+STATE_FILENAME = 'audit_state.json'
+
+logger = logging.getLogger(__name__)
+
+
+def _target(server: Dict) -> List:
+    return [str(server.get('hostname', '')), int(server.get('port') or 22), str(server.get('username', ''))]
+
+
+class AuditState:
+    """Per-server authorized_keys size, mtime and fingerprints from the last audit."""
+
+    def __init__(self, app_dir: Path):
+        self.logger = logging.getLogger(__name__)
+        self.path = Path(app_dir) / STATE_FILENAME
+        self._lock = threading.Lock()
+        self._entries: Optional[Dict[str, Dict]] = None
+
+    def _load(self) -> Dict[str, Dict]:
+        if self._entries is None:
+            try:
+                self._entries = json.loads(self.path.read_text())
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def unchanged(self, server: Dict, size: Optional[int], mtime: Optional[int]) -> Optional[List[str]]:
+        """Fingerprints from the last audit if the file (and server address) are the same."""
+        with self._lock:
+            entry = self._load().get(server['id'])
+        if entry and entry['target'] == _target(server) and entry['size'] == size and entry['mtime'] == mtime:
+            return entry['fingerprints']
+        return None
+
+    def record(self, server: Dict, size: Optional[int], mtime: Optional[int], fingerprints: List[str]):
+        with self._lock:
+            self._load()[server['id']] = {'target': _target(server), 'size': size, 'mtime': mtime,
+                                          'fingerprints': fingerprints}
+
+    def save(self):
+        with self._lock:
+            if self._entries is None:
+                return
+            tmp = self.path.with_suffix('.tmp')
+            try:
+                tmp.write_text(json.dumps(self._entries))
+                os.replace(tmp, self.path)
+            except OSError as e:
+                self.logger.error(f"Could not save audit state to {self.path}: {e}")
+
+
+def read_authorized_keys(client, state: AuditState, server: Dict, full: bool = False) -> Dict:
+    """Fingerprints in a server's authorized_keys; skips the download when size and mtime match."""
+    sftp = client.open_sftp()
+    try:
+        try:
+            attributes = sftp.stat(AUTHORIZED_KEYS_PATH)
+        except IOError as e:
+            if getattr(e, 'errno', None) != errno.ENOENT:
+                raise
+            # No authorized_keys at all: nothing is authorized
+            state.record(server, None, None, [])
+            return {"fingerprints": [], "cached": False, "exists": False}
+
+        size, mtime = attributes.st_size, attributes.st_mtime
+        if not full:
+            fingerprints = state.unchanged(server, size, mtime)
+            if fingerprints is not None:
+                return {"fingerprints": fingerprints, "cached": True, "exists": True}
+
+        with sftp.open(AUTHORIZED_KEYS_PATH, 'r') as remote_file:
+            text = remote_file.read().decode('utf-8', 'replace')
+        fingerprints = authorized_key_fingerprints(text)
+        state.record(server, size, mtime, fingerprints)
+        return {"fingerprints": fingerprints, "cached": False, "exists": True}
+    finally:
+        sftp.close()
+
+
+def reconcile_serials(current: List[str], matched: List[str], known_serials: set) -> List[str]:
+    """New yubikey_serials for a server.
+
+    Serials whose keys we know are set from what the file contains; serials
+    we have no cached key for can't be checked and are kept as they are.
+    """
+    serials = [serial for serial in current if serial not in known_serials or serial in matched]
+    return serials + [serial for serial in dict.fromkeys(matched) if serial not in serials]
@@ -0,0 +1,325 @@
+import os
+import sys
+import time
+import socket
+import select
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .metrics import YUBIKEY_ENUMERATION_SECONDS, YUBIKEYS_CONNECTED
+
+logger = logging.getLogger(__name__)
+
+YUBICO_USB_VENDOR = '1050'
+NETLINK_KOBJECT_UEVENT = 15
+
+
+def enumerate_yubikeys() -> List[Dict]:
+    """List connected YubiKeys as plain dicts (one full USB/PCSC enumeration)."""
+    from ykman.device import list_all_devices
+
+    with YUBIKEY_ENUMERATION_SECONDS.time():
+        devices = list_all_devices()
+    yubikeys = []
+    for _, info in devices:
+        yubikeys.append({
+            'serial': str(info.serial),
+            'version': '.'.join(str(x) for x in info.version)
+        })
+    YUBIKEYS_CONNECTED.set(len(yubikeys))
+    return yubikeys
+
+
+class DeviceSnapshot:
+    """The set of connected YubiKeys as of one enumeration.
+
+    ``generation`` increases every time the set changes, so subscribers can
+    tell whether they have already seen a snapshot.
+    """
+
+    __slots__ = ('generation', 'devices', 'error', 'timestamp')
+
+    def __init__(self, generation: int, devices: Tuple[Dict, ...], error: Optional[str] = None):
+        self.generation = generation
+        self.devices = devices
+        self.error = error
+        self.timestamp = time.time()
+
+    def to_dict(self) -> Dict:
+        return {
+            'generation': self.generation,
+            'devices': list(self.devices),
+            'error': self.error,
+            'timestamp': self.timestamp
+        }
+
+
+class PollingEventSource:
+    """Wakes the watcher on an adaptive interval.
+
+    The interval starts at ``min_interval`` and is multiplied by ``backoff``
+    after every scan that finds no change. While a client is waiting on the
+    watcher it is capped at ``max_interval``, which keeps hotplug detection on
+    platforms without udev (macOS) within the old fixed tick; with nobody
+    waiting it keeps backing off up to ``idle_interval``. A change, or a call
+    to notify(), resets it.
+    """
+
+    def __init__(self, min_interval: float = 0.5, max_interval: float = 1.0,
+                 idle_interval: float = 30.0, backoff: float = 1.5):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.idle_interval = idle_interval
+        self.backoff = backoff
+        self.interval = min_interval
+        self._wake = threading.Event()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the next scan is due; True means something asked for a scan."""
+        delay = self.interval if timeout is None else min(self.interval, timeout)
+        woken = self._wake.wait(delay)
+        self._wake.clear()
+        return woken
+
+    def changed(self, changed: bool, active: bool = True):
+        """Feed back whether the last scan found a change and whether anyone is waiting."""
+        if changed:
+            self.interval = self.min_interval
+        else:
+            limit = self.max_interval if active else self.idle_interval
+            self.interval = min(self.interval * self.backoff, limit)
+
+    def demand(self):
+        """A client started waiting: if idling past max_interval, scan now and tighten up."""
+        if self.interval > self.max_interval:
+            self.interval = self.max_interval
+            self._wake.set()
+
+    def notify(self):
+        """Request a scan now and drop back to the fastest interval."""
+        self.interval = self.min_interval
+        self._wake.set()
+
+    def close(self):
+        self._wake.set()
+
+
+class UdevEventSource:
+    """Kernel uevents over netlink (Linux only).
+
+    The watcher only rescans when a Yubico USB device is added or removed,
+    so enumeration drops to near zero while the device set is stable.
+    """
+
+    # Give PCSC a moment to pick up a freshly attached reader
+    settle_delay = 0.3
+
+    @classmethod
+    def available(cls) -> bool:
+        return sys.platform.startswith('linux') and hasattr(socket, 'AF_NETLINK')
+
+    def __init__(self):
+        self._sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+        self._sock.bind((0, 1))  # multicast group 1: kernel events
+        self._wake_r, self._wake_w = os.pipe()
+
+    @staticmethod
+    def is_yubikey_event(message: bytes) -> bool:
+        fields = {}
+        for part in message.split(b'\0'):
+            key, sep, value = part.partition(b'=')
+            if sep:
+                fields[key.decode(errors='replace')] = value.decode(errors='replace')
+        return (
+            fields.get('SUBSYSTEM') == 'usb'
+            and fields.get('ACTION') in ('add', 'remove', 'bind', 'unbind')
+            and fields.get('PRODUCT', '').startswith(YUBICO_USB_VENDOR + '/')
+        )
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        relevant = False
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if relevant:
+                # Swallow the rest of the burst a plug/unplug generates
+                remaining = self.settle_delay
+            readable, _, _ = select.select([self._sock, self._wake_r], [], [], remaining)
+            if not readable:
+                return relevant
+            if self._wake_r in readable:
+                os.read(self._wake_r, 512)
+                return True
+            if self.is_yubikey_event(self._sock.recv(65536)):
+                relevant = True
+
+    def changed(self, changed: bool, active: bool = True):
+        pass
+
+    def demand(self):
+        pass
+
+    def notify(self):
+        os.write(self._wake_w, b'\0')
+
+    def close(self):
+        self.notify()
+        self._sock.close()
+
+
+def default_event_source():
+    """udev on Linux, adaptive polling everywhere else."""
+    if UdevEventSource.available():
+        try:
+            return UdevEventSource()
+        except OSError as e:
+            logger.warning(f"udev events unavailable, falling back to polling: {e}")
+    return PollingEventSource()
+
+
+class DeviceWatcher:
+    """Background watcher that publishes versioned YubiKey snapshots.
+
+    Both the enumeration function and the event source can be injected,
+    which is how a simulated device feed is plugged in for testing.
+    """
+
+    # How long a poke() keeps the watcher on its short polling interval
+    active_window = 10.0
+
+    def __init__(self, enumerate_devices: Callable[[], List[Dict]] = enumerate_yubikeys,
+                 event_source=None, rescan_interval: float = 60.0):
+        self.enumerate_devices = enumerate_devices
+        self.event_source = event_source
+        self.rescan_interval = rescan_interval
+        self._condition = threading.Condition()
+        self._snapshot = DeviceSnapshot(0, ())
+        self._subscribers: List[Callable[[DeviceSnapshot], None]] = []
+        self._thread = None
+        self._running = False
+        self._start_lock = threading.Lock()
+        self._waiters = 0
+        self._active_until = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def active(self) -> bool:
+        """Whether anyone is waiting on changes or has poked the watcher recently."""
+        return self._waiters > 0 or time.monotonic() < self._active_until
+
+    def start(self):
+        """Take an initial snapshot and start watching for changes."""
+        # app.py and the first API request may both try to start the watcher
+        with self._start_lock:
+            if self._running:
+                return
+            if self.event_source is None:
+                self.event_source = default_event_source()
+            self.refresh()
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name='yubikey-watcher', daemon=True)
+            self._thread.start()
+        logger.info(f"YubiKey watcher started ({type(self.event_source).__name__})")
+
+    def stop(self):
+        self._running = False
+        if self.event_source is not None:
+            self.event_source.close()
+        with self._condition:
+            self._condition.notify_all()
+
+    def _run(self):
+        while self._running:
+            try:
+                self.event_source.wait(self.rescan_interval)
+                if not self._running:
+                    break
+                changed = self.refresh()
+                self.event_source.changed(changed, self.active())
+            except Exception:
+                logger.exception("Error in YubiKey watcher")
+                time.sleep(1)
+        logger.info("YubiKey watcher stopping")
+
+    def refresh(self) -> bool:
+        """Enumerate now and publish a new snapshot if anything changed."""
+        try:
+            devices = tuple(sorted(self.enumerate_devices(), key=lambda d: d['serial']))
+            error = None
+        except Exception as e:
+            logger.warning(f"Error enumerating YubiKeys: {e}")
+            devices, error = (), str(e)
+
+        with self._condition:
+            current = self._snapshot
+            if devices == current.devices and error == current.error and current.generation:
+                return False
+            snapshot = DeviceSnapshot(current.generation + 1, devices, error)
+            self._snapshot = snapshot
+            self._condition.notify_all()
+            subscribers = list(self._subscribers)
+
+        for callback in subscribers:
+            try:
+                callback(snapshot)
+            except Exception:
+                logger.exception("Error in YubiKey watcher subscriber")
+        return True
+
+    def snapshot(self) -> DeviceSnapshot:
+        """The latest published snapshot (no enumeration)."""
+        return self._snapshot
+
+    def poke(self):
+        """Ask for a prompt rescan, e.g. when a user is actively waiting."""
+        self._active_until = time.monotonic() + self.active_window
+        if self.event_source is not None:
+            self.event_source.notify()
+
+    def subscribe(self, callback: Callable[[DeviceSnapshot], None]) -> Callable[[], None]:
+        """Call callback with every new snapshot; returns an unsubscribe function."""
+        with self._condition:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._condition:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def wait_for_change(self, generation: int, timeout: Optional[float] = None) -> DeviceSnapshot:
+        """Block until a snapshot newer than ``generation`` exists or timeout expires."""
+        with self._condition:
+            self._waiters += 1
+            if self.event_source is not None:
+                self.event_source.demand()
+            try:
+                self._condition.wait_for(
+                    lambda: self._snapshot.generation > generation or not self._running,
+                    timeout
+                )
+                return self._snapshot
+            finally:
+                self._waiters -= 1
+
+
+_watcher: Optional[DeviceWatcher] = None
+_watcher_lock = threading.Lock()
+
+
+def get_device_watcher() -> DeviceWatcher:
+    """The process-wide watcher (created on first use, not started)."""
+    global _watcher
+    with _watcher_lock:
+        if _watcher is None:
+            _watcher = DeviceWatcher()
+        return _watcher
+
+
+def running_watcher() -> Optional[DeviceWatcher]:
+    """The process-wide watcher if it has been started, else None."""
+    watcher = _watcher
+    return watcher if watcher is not None and watcher.running else None
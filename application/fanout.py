@@ -0,0 +1,141 @@
+"""Run one command on many servers and stream its output as it arrives.
+
+Each host's command runs on its own SSH channel. stdout and stderr are
+split into lines and handed to a shared queue tagged with the host, so
+the caller sees the output of all hosts interleaved in arrival order.
+Hosts run on a bounded pool (see fleet.run_parallel); a per-host
+timeout closes the channel of a command that runs too long.
+"""
+import time
+import queue
+import select
+import logging
+import threading
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+from .fleet import DEFAULT_CONCURRENCY, run_parallel
+
+# Longer lines are cut into pieces of this size, so one chatty host can't exhaust memory
+MAX_LINE_BYTES = 64 * 1024
+RECV_BYTES = 32 * 1024
+# Output lines waiting for a slow reader; workers block (and so do their commands) beyond this
+QUEUE_SIZE = 10000
+
+logger = logging.getLogger(__name__)
+
+
+class _LineSplitter:
+    """Turns chunks of one stream into complete lines."""
+
+    def __init__(self, stream: str, on_line: Callable[[str, str], None]):
+        self.stream = stream
+        self.on_line = on_line
+        self.buffer = b''
+
+    def feed(self, data: bytes):
+        self.buffer += data
+        *lines, self.buffer = self.buffer.split(b'\n')
+        for line in lines:
+            self._emit(line)
+        while len(self.buffer) > MAX_LINE_BYTES:
+            self._emit(self.buffer[:MAX_LINE_BYTES])
+            self.buffer = self.buffer[MAX_LINE_BYTES:]
+
+    def flush(self):
+        if self.buffer:
+            self._emit(self.buffer)
+            self.buffer = b''
+
+    def _emit(self, line: bytes):
+        line = line.rstrip(b'\r')
+        for start in range(0, max(len(line), 1), MAX_LINE_BYTES):
+            self.on_line(self.stream, line[start:start + MAX_LINE_BYTES].decode('utf-8', 'replace'))
+
+
+def exec_streaming(client, command: str, timeout: float, on_line: Callable[[str, str], None],
+                   cancelled: Optional[threading.Event] = None) -> Dict:
+    """Run a command on a connected client, calling on_line(stream, line) as output arrives.
+
+    Returns the exit code (None if the command didn't finish) and whether
+    it ran into the timeout. Never waits longer than ``timeout`` seconds.
+    """
+    deadline = time.monotonic() + timeout
+    channel = client.get_transport().open_session(timeout=timeout)
+    try:
+        channel.exec_command(command)
+        stdout = _LineSplitter('stdout', on_line)
+        stderr = _LineSplitter('stderr', on_line)
+        timed_out = False
+        while True:
+            # The channel's fileno becomes readable for stdout, stderr and close alike
+            while channel.recv_ready():
+                stdout.feed(channel.recv(RECV_BYTES))
+            while channel.recv_stderr_ready():
+                stderr.feed(channel.recv_stderr(RECV_BYTES))
+            if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (cancelled is not None and cancelled.is_set()):
+                timed_out = remaining <= 0
+                break
+            select.select([channel], [], [], min(remaining, 0.5))
+        stdout.flush()
+        stderr.flush()
+        exit_code = None if timed_out or not channel.exit_status_ready() else channel.recv_exit_status()
+        return {"exit_code": exit_code, "timed_out": timed_out}
+    finally:
+        # Closing the channel also ends a command that is still running (it gets SIGPIPE/EOF)
+        channel.close()
+
+
+def fan_out(servers: Iterable[Dict], run_host: Callable, concurrency: int = DEFAULT_CONCURRENCY,
+            thread_name_prefix: str = 'fanout') -> Iterator[Dict]:
+    """Run run_host(server, on_line, cancelled) over servers, yielding events as they happen.
+
+    Yields ``{"server": server, "stream": ..., "line": ...}`` for every line
+    of output and ``{"server": server, "result": ...}`` when a host finishes
+    (the result is an Exception if run_host raised). Closing the generator
+    early cancels the hosts still running.
+    """
+    events: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+    cancelled = threading.Event()
+    finished = object()
+
+    def put(event):
+        while not cancelled.is_set():
+            try:
+                events.put(event, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def run(server):
+        return run_host(server, lambda stream, line: put({"server": server, "stream": stream, "line": line}),
+                        cancelled)
+
+    def produce():
+        results = run_parallel(servers, run, concurrency, thread_name_prefix=thread_name_prefix)
+        try:
+            for server, result in results:
+                if cancelled.is_set():
+                    break
+                put({"server": server, "result": result})
+        except Exception as e:
+            logger.exception("Command fan-out failed")
+            put({"error": e})
+        finally:
+            results.close()
+            put(finished)
+
+    producer = threading.Thread(target=produce, name=f'{thread_name_prefix}-producer', daemon=True)
+    producer.start()
+    try:
+        while True:
+            event = events.get()
+            if event is finished:
+                break
+            if "error" in event:
+                raise event["error"]
+            yield event
+    finally:
+        cancelled.set()
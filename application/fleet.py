@@ -0,0 +1,87 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 8
+MAX_CONCURRENCY = 64
+
+
+def clamp_concurrency(concurrency: Optional[int]) -> int:
+    """Keep a caller-supplied worker count within sane bounds."""
+    try:
+        concurrency = int(concurrency) if concurrency else DEFAULT_CONCURRENCY
+    except (TypeError, ValueError):
+        concurrency = DEFAULT_CONCURRENCY
+    return max(1, min(concurrency, MAX_CONCURRENCY))
+
+
+def run_parallel(items: Iterable, func: Callable, concurrency: int = DEFAULT_CONCURRENCY,
+                 thread_name_prefix: str = 'fleet') -> Iterator[Tuple[object, object]]:
+    """Run func over items on a bounded pool, yielding (item, result) as each finishes.
+
+    At most ``concurrency`` items are in flight at once, so memory stays flat
+    for large selections. Exceptions raised by func are yielded as the result.
+    Closing the generator early cancels work that has not started yet.
+    """
+    concurrency = clamp_concurrency(concurrency)
+    items = iter(items)
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=thread_name_prefix)
+    pending = {}
+    try:
+        for item in items:
+            pending[executor.submit(func, item)] = item
+            if len(pending) >= concurrency:
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.exception("Fleet task failed")
+                    result = e
+                # Top the window back up before handing the result out
+                for next_item in items:
+                    pending[executor.submit(func, next_item)] = next_item
+                    break
+                yield item, result
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def select_servers(ssh_manager, server_ids: Optional[List[str]] = None,
+                   selector: Optional[Dict] = None) -> List[Dict]:
+    """Resolve an explicit id list or a selector dict to server records.
+
+    Supported selector keys: ``all`` (bool), ``hostname``, ``yubikey_serial``
+    (servers the key is authorized on) and ``without_yubikey_serial``
+    (servers the key is not authorized on yet). Keys are combined with AND.
+    """
+    if server_ids:
+        servers = []
+        for server_id in server_ids:
+            server = ssh_manager.get_server(server_id)
+            if server is not None:
+                servers.append(server)
+        return servers
+
+    selector = selector or {}
+    if 'yubikey_serial' in selector:
+        servers = ssh_manager.get_servers_for_yubikey(str(selector['yubikey_serial']))
+    elif 'hostname' in selector:
+        servers = ssh_manager.get_servers_by_hostname(selector['hostname'])
+    elif selector.get('all') or 'without_yubikey_serial' in selector:
+        servers = ssh_manager.get_servers()
+    else:
+        return []
+
+    if 'hostname' in selector:
+        hostname = str(selector['hostname']).lower()
+        servers = [s for s in servers if str(s.get('hostname', '')).lower() == hostname]
+    if 'without_yubikey_serial' in selector:
+        serial = str(selector['without_yubikey_serial'])
+        servers = [s for s in servers if serial not in s.get('yubikey_serials', [])]
+    return servers
@@ -0,0 +1,193 @@
+import time
+import uuid
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job at its next step once cancellation is requested."""
+
+
+class Job:
+    """One unit of background work, with per-step timings and a result."""
+
+    def __init__(self, kind: str, func: Callable[['Job'], Dict], description: Optional[Dict] = None):
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.func = func
+        # Shown to API clients, so it must never hold secrets
+        self.description = description or {}
+        self.state = QUEUED
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.steps: List[Dict] = []
+        self.result = None
+        self._cancel = threading.Event()
+        self._step_started = None
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def step(self, name: str, cancellable: bool = True):
+        """Mark the start of a named step; raises JobCancelled if cancelled.
+
+        Steps that must run once an earlier one has had its side effect
+        (e.g. recording what was just installed) pass ``cancellable=False``.
+        """
+        self._finish_step()
+        if cancellable and self.cancel_requested:
+            raise JobCancelled()
+        self._step_started = time.monotonic()
+        self.steps.append({"name": name, "started_at": time.time(), "duration": None})
+
+    def _finish_step(self):
+        if self._step_started is not None and self.steps:
+            self.steps[-1]["duration"] = round(time.monotonic() - self._step_started, 4)
+            self._step_started = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "state": self.state,
+            "description": self.description,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "steps": list(self.steps),
+            "result": self.result
+        }
+
+
+class JobQueue:
+    """Bounded queue of background jobs served by a small worker pool.
+
+    submit() raises QueueFullError once ``max_queued`` jobs are waiting,
+    which callers turn into backpressure (HTTP 429). Only the most recent
+    ``retain`` finished jobs are kept for inspection.
+    """
+
+    def __init__(self, workers: int = 4, max_queued: int = 32, retain: int = 200):
+        self.workers = workers
+        self.retain = retain
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs: 'OrderedDict[str, Job]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._running = False
+
+    def _start_workers(self):
+        with self._lock:
+            if self._running:
+                return
+            self._running = True
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, kind: str, func: Callable[[Job], Dict], description: Optional[Dict] = None) -> Job:
+        """Queue func(job) to run in the background."""
+        self._start_workers()
+        job = Job(kind, func, description)
+        with self._lock:
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFullError("Too many queued jobs, try again later")
+            self._jobs[job.id] = job
+            self._prune()
+        logger.info(f"Queued {kind} job {job.id}")
+        return job
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.state in FINISHED_STATES]
+        for job_id in finished[:max(0, len(finished) - self.retain)]:
+            del self._jobs[job_id]
+
+    def _work(self):
+        while self._running:
+            job = self._queue.get()
+            if job is None:
+                break
+            if job.cancel_requested:
+                job.state = CANCELLED
+                job.finished_at = time.time()
+                job.func = None
+                continue
+            job.state = RUNNING
+            job.started_at = time.time()
+            try:
+                job.result = job.func(job)
+                job.state = SUCCEEDED if (job.result or {}).get("success", True) else FAILED
+            except JobCancelled:
+                job.state = CANCELLED
+                job.result = {"success": False, "message": "Job cancelled"}
+            except Exception as e:
+                logger.exception(f"Job {job.id} failed")
+                job.state = FAILED
+                job.result = {"success": False, "message": str(e)}
+            finally:
+                job._finish_step()
+                # The closure may hold credentials (SSH password, PIN); finished jobs are retained
+                job.func = None
+                job.finished_at = time.time()
+                logger.info(f"{job.kind} job {job.id} {job.state}")
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, state: Optional[str] = None) -> List[Job]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        if state:
+            jobs = [job for job in jobs if job.state == state]
+        return jobs
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued job, or stop a running one at its next step."""
+        job = self.get(job_id)
+        if job is None or job.state in FINISHED_STATES:
+            return False
+        job._cancel.set()
+        return True
+
+    def shutdown(self):
+        self._running = False
+        for _ in self._threads:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                break
+
+
+_job_queue: Optional[JobQueue] = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """The process-wide background job queue."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue()
+        return _job_queue
@@ -0,0 +1,101 @@
+import base64
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+DEFAULT_SLOT = '9a'
+
+
+def public_key_to_openssh(public_key) -> str:
+    """Serialize a cryptography public key object as an OpenSSH public key line."""
+    from cryptography.hazmat.primitives import serialization
+
+    return public_key.public_bytes(
+        serialization.Encoding.OpenSSH,
+        serialization.PublicFormat.OpenSSH
+    ).decode()
+
+
+def openssh_fingerprint(openssh_key: str) -> str:
+    """SHA256 fingerprint of an OpenSSH public key, as printed by ssh-keygen -l."""
+    blob = base64.b64decode(openssh_key.split()[1])
+    digest = hashlib.sha256(blob).digest()
+    return 'SHA256:' + base64.b64encode(digest).decode().rstrip('=')
+
+
+class PublicKeyCache:
+    """OpenSSH public keys of known YubiKeys, cached under keys_dir.
+
+    Files are named ``yubikey_<serial>_<slot>_<fingerprint>.pub``; putting
+    a key whose fingerprint differs (it was regenerated on the device)
+    replaces the stale entry. Callers that have the device at hand compare
+    against it, since the cache alone can't tell that a key changed. The
+    ``yubikey_<serial>_pub.txt`` files written by key generation are picked
+    up as slot 9a keys.
+    """
+
+    def __init__(self, keys_dir: Path):
+        self.logger = logging.getLogger(__name__)
+        self.keys_dir = Path(keys_dir)
+        self._lock = threading.Lock()
+        self._keys: Dict[tuple, str] = {}
+
+    @staticmethod
+    def _file_fingerprint(fingerprint: str) -> str:
+        # Base64 fingerprints may contain '/', which can't go in a file name
+        return fingerprint.split(':', 1)[-1].replace('/', '_').replace('+', '-')
+
+    def get(self, serial: str, slot: str = DEFAULT_SLOT) -> Optional[str]:
+        """Get the last OpenSSH key seen for a YubiKey slot, if known."""
+        key = (str(serial), slot)
+        with self._lock:
+            if key in self._keys:
+                return self._keys[key]
+            candidates = sorted(
+                self.keys_dir.glob(f"yubikey_{serial}_{slot}_*.pub"),
+                key=lambda p: p.stat().st_mtime,
+                reverse=True
+            )
+            if not candidates and slot == DEFAULT_SLOT:
+                legacy = self.keys_dir / f"yubikey_{serial}_pub.txt"
+                candidates = [legacy] if legacy.exists() else []
+            if not candidates:
+                return None
+            public_key = candidates[0].read_text().strip()
+            self._keys[key] = public_key
+            return public_key
+
+    def put(self, serial: str, public_key: str, slot: str = DEFAULT_SLOT) -> str:
+        """Cache a key for a YubiKey slot and return its fingerprint."""
+        fingerprint = openssh_fingerprint(public_key)
+        key_file = self.keys_dir / f"yubikey_{serial}_{slot}_{self._file_fingerprint(fingerprint)}.pub"
+        with self._lock:
+            for stale in self.keys_dir.glob(f"yubikey_{serial}_{slot}_*.pub"):
+                if stale != key_file:
+                    self.logger.debug(f"Removing stale cached key {stale}")
+                    stale.unlink()
+            key_file.write_text(public_key + '\n')
+            self._keys[(str(serial), slot)] = public_key
+        return fingerprint
+
+    def fingerprints(self) -> Dict[str, str]:
+        """Map the fingerprint of every cached key to its YubiKey serial."""
+        known = {}
+        with self._lock:
+            paths = list(self.keys_dir.glob("yubikey_*_pub.txt")) + list(self.keys_dir.glob("yubikey_*_*_*.pub"))
+        for path in paths:
+            serial = path.name.split('_')[1]
+            try:
+                known[openssh_fingerprint(path.read_text().strip())] = serial
+            except (OSError, ValueError, IndexError):
+                self.logger.warning(f"Ignoring unreadable cached key {path}")
+        return known
+
+    def invalidate(self, serial: str, slot: str = DEFAULT_SLOT):
+        """Forget the cached key for a YubiKey slot."""
+        with self._lock:
+            self._keys.pop((str(serial), slot), None)
+            for stale in self.keys_dir.glob(f"yubikey_{serial}_{slot}_*.pub"):
+                stale.unlink()
@@ -8,9 +8,10 @@ logger, yubikey_logger = setup_logger()
 
 class TrayApplication(rumps.App):
     """macOS tray application"""
-    def __init__(self, quit_callback=None):
+    def __init__(self, quit_callback=None, ssh_manager=None):
         super().__init__("YubiKey SSH Manager", "🔐")
-        self.ssh_manager = SSHManager()  # Create a new instance
+        # Share the web server's manager when one is passed in
+        self.ssh_manager = ssh_manager if ssh_manager is not None else SSHManager()
         
         # Create Connect menu with initial submenu
         connect_menu = rumps.MenuItem("Connect")
@@ -33,6 +34,7 @@ class TrayApplication(rumps.App):
         ]
         
         # Start timers to update menus periodically
+        self._yubikey_menu_state = None
         self.server_timer = rumps.Timer(self.update_server_menu, 5)
         self.server_timer.start()
         self.yubikey_timer = rumps.Timer(self.update_yubikey_menu, 2)
@@ -138,6 +140,15 @@ class TrayApplication(rumps.App):
             if yubikey_menu is None:
                 return
             
+            # Skip the rebuild while neither the devices nor the selection changed
+            menu_state = (
+                [yk['serial'] for yk in self.ssh_manager.get_yubikeys()],
+                self.ssh_manager.get_selected_yubikey()
+            )
+            if menu_state == self._yubikey_menu_state:
+                return
+            self._yubikey_menu_state = menu_state
+            
             # Get new items
             new_items = self.create_yubikey_submenu()
             
@@ -0,0 +1,246 @@
+import math
+import time
+import threading
+from contextlib import ContextDecorator
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_registry: List['_Metric'] = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """A named family of samples keyed by label values."""
+
+    kind = ''
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple, object] = {}
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels: Dict) -> Tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """A monotonically increasing count."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        if not self.labelnames:
+            # Export 0 rather than nothing before the first increment
+            self._values[()] = 0
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}' for key, value in items]
+
+
+class Gauge(Counter):
+    """A value that can go up and down, optionally computed when scraped."""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function: Callable[[], float]):
+        """Read the (unlabelled) value from function at scrape time."""
+        self._function = function
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            try:
+                self.set(self._function())
+            except Exception:
+                pass
+        return super()._samples()
+
+
+class _Timer(ContextDecorator):
+    def __init__(self, histogram: 'Histogram', labels: Dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def _recreate_cm(self):
+        # A fresh timer per decorated call, so concurrent calls don't share a start time
+        return _Timer(self.histogram, self.labels)
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        if exc_type is not None and self.histogram.errors is not None:
+            self.histogram.errors.inc(**self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative latency buckets.
+
+    If ``errors`` is given, time() also counts blocks that raised into it;
+    it must take the same labels.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, errors: Optional[Counter] = None):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.errors = errors
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels) -> _Timer:
+        """Time a block (or, used as a decorator, every call of a function)."""
+        return _Timer(self, labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, ([*state[0]], state[1], state[2])) for key, state in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry)
+    return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'yubikey_ssh_manager_http_request_seconds', "Time spent handling API requests.",
+    ('method', 'route', 'status')
+)
+
+YUBIKEY_ENUMERATION_ERRORS = Counter(
+    'yubikey_ssh_manager_yubikey_enumeration_errors_total', "YubiKey enumerations that failed."
+)
+YUBIKEY_ENUMERATION_SECONDS = Histogram(
+    'yubikey_ssh_manager_yubikey_enumeration_seconds', "Time spent enumerating YubiKeys over USB/PCSC.",
+    errors=YUBIKEY_ENUMERATION_ERRORS
+)
+YUBIKEYS_CONNECTED = Gauge(
+    'yubikey_ssh_manager_yubikeys_connected', "YubiKeys found by the most recent enumeration."
+)
+
+PIV_OPERATION_ERRORS = Counter(
+    'yubikey_ssh_manager_piv_operation_errors_total', "PIV operations that failed.", ('operation',)
+)
+PIV_OPERATION_SECONDS = Histogram(
+    'yubikey_ssh_manager_piv_operation_seconds', "Time spent in PIV sessions on a YubiKey.",
+    ('operation',), errors=PIV_OPERATION_ERRORS
+)
+
+SSH_CONNECT_ERRORS = Counter(
+    'yubikey_ssh_manager_ssh_connect_errors_total', "SSH connections that failed to connect or authenticate."
+)
+SSH_CONNECT_SECONDS = Histogram(
+    'yubikey_ssh_manager_ssh_connect_seconds', "Time spent opening and authenticating SSH connections.",
+    errors=SSH_CONNECT_ERRORS
+)
+SSH_CONNECTIONS = Counter(
+    'yubikey_ssh_manager_ssh_connections_total', "SSH connections checked out of the pool.", ('result',)
+)
+
+INVENTORY_IO_ERRORS = Counter(
+    'yubikey_ssh_manager_inventory_io_errors_total', "Inventory reads and writes that failed.",
+    ('backend', 'operation')
+)
+INVENTORY_IO_SECONDS = Histogram(
+    'yubikey_ssh_manager_inventory_io_seconds', "Time spent reading, parsing and writing the inventory.",
+    ('backend', 'operation'), errors=INVENTORY_IO_ERRORS
+)
+INVENTORY_SERVERS = Gauge(
+    'yubikey_ssh_manager_inventory_servers', "Servers in the inventory."
+)
+
+PROBE_SWEEP_SECONDS = Histogram(
+    'yubikey_ssh_manager_probe_sweep_seconds', "Time spent probing servers for reachability, per sweep."
+)
+PROBES = Counter(
+    'yubikey_ssh_manager_probes_total', "Reachability probes by outcome.", ('result',)
+)
+
+REMOTE_COMMANDS = Counter(
+    'yubikey_ssh_manager_remote_commands_total', "Fan-out commands run on servers, by outcome.", ('result',)
+)
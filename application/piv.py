@@ -0,0 +1,70 @@
+import logging
+from contextlib import contextmanager
+from typing import Iterator
+
+from ykman.device import list_all_devices
+from ykman.piv import derive_management_key, get_pivman_data, get_pivman_protected_data
+from yubikit.core import NotSupportedError
+from yubikit.core.smartcard import ApduError, SmartCardConnection
+from yubikit.piv import (
+    DEFAULT_MANAGEMENT_KEY,
+    KEY_TYPE,
+    PIN_POLICY,
+    SLOT,
+    TOUCH_POLICY,
+    PivSession,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class YubiKeyNotFoundError(Exception):
+    """Raised when no connected YubiKey has the requested serial."""
+
+
+@contextmanager
+def open_piv_session(serial: str) -> Iterator[PivSession]:
+    """Open an in-process PIV session on the connected YubiKey with this serial."""
+    for device, info in list_all_devices():
+        if str(info.serial) == str(serial):
+            with device.open_connection(SmartCardConnection) as connection:
+                yield PivSession(connection)
+            return
+    raise YubiKeyNotFoundError(f"YubiKey with serial {serial} not found")
+
+
+def verify_pin(session: PivSession, pin: str) -> bool:
+    """Verify the PIN and unlock a PIN-protected management key if there is one.
+
+    Returns True if the session is also authenticated with the management
+    key, mirroring what the ykman CLI does with ``--pin``.
+    """
+    session.verify_pin(pin)
+    pivman = get_pivman_data(session)
+    if pivman.has_derived_key:
+        session.authenticate(derive_management_key(pin, pivman.salt))
+        session.verify_pin(pin)
+        return True
+    if pivman.has_stored_key:
+        session.authenticate(get_pivman_protected_data(session).key)
+        session.verify_pin(pin)
+        return True
+    return False
+
+
+def generate_key(session: PivSession, pin: str, slot: SLOT = SLOT.AUTHENTICATION):
+    """Generate an RSA2048 key (PIN policy ONCE) and return its public key."""
+    if not verify_pin(session, pin):
+        # No PIN-protected management key: fall back to the default key like ykman does
+        session.authenticate(DEFAULT_MANAGEMENT_KEY)
+    return session.generate_key(slot, KEY_TYPE.RSA2048, PIN_POLICY.ONCE, TOUCH_POLICY.DEFAULT)
+
+
+def read_public_key(session: PivSession, slot: SLOT = SLOT.AUTHENTICATION):
+    """Read the public key of a slot, from metadata or else the stored certificate."""
+    try:
+        # Slot metadata is available from firmware 5.3
+        return session.get_slot_metadata(slot).public_key
+    except (NotSupportedError, ApduError):
+        logger.debug("Slot metadata unavailable, reading public key from certificate")
+    return session.get_certificate(slot).public_key()
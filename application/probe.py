@@ -0,0 +1,146 @@
+"""Reachability probes: TCP connect time and SSH banner for each server.
+
+A sweep opens connections to every distinct hostname:port concurrently on
+an asyncio event loop, bounded by a semaphore, and reads the SSH
+identification line the server sends first. Results are cached per
+hostname:port for a TTL, so the UI can ask for health as often as it
+likes without hammering the fleet.
+"""
+import time
+import socket
+import asyncio
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .metrics import PROBE_SWEEP_SECONDS, PROBES
+
+DEFAULT_PROBE_CONCURRENCY = 256
+DEFAULT_PROBE_TIMEOUT = 3.0
+DEFAULT_PROBE_TTL = 60.0
+# Servers may send a few lines before the SSH-2.0 identification (RFC 4253 4.2)
+MAX_PRE_BANNER_LINES = 5
+MAX_BANNER_BYTES = 255
+
+logger = logging.getLogger(__name__)
+
+
+async def probe_host(hostname: str, port: int, timeout: float = DEFAULT_PROBE_TIMEOUT) -> Dict:
+    """Connect to hostname:port and read the SSH banner; never raises."""
+    result = {"hostname": hostname, "port": port, "reachable": False, "ssh": False,
+              "rtt_ms": None, "banner": None, "error": None, "checked_at": time.time()}
+    started = time.perf_counter()
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(hostname, port), timeout)
+        result["rtt_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        result["reachable"] = True
+        remaining = max(0.1, timeout - (time.perf_counter() - started))
+        for _ in range(MAX_PRE_BANNER_LINES):
+            line = await asyncio.wait_for(reader.readline(), remaining)
+            if not line:
+                result["error"] = "Connection closed before the SSH banner"
+                break
+            text = line[:MAX_BANNER_BYTES].decode('utf-8', 'replace').strip()
+            if text.startswith('SSH-'):
+                result["banner"] = text
+                result["ssh"] = True
+                break
+        else:
+            result["error"] = "No SSH banner"
+    except asyncio.TimeoutError:
+        result["error"] = "Timed out" if not result["reachable"] else "Timed out waiting for the SSH banner"
+    except socket.gaierror as e:
+        result["error"] = f"Could not resolve {hostname}: {e.strerror or e}"
+    except ConnectionRefusedError:
+        result["error"] = "Connection refused"
+    except OSError as e:
+        result["error"] = e.strerror or str(e)
+    finally:
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (OSError, asyncio.TimeoutError):
+                pass
+    return result
+
+
+def _outcome(result: Dict) -> str:
+    if result["ssh"]:
+        return 'ssh'
+    if result["reachable"]:
+        return 'no_banner'
+    return 'timeout' if result["error"] == "Timed out" else 'unreachable'
+
+
+class ProbeEngine:
+    """Runs probe sweeps and caches results per hostname:port for ``ttl`` seconds."""
+
+    def __init__(self, concurrency: int = DEFAULT_PROBE_CONCURRENCY, timeout: float = DEFAULT_PROBE_TIMEOUT,
+                 ttl: float = DEFAULT_PROBE_TTL):
+        self.logger = logging.getLogger(__name__)
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.ttl = ttl
+        self._results: Dict[Tuple[str, int], Dict] = {}
+        self._lock = threading.Lock()
+        # One sweep at a time; concurrent callers reuse what it found
+        self._sweep_lock = threading.Lock()
+
+    def cached(self, hostname: str, port: int) -> Optional[Dict]:
+        with self._lock:
+            result = self._results.get((hostname.lower(), port))
+        if result is not None and time.time() - result["checked_at"] < self.ttl:
+            return result
+        return None
+
+    async def _sweep(self, targets: List[Tuple[str, int]]) -> List[Dict]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def bounded(hostname: str, port: int) -> Dict:
+            async with semaphore:
+                return await probe_host(hostname, port, self.timeout)
+
+        return await asyncio.gather(*(bounded(hostname, port) for hostname, port in targets))
+
+    def probe(self, targets: Iterable[Tuple[str, int]], refresh: bool = False) -> Dict[Tuple[str, int], Dict]:
+        """Results for each (hostname, port), probing those not cached (or all with refresh)."""
+        targets = list(dict.fromkeys((str(hostname), int(port)) for hostname, port in targets))
+        with self._sweep_lock:
+            stale = [target for target in targets if refresh or self.cached(*target) is None]
+            if stale:
+                with PROBE_SWEEP_SECONDS.time():
+                    results = asyncio.run(self._sweep(stale))
+                with self._lock:
+                    for result in results:
+                        self._results[(result["hostname"].lower(), result["port"])] = result
+                        PROBES.inc(result=_outcome(result))
+                self.logger.info(f"Probed {len(stale)} host(s), "
+                                 f"{sum(1 for r in results if r['reachable'])} reachable")
+        with self._lock:
+            return {target: self._results.get((target[0].lower(), target[1])) for target in targets}
+
+    def probe_servers(self, servers: List[Dict], refresh: bool = False) -> Dict[str, Dict]:
+        """Probe results keyed by server id."""
+        def target(server: Dict) -> Tuple[str, int]:
+            try:
+                return str(server.get('hostname', '')), int(server.get('port') or 22)
+            except (TypeError, ValueError):
+                return str(server.get('hostname', '')), 22
+
+        results = self.probe((target(server) for server in servers), refresh=refresh)
+        return {server['id']: results[target(server)] for server in servers}
+
+
+_probe_engine: Optional[ProbeEngine] = None
+_probe_engine_lock = threading.Lock()
+
+
+def get_probe_engine() -> ProbeEngine:
+    """The process-wide probe engine (shares its result cache across requests)."""
+    global _probe_engine
+    with _probe_engine_lock:
+        if _probe_engine is None:
+            _probe_engine = ProbeEngine()
+        return _probe_engine
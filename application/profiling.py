@@ -0,0 +1,211 @@
+import os
+import re
+import sys
+import time
+import random
+import logging
+import cProfile
+import threading
+import traceback
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROFILE_ENV_VAR = 'YUBIKEY_SSH_MANAGER_PROFILE'
+PROFILE_RATE_ENV_VAR = 'YUBIKEY_SSH_MANAGER_PROFILE_RATE'
+DEFAULT_PROFILES_DIR = Path.home() / ".yubikey-ssh-manager" / "profiles"
+DEFAULT_MAX_PROFILES = 50
+
+# Threads started by app.py, the watcher and werkzeug's per-request threads
+DEFAULT_THREAD_PATTERN = r'yubikey-watcher|flask-server|process_request_thread|job-worker'
+
+logger = logging.getLogger(__name__)
+
+
+def prune_profiles(directory: Path, keep: int):
+    """Delete the oldest dumps so at most ``keep`` remain."""
+    dumps = sorted(
+        (p for p in directory.glob('*') if p.suffix in ('.pstats', '.folded')),
+        key=lambda p: p.stat().st_mtime
+    )
+    for path in dumps[:max(0, len(dumps) - keep)]:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _timestamp() -> str:
+    now = time.time()
+    return time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + f'.{int(now * 1000) % 1000:03d}'
+
+
+def _slug(text: str) -> str:
+    return re.sub(r'[^A-Za-z0-9]+', '_', text).strip('_')[:60] or 'root'
+
+
+class RequestProfiler:
+    """Opt-in cProfile capture for requests whose path matches a pattern.
+
+    A matching request is profiled with probability ``rate`` and its stats
+    are dumped as a .pstats file (load with pstats or snakeviz). Only one
+    request is profiled at a time; others run unprofiled meanwhile.
+    """
+
+    def __init__(self, directory: Path = DEFAULT_PROFILES_DIR, max_profiles: int = DEFAULT_MAX_PROFILES):
+        self.directory = Path(directory)
+        self.max_profiles = max_profiles
+        self.pattern = None
+        self.rate = 1.0
+        self._busy = threading.Lock()
+        try:
+            self.configure(os.environ.get(PROFILE_ENV_VAR), float(os.environ.get(PROFILE_RATE_ENV_VAR, 1.0)))
+        except (re.error, ValueError) as e:
+            logger.warning(f"Ignoring invalid profiling settings from the environment: {e}")
+
+    @property
+    def enabled(self) -> bool:
+        return self.pattern is not None
+
+    def configure(self, pattern: Optional[str], rate: float = 1.0):
+        """Profile paths matching the regex ``pattern``; None disables profiling."""
+        if rate < 0 or rate > 1:
+            raise ValueError("rate must be between 0 and 1")
+        self.pattern = re.compile(pattern) if pattern else None
+        self.rate = rate
+        if self.pattern:
+            logger.info(f"Request profiling enabled for {pattern!r} at rate {rate}")
+
+    def start(self, path: str) -> Optional[cProfile.Profile]:
+        """Begin profiling this request if it is selected; returns the profiler."""
+        pattern = self.pattern
+        if pattern is None or not pattern.search(path) or random.random() >= self.rate:
+            return None
+        if not self._busy.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (e.g. a debugger) is already active
+            self._busy.release()
+            return None
+        return profiler
+
+    def stop(self, profiler: cProfile.Profile, method: str, path: str, duration: float) -> Optional[Path]:
+        """Finish a profile started by start() and dump it."""
+        try:
+            profiler.disable()
+            self.directory.mkdir(parents=True, exist_ok=True)
+            filename = f"{_timestamp()}-{method}-{_slug(path)}-{duration * 1000:.0f}ms.pstats"
+            dump_path = self.directory / filename
+            profiler.dump_stats(dump_path)
+            prune_profiles(self.directory, self.max_profiles)
+            return dump_path
+        except Exception:
+            logger.exception("Error writing request profile")
+            return None
+        finally:
+            self._busy.release()
+
+    def status(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "pattern": self.pattern.pattern if self.pattern else None,
+            "rate": self.rate,
+            "directory": str(self.directory),
+            "profiles": list_profiles(self.directory)
+        }
+
+
+def list_profiles(directory: Path) -> List[Dict]:
+    if not directory.exists():
+        return []
+    dumps = [p for p in directory.glob('*') if p.suffix in ('.pstats', '.folded')]
+    return [
+        {"name": p.name, "size": p.stat().st_size, "modified": p.stat().st_mtime}
+        for p in sorted(dumps, key=lambda p: p.stat().st_mtime, reverse=True)
+    ]
+
+
+def sample_thread_stacks(duration: float = 5.0, interval: float = 0.01,
+                         thread_pattern: str = DEFAULT_THREAD_PATTERN) -> Counter:
+    """Sample the stacks of matching threads; returns folded stack counts.
+
+    Each key is a ';'-joined root-to-leaf stack prefixed with the thread
+    name, the format flamegraph.pl and speedscope read.
+    """
+    pattern = re.compile(thread_pattern)
+    own = threading.get_ident()
+    stacks = Counter()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            name = names.get(ident)
+            if ident == own or name is None or not pattern.search(name):
+                continue
+            frames = [f"{entry.name} ({os.path.basename(entry.filename)}:{entry.lineno})"
+                      for entry in traceback.extract_stack(frame)]
+            stacks[';'.join([name] + frames)] += 1
+        time.sleep(interval)
+    return stacks
+
+
+class ThreadStackDumper:
+    """Background stack sampling runs whose folded output lands next to the request profiles."""
+
+    def __init__(self, directory: Path = DEFAULT_PROFILES_DIR, max_profiles: int = DEFAULT_MAX_PROFILES):
+        self.directory = Path(directory)
+        self.max_profiles = max_profiles
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration: float = 5.0, interval: float = 0.01,
+              thread_pattern: str = DEFAULT_THREAD_PATTERN) -> Path:
+        """Sample in the background; returns the path the result will be written to."""
+        if self.running:
+            raise RuntimeError("A stack sampling run is already in progress")
+        re.compile(thread_pattern)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{_timestamp()}-threads.folded"
+        self._thread = threading.Thread(
+            target=self._run, args=(path, duration, interval, thread_pattern),
+            name='stack-sampler', daemon=True
+        )
+        self._thread.start()
+        return path
+
+    def _run(self, path: Path, duration: float, interval: float, thread_pattern: str):
+        try:
+            stacks = sample_thread_stacks(duration, interval, thread_pattern)
+            path.write_text(''.join(f"{stack} {count}\n" for stack, count in stacks.most_common()))
+            prune_profiles(self.directory, self.max_profiles)
+            logger.info(f"Wrote {sum(stacks.values())} stack samples to {path}")
+        except Exception:
+            logger.exception("Error sampling thread stacks")
+
+
+_request_profiler: Optional[RequestProfiler] = None
+_stack_dumper: Optional[ThreadStackDumper] = None
+_profiling_lock = threading.Lock()
+
+
+def get_request_profiler() -> RequestProfiler:
+    """The process-wide request profiler (configured from the environment)."""
+    global _request_profiler
+    with _profiling_lock:
+        if _request_profiler is None:
+            _request_profiler = RequestProfiler()
+        return _request_profiler
+
+
+def get_stack_dumper() -> ThreadStackDumper:
+    global _stack_dumper
+    with _profiling_lock:
+        if _stack_dumper is None:
+            _stack_dumper = ThreadStackDumper()
+        return _stack_dumper
@@ -0,0 +1,168 @@
+import shlex
+import binascii
+from typing import Dict, List, Optional
+
+from .keys import openssh_fingerprint
+
+# Key types that can appear in authorized_keys, optionally after an options field
+KEY_TYPE_PREFIXES = ('ssh-', 'ecdsa-sha2-', 'sk-ssh-', 'sk-ecdsa-sha2-')
+
+# Status tokens printed by the remote scripts as "STATUS=<token>"
+INSTALL_MESSAGES = {
+    'added': "Key deployed successfully",
+    'present': "Key already present on server",
+    'mkdir_failed': "Could not create the .ssh directory on the server.",
+    'not_writable': "Cannot write to authorized_keys file. Please check SSH configuration on the server.",
+    'write_failed': "Failed to add key to authorized_keys.",
+}
+
+INSTALL_SCRIPT = r'''
+umask 077
+key=%(key)s
+dir="$HOME/.ssh"
+file="$dir/authorized_keys"
+if [ ! -d "$dir" ]; then
+    mkdir -p "$dir" && chmod 700 "$dir" || { echo STATUS=mkdir_failed; exit 10; }
+fi
+if [ -e "$file" ] && [ ! -w "$file" ]; then echo STATUS=not_writable; exit 11; fi
+if [ -f "$file" ] && grep -qxF -- "$key" "$file"; then echo STATUS=present; exit 0; fi
+if [ -L "$file" ]; then
+    # Keep symlinked files in place; append instead of replacing the link
+    printf '%%s\n' "$key" >> "$file" || { echo STATUS=write_failed; exit 12; }
+    echo STATUS=added; exit 0
+fi
+[ -w "$dir" ] || { echo STATUS=not_writable; exit 11; }
+tmp="$file.tmp.$$"
+{
+    if [ -s "$file" ]; then
+        cat "$file"
+        [ -n "$(tail -c 1 "$file")" ] && echo
+    fi
+    printf '%%s\n' "$key"
+} > "$tmp" && chmod 600 "$tmp" && mv -f "$tmp" "$file" || { rm -f "$tmp"; echo STATUS=write_failed; exit 12; }
+echo STATUS=added
+'''
+
+
+REMOVE_MESSAGES = {
+    'removed': "Key removed from authorized_keys",
+    'absent': "Key was not in authorized_keys",
+    'not_writable': "Cannot write to authorized_keys file. Please check SSH configuration on the server.",
+    'write_failed': "Failed to rewrite authorized_keys.",
+}
+
+REMOVE_SCRIPT = r'''
+umask 077
+blob=%(blob)s
+dir="$HOME/.ssh"
+file="$dir/authorized_keys"
+[ -f "$file" ] || { echo STATUS=absent; exit 0; }
+[ -w "$file" ] && [ -w "$dir" ] || { echo STATUS=not_writable; exit 11; }
+tmp="$file.tmp.$$"
+: > "$tmp" || { echo STATUS=write_failed; exit 12; }
+# Drop every line that has the key's base64 blob as a field (options and comments vary)
+removed=$(awk -v b="$blob" -v out="$tmp" \
+    '{ for (i = 1; i <= NF; i++) if ($i == b) { removed++; next } print > out } END { close(out); print removed + 0 }' \
+    "$file") || { rm -f "$tmp"; echo STATUS=write_failed; exit 12; }
+if [ "$removed" = 0 ]; then rm -f "$tmp"; echo STATUS=absent; exit 0; fi
+if [ -L "$file" ]; then
+    # Keep symlinked files in place; rewrite the target instead of replacing the link
+    cat "$tmp" > "$file" && rm -f "$tmp" || { rm -f "$tmp"; echo STATUS=write_failed; exit 12; }
+else
+    chmod 600 "$tmp" && mv -f "$tmp" "$file" || { rm -f "$tmp"; echo STATUS=write_failed; exit 12; }
+fi
+echo REMOVED=$removed
+echo STATUS=removed
+'''
+
+
+def wrap_for_sh(script: str) -> str:
+    """Run a script under sh regardless of the remote user's login shell."""
+    return 'sh -c ' + shlex.quote(script)
+
+
+def build_install_command(public_key: str) -> str:
+    """One remote command that idempotently adds a key to ~/.ssh/authorized_keys.
+
+    It creates ~/.ssh (0700) if needed, skips the key if the exact line is
+    already present, and otherwise writes the new file to a temp file and
+    renames it over the old one.
+    """
+    return wrap_for_sh(INSTALL_SCRIPT % {'key': shlex.quote(public_key.strip())})
+
+
+def build_remove_command(public_key: str) -> str:
+    """One remote command that drops every authorized_keys line holding this key.
+
+    Lines are matched on the key's base64 blob, so entries with options or
+    a different comment are removed too. The filtered file is written next
+    to the original and renamed over it.
+    """
+    fields = public_key.split()
+    if len(fields) < 2:
+        raise ValueError("Not an OpenSSH public key")
+    return wrap_for_sh(REMOVE_SCRIPT % {'blob': shlex.quote(fields[1])})
+
+
+def parse_status(stdout: str) -> Optional[str]:
+    """Pull the STATUS=<token> line out of a remote script's output."""
+    for line in reversed(stdout.splitlines()):
+        if line.startswith('STATUS='):
+            return line.split('=', 1)[1].strip()
+    return None
+
+
+def install_result(exit_status: int, stdout: str, stderr: str) -> Dict:
+    """Turn the install script's output into a deploy result dict."""
+    status = parse_status(stdout)
+    if status in ('added', 'present') and exit_status == 0:
+        return {"success": True, "status": status, "message": INSTALL_MESSAGES[status]}
+    message = INSTALL_MESSAGES.get(status) or f"Failed to add key: {stderr.strip() or f'exit status {exit_status}'}"
+    return {"success": False, "status": status or 'error', "message": message}
+
+
+def _strip_options(line: str) -> str:
+    """Drop the leading options field of an authorized_keys line (quotes may hold spaces)."""
+    quoted = False
+    for index, char in enumerate(line):
+        if char == '"':
+            quoted = not quoted
+        elif char in ' \t' and not quoted:
+            return line[index:].lstrip()
+    return ''
+
+
+def authorized_key_fingerprints(text: str) -> List[str]:
+    """SHA256 fingerprints of the keys in an authorized_keys file, in file order.
+
+    Lines may start with an options field (``from="...",command="..." ssh-ed25519 ...``);
+    comments, blank lines and malformed entries are skipped.
+    """
+    fingerprints = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if not line.startswith(KEY_TYPE_PREFIXES):
+            line = _strip_options(line)
+        fields = line.split()
+        if len(fields) < 2 or not fields[0].startswith(KEY_TYPE_PREFIXES):
+            continue
+        try:
+            fingerprints.append(openssh_fingerprint(f"{fields[0]} {fields[1]}"))
+        except (binascii.Error, ValueError):
+            continue
+    return fingerprints
+
+
+def remove_result(exit_status: int, stdout: str, stderr: str) -> Dict:
+    """Turn the remove script's output into a revoke result dict."""
+    status = parse_status(stdout)
+    if status in ('removed', 'absent') and exit_status == 0:
+        removed = 0
+        for line in stdout.splitlines():
+            if line.startswith('REMOVED='):
+                removed = int(line.split('=', 1)[1])
+        return {"success": True, "status": status, "message": REMOVE_MESSAGES[status], "lines_removed": removed}
+    message = REMOVE_MESSAGES.get(status) or f"Failed to remove key: {stderr.strip() or f'exit status {exit_status}'}"
+    return {"success": False, "status": status or 'error', "message": message}
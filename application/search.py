@@ -0,0 +1,272 @@
+"""In-memory search index over the server inventory.
+
+The index is built from one inventory revision and answers search, filter,
+sort and pagination queries without touching the store. Prefix matches on a
+single field are bisected out of that field's sorted keys; substring
+matches scan one lowercased text blob with ``str.find``. Match lists for
+recent queries are cached, so fetching the next page of the same query only
+bisects the cursor and slices.
+"""
+import base64
+import binascii
+import bisect
+import json
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+SEARCH_FIELDS = ('name', 'hostname', 'username')
+SORT_FIELDS = SEARCH_FIELDS + ('port',)
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+CACHED_QUERIES = 32
+
+# Separates fields and rows in the substring blob; never part of a query
+_FIELD_SEPARATOR = '\x00'
+_ROW_SEPARATOR = '\x01'
+
+
+class InvalidQueryError(ValueError):
+    """A search parameter is malformed (unknown field, bad cursor, ...)."""
+
+
+def _sort_key(server: Dict, field: str):
+    if field == 'port':
+        try:
+            return int(server.get('port') or 0)
+        except (TypeError, ValueError):
+            return 0
+    return str(server.get(field) or '').lower()
+
+
+def encode_cursor(sort: str, order: str, key, server_id: str) -> str:
+    raw = json.dumps([sort, order, key, server_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, sort: str, order: str) -> Tuple:
+    """The (key, id) position in a cursor, which must come from the same sort and order."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, cursor_order, key, server_id = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise InvalidQueryError(f"Invalid cursor: {cursor}") from e
+    if (cursor_sort, cursor_order) != (sort, order):
+        raise InvalidQueryError(f"Cursor is for sort={cursor_sort}&order={cursor_order}, not sort={sort}&order={order}")
+    # Keys are compared with the index's keys, so their type must match the field's
+    expected = int if sort == 'port' else str
+    if type(key) is not expected:
+        raise InvalidQueryError(f"Invalid cursor: {cursor}")
+    return key, str(server_id)
+
+
+class ServerIndex:
+    """Immutable search index over a list of servers at one inventory revision."""
+
+    def __init__(self, servers: List[Dict], revision: int):
+        self.revision = revision
+        self.servers = servers
+
+        # Per sort field, built on first use: row order, each row's rank in
+        # that order, and the sorted (key, id) pairs for prefix ranges and cursors
+        self._order: Dict[str, List[int]] = {}
+        self._rank: Dict[str, List[int]] = {}
+        self._sorted_keys: Dict[str, List[Tuple]] = {}
+        self._by_serial: Optional[Dict[str, set]] = None
+        # One blob for substring search, with the offset where each row starts
+        self._blob: Optional[str] = None
+        self._offsets: List[int] = []
+        self._build_lock = threading.Lock()
+
+        self._cache: 'OrderedDict[Tuple, List[int]]' = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    def _sorted(self, field: str) -> Tuple[List[int], List[int], List[Tuple]]:
+        if field not in self._order:
+            with self._build_lock:
+                if field not in self._order:
+                    keys = [(_sort_key(server, field), str(server.get('id', ''))) for server in self.servers]
+                    order = sorted(range(len(keys)), key=keys.__getitem__)
+                    rank = [0] * len(keys)
+                    for position, row in enumerate(order):
+                        rank[row] = position
+                    self._rank[field] = rank
+                    self._sorted_keys[field] = [keys[row] for row in order]
+                    self._order[field] = order
+        return self._order[field], self._rank[field], self._sorted_keys[field]
+
+    def _serials(self) -> Dict[str, set]:
+        if self._by_serial is None:
+            with self._build_lock:
+                if self._by_serial is None:
+                    by_serial: Dict[str, set] = {}
+                    for row, server in enumerate(self.servers):
+                        for serial in server.get('yubikey_serials', []) or []:
+                            by_serial.setdefault(str(serial), set()).add(row)
+                    self._by_serial = by_serial
+        return self._by_serial
+
+    def _text(self) -> Tuple[str, List[int]]:
+        if self._blob is None:
+            with self._build_lock:
+                if self._blob is None:
+                    offsets = []
+                    parts = []
+                    offset = 0
+                    for server in self.servers:
+                        text = _FIELD_SEPARATOR.join(_sort_key(server, field) for field in SEARCH_FIELDS)
+                        text += _ROW_SEPARATOR
+                        offsets.append(offset)
+                        parts.append(text)
+                        offset += len(text)
+                    self._offsets = offsets
+                    self._blob = ''.join(parts)
+        return self._blob, self._offsets
+
+    def __len__(self) -> int:
+        return len(self.servers)
+
+    def _prefix_rows(self, query: str, field: str) -> List[int]:
+        order, _, keys = self._sorted(field)
+        start = bisect.bisect_left(keys, (query,))
+        end = bisect.bisect_left(keys, (query + '\uffff',))
+        return order[start:end]
+
+    def _substring_rows(self, query: str) -> List[int]:
+        rows = []
+        blob, offsets = self._text()
+        position = blob.find(query)
+        while position != -1:
+            row = bisect.bisect_right(offsets, position) - 1
+            rows.append(row)
+            # Skip the rest of this row; one match is enough
+            next_row = row + 1
+            if next_row >= len(offsets):
+                break
+            position = blob.find(query, offsets[next_row])
+        return rows
+
+    def _matches(self, query: str, match: str, fields: Tuple[str, ...]) -> Optional[List[int]]:
+        """Rows matching the text query, or None when there is no query."""
+        if not query:
+            return None
+        query = query.lower()
+        if _FIELD_SEPARATOR in query or _ROW_SEPARATOR in query:
+            return []
+        if match == 'prefix':
+            rows = set()
+            for field in fields:
+                rows.update(self._prefix_rows(query, field))
+            return list(rows)
+        rows = self._substring_rows(query)
+        if fields != SEARCH_FIELDS:
+            rows = [row for row in rows if any(query in _sort_key(self.servers[row], field) for field in fields)]
+        return rows
+
+    def _result(self, query: str, match: str, fields: Tuple[str, ...], serial: Optional[str],
+                without_serial: Optional[str], sort: str) -> List[int]:
+        """Matching rows in ascending sort order (cached per query)."""
+        cache_key = (query.lower(), match, fields, serial, without_serial, sort)
+        with self._cache_lock:
+            rows = self._cache.get(cache_key)
+            if rows is not None:
+                self._cache.move_to_end(cache_key)
+                return rows
+
+        order, rank, _ = self._sorted(sort)
+        rows = self._matches(query, match, fields)
+        if serial is not None:
+            authorized = self._serials().get(serial, set())
+            rows = list(authorized) if rows is None else [row for row in rows if row in authorized]
+        if without_serial is not None:
+            authorized = self._serials().get(without_serial, set())
+            if rows is None:
+                rows = [row for row in order if row not in authorized]
+            else:
+                rows = [row for row in rows if row not in authorized]
+
+        if rows is None:
+            rows = order
+        else:
+            rows = sorted(rows, key=rank.__getitem__)
+
+        with self._cache_lock:
+            self._cache[cache_key] = rows
+            if len(self._cache) > CACHED_QUERIES:
+                self._cache.popitem(last=False)
+        return rows
+
+    def search(self, query: str = '', match: str = 'substring', fields: Optional[List[str]] = None,
+               serial: Optional[str] = None, without_serial: Optional[str] = None, sort: str = 'name',
+               order: str = 'asc', limit: int = DEFAULT_LIMIT, cursor: Optional[str] = None) -> Dict:
+        """One page of matching servers plus the cursor for the next page."""
+        if match not in ('substring', 'prefix'):
+            raise InvalidQueryError(f"Unknown match type: {match}")
+        fields = tuple(fields) if fields else SEARCH_FIELDS
+        unknown = [field for field in fields if field not in SEARCH_FIELDS]
+        if unknown:
+            raise InvalidQueryError(f"Unknown search field: {', '.join(unknown)}")
+        if sort not in SORT_FIELDS:
+            raise InvalidQueryError(f"Unknown sort field: {sort}")
+        if order not in ('asc', 'desc'):
+            raise InvalidQueryError(f"Unknown sort order: {order}")
+        limit = max(1, min(int(limit), MAX_LIMIT))
+
+        rows = self._result(query or '', match, fields,
+                            str(serial) if serial else None,
+                            str(without_serial) if without_serial else None, sort)
+        _, rank, keys = self._sorted(sort)
+
+        # The cursor is the (key, id) of the last server returned, so it stays
+        # valid when the inventory changes between pages (for the same sort)
+        if order == 'asc':
+            start = 0
+            if cursor:
+                after = decode_cursor(cursor, sort, order)
+                start = bisect.bisect_right(rows, after, key=lambda row: keys[rank[row]])
+            page = rows[start:start + limit]
+            has_more = start + limit < len(rows)
+        else:
+            end = len(rows)
+            if cursor:
+                before = decode_cursor(cursor, sort, order)
+                end = bisect.bisect_left(rows, before, key=lambda row: keys[rank[row]])
+            page = rows[max(0, end - limit):end][::-1]
+            has_more = end - limit > 0
+
+        next_cursor = None
+        if has_more and page:
+            last = page[-1]
+            next_cursor = encode_cursor(sort, order, *keys[rank[last]])
+        return {
+            'servers': [self.servers[row] for row in page],
+            'total': len(rows),
+            'next_cursor': next_cursor,
+            'revision': self.revision,
+        }
+
+
+class SearchIndexCache:
+    """Keeps one ServerIndex per store, rebuilt when the inventory revision changes."""
+
+    def __init__(self, store):
+        self.logger = logging.getLogger(__name__)
+        self.store = store
+        self._index: Optional[ServerIndex] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> ServerIndex:
+        revision = self.store.revision()
+        index = self._index
+        if index is not None and index.revision == revision:
+            return index
+        with self._lock:
+            index = self._index
+            revision = self.store.revision()
+            if index is None or index.revision != revision:
+                servers = self.store.all()
+                index = ServerIndex(servers, revision)
+                self._index = index
+                self.logger.debug(f"Built search index over {len(servers)} servers at revision {revision}")
+        return index
@@ -0,0 +1,321 @@
+"""Import hosts from ~/.ssh/config and ~/.ssh/known_hosts.
+
+Host aliases are resolved the way ssh does for the options we care about
+(HostName, Port, User, ProxyJump): every matching ``Host`` block is
+applied in file order and the first value obtained wins, so wildcard
+blocks such as ``Host *.corp`` fill in defaults for concrete aliases.
+``Include`` is followed (globs, relative to ~/.ssh). ``Match`` blocks are
+skipped, since they depend on the connection being made.
+
+Parsed hosts are cached in the app directory keyed by the mtimes of every
+file (and Include directory) read, so a re-sync only parses again when
+something changed and only writes the servers that differ.
+"""
+import os
+import glob
+import json
+import shlex
+import uuid
+import getpass
+import fnmatch
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_CONFIG_PATH = Path.home() / '.ssh' / 'config'
+DEFAULT_KNOWN_HOSTS_PATH = Path.home() / '.ssh' / 'known_hosts'
+CACHE_FILENAME = 'ssh_config_cache.json'
+CACHE_VERSION = 1
+MAX_INCLUDE_DEPTH = 16
+# Fields of an imported server that come from the config and are kept in sync
+SYNCED_FIELDS = ('hostname', 'port', 'username', 'proxy_jump')
+
+logger = logging.getLogger(__name__)
+
+
+class SSHConfigError(Exception):
+    """The ssh config could not be read."""
+
+
+def _split(line: str) -> Tuple[str, List[str]]:
+    """Split a config line into a lowercase keyword and its arguments."""
+    line = line.strip()
+    if '=' in line.split(None, 1)[0]:
+        keyword, _, rest = line.partition('=')
+    else:
+        parts = line.split(None, 1)
+        keyword, rest = parts[0], parts[1] if len(parts) > 1 else ''
+    try:
+        args = shlex.split(rest.lstrip('= \t'), comments=True)
+    except ValueError:
+        args = rest.split()
+    return keyword.strip().lower(), args
+
+
+def _is_pattern(name: str) -> bool:
+    return any(char in name for char in '*?!')
+
+
+def _matches(patterns: List[str], alias: str) -> bool:
+    """ssh Host matching: any positive pattern matches and no negated one does."""
+    matched = False
+    for pattern in patterns:
+        if pattern.startswith('!'):
+            if fnmatch.fnmatchcase(alias.lower(), pattern[1:].lower()):
+                return False
+        elif fnmatch.fnmatchcase(alias.lower(), pattern.lower()):
+            matched = True
+    return matched
+
+
+class SSHConfigParser:
+    """Reads one ssh config (with its Includes) into host blocks."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path).expanduser()
+        self.ssh_dir = self.path.parent
+        # (patterns, options) in file order; options keep the first value per keyword
+        self.blocks: List[Tuple[List[str], Dict[str, str]]] = []
+        # Every file and Include directory read, for the cache signature
+        self.sources: List[Path] = []
+
+    def parse(self) -> 'SSHConfigParser':
+        if not self.path.exists():
+            raise SSHConfigError(f"{self.path} does not exist")
+        # Options before the first Host line apply to every host
+        self.blocks = [(['*'], {})]
+        self._read(self.path, depth=0)
+        return self
+
+    def _read(self, path: Path, depth: int):
+        if depth > MAX_INCLUDE_DEPTH:
+            logger.warning(f"Too many nested Includes at {path}, skipping")
+            return
+        self.sources.append(path)
+        try:
+            lines = path.read_text(errors='replace').splitlines()
+        except OSError as e:
+            logger.warning(f"Could not read {path}: {e}")
+            return
+        for line in lines:
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+            keyword, args = _split(line)
+            if keyword == 'host':
+                self.blocks.append((args, {}))
+            elif keyword == 'match':
+                # Conditions can't be evaluated offline; ignore the block
+                self.blocks.append(([], {}))
+            elif keyword == 'include':
+                patterns = self.blocks[-1][0]
+                blocks_before = len(self.blocks)
+                for pattern in args:
+                    self._include(pattern, depth)
+                # Lines after the Include belong to the block it appeared in again
+                if len(self.blocks) != blocks_before:
+                    self.blocks.append((patterns, {}))
+            elif args:
+                self.blocks[-1][1].setdefault(keyword, ' '.join(args))
+
+    def _include(self, pattern: str, depth: int):
+        pattern = os.path.expanduser(pattern)
+        if not os.path.isabs(pattern):
+            pattern = str(self.ssh_dir / pattern)
+        # A new file in an Include directory must invalidate the cache too
+        self.sources.append(Path(pattern).parent)
+        for included in sorted(glob.glob(pattern)):
+            if os.path.isfile(included):
+                self._read(Path(included), depth + 1)
+
+    def aliases(self) -> List[str]:
+        """Concrete host aliases (no wildcards or negations), in file order."""
+        seen = []
+        for patterns, _ in self.blocks:
+            for pattern in patterns:
+                if not _is_pattern(pattern) and pattern not in seen:
+                    seen.append(pattern)
+        return seen
+
+    def resolve(self, alias: str) -> Dict[str, str]:
+        """Effective options for an alias: first value from the matching blocks."""
+        options: Dict[str, str] = {}
+        for patterns, block in self.blocks:
+            if _matches(patterns, alias):
+                for keyword, value in block.items():
+                    options.setdefault(keyword, value)
+        return options
+
+    def hosts(self, default_user: str) -> List[Dict]:
+        hosts = []
+        for alias in self.aliases():
+            options = self.resolve(alias)
+            hostname = options.get('hostname', alias).replace('%h', alias).replace('%%', '%')
+            try:
+                port = int(options.get('port', 22))
+            except ValueError:
+                logger.warning(f"Ignoring invalid Port for {alias}: {options.get('port')}")
+                port = 22
+            host = {
+                'alias': alias,
+                'hostname': hostname,
+                'port': port,
+                'username': options.get('user', default_user),
+                'source': 'ssh_config',
+            }
+            proxy_jump = options.get('proxyjump')
+            if proxy_jump and proxy_jump.lower() != 'none':
+                host['proxy_jump'] = proxy_jump
+            hosts.append(host)
+        return hosts
+
+
+def parse_known_hosts(path: Path, default_user: str) -> List[Dict]:
+    """Hosts named in a known_hosts file; hashed and wildcard entries are skipped."""
+    hosts = []
+    seen = set()
+    try:
+        lines = Path(path).expanduser().read_text(errors='replace').splitlines()
+    except OSError as e:
+        raise SSHConfigError(f"Could not read {path}: {e}")
+    for line in lines:
+        fields = line.split()
+        if not fields or fields[0].startswith('#') or fields[0].startswith('@'):
+            continue
+        # The first name of "host,alias,ip" identifies the server
+        name = fields[0].split(',')[0]
+        if name.startswith('|') or _is_pattern(name):
+            continue
+        port = 22
+        if name.startswith('[') and ']:' in name:
+            name, _, port_text = name[1:].partition(']:')
+            try:
+                port = int(port_text)
+            except ValueError:
+                continue
+        if (name.lower(), port) in seen:
+            continue
+        seen.add((name.lower(), port))
+        hosts.append({'alias': name if port == 22 else f'{name}:{port}', 'hostname': name, 'port': port,
+                      'username': default_user, 'source': 'known_hosts'})
+    return hosts
+
+
+def _signature(paths: List[Path]) -> Dict[str, Optional[int]]:
+    signature = {}
+    for path in paths:
+        try:
+            signature[str(path)] = os.stat(path).st_mtime_ns
+        except OSError:
+            signature[str(path)] = None
+    return signature
+
+
+class SSHConfigCache:
+    """Parsed hosts for a config/known_hosts pair, persisted with file mtimes."""
+
+    def __init__(self, app_dir: Path):
+        self.logger = logging.getLogger(__name__)
+        self.path = Path(app_dir) / CACHE_FILENAME
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict:
+        try:
+            data = json.loads(self.path.read_text())
+            if data.get('version') == CACHE_VERSION:
+                return data
+        except (OSError, ValueError, AttributeError):
+            pass
+        return {'version': CACHE_VERSION, 'entries': {}}
+
+    def hosts(self, config_path: Optional[Path], known_hosts_path: Optional[Path],
+              default_user: Optional[str] = None) -> Tuple[List[Dict], bool]:
+        """Hosts from the given files and whether they were served from the cache."""
+        default_user = default_user or getpass.getuser()
+        key = json.dumps([str(config_path), str(known_hosts_path), default_user])
+        with self._lock:
+            data = self._read()
+            entry = data['entries'].get(key)
+            if entry and _signature([Path(p) for p in entry['signature']]) == entry['signature']:
+                return entry['hosts'], True
+
+            hosts: List[Dict] = []
+            sources: List[Path] = []
+            if config_path is not None:
+                parser = SSHConfigParser(config_path).parse()
+                hosts.extend(parser.hosts(default_user))
+                sources.extend(parser.sources)
+            if known_hosts_path is not None:
+                hosts.extend(parse_known_hosts(known_hosts_path, default_user))
+                sources.append(Path(known_hosts_path).expanduser())
+
+            data['entries'][key] = {'signature': _signature(sources), 'hosts': hosts}
+            try:
+                tmp = self.path.with_suffix('.tmp')
+                tmp.write_text(json.dumps(data))
+                os.replace(tmp, self.path)
+            except OSError as e:
+                self.logger.warning(f"Could not write {self.path}: {e}")
+            return hosts, False
+
+
+def _server_key(server: Dict) -> Tuple[str, int, str]:
+    try:
+        port = int(server.get('port') or 22)
+    except (TypeError, ValueError):
+        port = 22
+    return str(server.get('hostname', '')).lower(), port, str(server.get('username', ''))
+
+
+def plan_sync(hosts: List[Dict], servers: List[Dict]) -> List[Dict]:
+    """Changes that bring the inventory in line with the parsed hosts.
+
+    Servers imported earlier are matched by alias and updated when the
+    config changed; other hosts are added unless a server with the same
+    hostname, port and username already exists. Imported servers whose
+    alias disappeared are reported as ``stale`` but never deleted.
+    """
+    by_alias = {(s.get('import_source'), s.get('ssh_alias')): s for s in servers if s.get('ssh_alias')}
+    known = {_server_key(s) for s in servers}
+    changes = []
+    seen_aliases = set()
+    for host in hosts:
+        alias_key = (host['source'], host['alias'])
+        if alias_key in seen_aliases:
+            continue
+        seen_aliases.add(alias_key)
+        fields = {field: host[field] for field in SYNCED_FIELDS if field in host}
+        current = by_alias.get(alias_key)
+        if current is not None:
+            changed = {field: value for field, value in fields.items() if current.get(field) != value}
+            if current.get('proxy_jump') and 'proxy_jump' not in fields:
+                changed['proxy_jump'] = None
+            if changed:
+                changes.append({'action': 'update', 'id': current['id'], 'alias': host['alias'],
+                                'fields': changed, 'previous': {f: current.get(f) for f in changed}})
+            continue
+        if _server_key(host) in known:
+            changes.append({'action': 'exists', 'alias': host['alias'], 'hostname': host['hostname']})
+            continue
+        known.add(_server_key(host))
+        server = dict(name=host['alias'], import_source=host['source'], ssh_alias=host['alias'], **fields)
+        changes.append({'action': 'add', 'alias': host['alias'], 'server': server})
+
+    sources = {host['source'] for host in hosts}
+    for (source, alias), server in by_alias.items():
+        if source in sources and (source, alias) not in seen_aliases:
+            changes.append({'action': 'stale', 'id': server['id'], 'alias': alias})
+    return changes
+
+
+def batch_records(changes: List[Dict]) -> List[Dict]:
+    """apply_batch records for the add and update changes of a plan."""
+    records = []
+    for change in changes:
+        if change['action'] == 'add':
+            change['server'].setdefault('id', str(uuid.uuid4()))
+            change['server'].setdefault('yubikey_serials', [])
+            records.append({'op': 'add', 'server': change['server']})
+        elif change['action'] == 'update':
+            records.append({'op': 'update', 'id': change['id'], 'fields': change['fields']})
+    return records
@@ -1,48 +1,79 @@
 import os
 import json
 from pathlib import Path
-import paramiko
 import logging
-from ykman.device import list_all_devices
-from yubikit.piv import PivSession, SLOT
-from yubikit.management import ManagementSession
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 import subprocess
-import tempfile
+import time
 import uuid
+from .audit import AuditState, read_authorized_keys, reconcile_serials
+from .device_watcher import enumerate_yubikeys, running_watcher
+from .fanout import exec_streaming, fan_out
+from .fleet import DEFAULT_CONCURRENCY, clamp_concurrency, run_parallel, select_servers
+from .jobs import JobCancelled
+from .keys import PublicKeyCache, openssh_fingerprint, public_key_to_openssh
+from .metrics import PIV_OPERATION_SECONDS, REMOTE_COMMANDS
+from .probe import get_probe_engine
+from .remote_keys import build_install_command, build_remove_command, install_result, remove_result
+from .search import SearchIndexCache
+from .ssh_config import DEFAULT_CONFIG_PATH, SSHConfigCache, SSHConfigError, batch_records, plan_sync
+from .ssh_pool import get_connection_pool
+from .storage import normalize_server_id, open_store
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
+
+def open_piv_session(serial: str):
+    """Open a PIV session by serial; yubikit is only imported once a device is used."""
+    from .piv import open_piv_session
+    return open_piv_session(serial)
+
+
 class SSHManager:
-    def __init__(self):
+    def __init__(self, app_dir: Optional[Path] = None, store: Optional[str] = None):
         self.logger = logging.getLogger(__name__)
         self.logger.setLevel(logging.DEBUG)
         
-        self.app_dir = Path.home() / ".yubikey-ssh-manager"
+        self.app_dir = Path(app_dir) if app_dir else Path.home() / ".yubikey-ssh-manager"
         self.servers_file = self.app_dir / "servers.json"
         self.selected_yubikey_file = self.app_dir / "selected_yubikey.json"
         self.keys_dir = self.app_dir / "keys"
+        self.revocations_dir = self.app_dir / "revocations"
         
         # Create the application directories if they don't exist
         self.app_dir.mkdir(parents=True, exist_ok=True)
         self.keys_dir.mkdir(parents=True, exist_ok=True)
         
-        # Create the servers file if it doesn't exist
-        self.servers_file.touch(exist_ok=True)
-        if not self.servers_file.read_text():
-            self.servers_file.write_text('[]')
+        # Open the server inventory (servers.json unless another store is selected)
+        self.inventory = open_store(self.app_dir, store)
+        self.search_index = SearchIndexCache(self.inventory)
+        self.ssh_config_cache = SSHConfigCache(self.app_dir)
+        self.audit_state = AuditState(self.app_dir)
+        self.key_cache = PublicKeyCache(self.keys_dir)
+        self.open_piv_session = open_piv_session
+        self.ssh_pool = get_connection_pool()
             
         # Create the selected YubiKey file if it doesn't exist
         self.selected_yubikey_file.touch(exist_ok=True)
         if not self.selected_yubikey_file.read_text():
             self.selected_yubikey_file.write_text('{}')
 
+    def _current_yubikeys(self) -> List[Dict]:
+        """Connected YubiKeys from the watcher's snapshot, or a direct enumeration."""
+        watcher = running_watcher()
+        if watcher is None:
+            return enumerate_yubikeys()
+        snapshot = watcher.snapshot()
+        if snapshot.error:
+            raise RuntimeError(snapshot.error)
+        return list(snapshot.devices)
+
     def get_yubikey_status(self) -> Dict:
         """Check if YubiKey is present and get its status."""
         try:
             # Try to list all YubiKeys
-            device_list = list_all_devices()
+            device_list = self._current_yubikeys()
             if not device_list:
                 return {
                     "status": "disconnected",
@@ -80,51 +111,18 @@ class SSHManager:
                 return key_file.read_text().strip()
             
             self.logger.debug("No existing key found, generating new key...")
-            # Create temporary files for key generation
-            with tempfile.NamedTemporaryFile(mode='w+', suffix='.pub', delete=False) as pub_key:
-                self.logger.debug(f"Created temporary file for public key: {pub_key.name}")
-                
-                # Generate RSA key in slot 9a
-                cmd = ['ykman', '--device', str(info.serial), 'piv', 'keys', 'generate', 
-                      '--pin-policy', 'ONCE', 
-                      '--pin', pin,
-                      '--algorithm', 'RSA2048',
-                      '9a', pub_key.name]
-                self.logger.debug(f"Running command: {' '.join(cmd)}")
-                
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True
-                )
-                
-                if result.returncode != 0:
-                    self.logger.error(f"Error generating key: {result.stderr}")
-                    self.logger.error(f"Command output: {result.stdout}")
-                    return None
-                
-                self.logger.debug("Key generated successfully, converting to SSH format...")
-                # Convert the public key to SSH format
-                cmd = ['ssh-keygen', '-i', '-m', 'PKCS8', '-f', pub_key.name]
-                self.logger.debug(f"Running command: {' '.join(cmd)}")
-                
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True
-                )
-                
-                if result.returncode == 0:
-                    ssh_key = result.stdout.strip()
-                    self.logger.debug("Successfully converted key to SSH format")
-                    # Save the key
-                    key_file.write_text(ssh_key)
-                    self.logger.debug(f"Saved SSH key to {key_file}")
-                    return ssh_key
-                else:
-                    self.logger.error(f"Error converting key to SSH format: {result.stderr}")
-                    self.logger.error(f"Command output: {result.stdout}")
-                    return None
+            from .piv import generate_key
+            # Generate RSA key in slot 9a over an in-process PIV session
+            with PIV_OPERATION_SECONDS.time(operation='generate_key'), \
+                    self.open_piv_session(info.serial) as session:
+                ssh_key = public_key_to_openssh(generate_key(session, pin))
+            
+            self.logger.debug("Key generated successfully")
+            # Save the key
+            key_file.write_text(ssh_key)
+            self.key_cache.put(str(info.serial), ssh_key)
+            self.logger.debug(f"Saved SSH key to {key_file}")
+            return ssh_key
                     
         except Exception as e:
             self.logger.exception("Error generating SSH key")
@@ -133,18 +131,7 @@ class SSHManager:
     def get_yubikeys(self) -> List[Dict]:
         """Get list of connected YubiKeys."""
         try:
-            devices = list_all_devices()
-            yubikeys = []
-            for _, device in devices:
-                try:
-                    yubikey = {
-                        'serial': str(device.serial),
-                        'version': '.'.join(str(x) for x in device.version)
-                    }
-                    yubikeys.append(yubikey)
-                except Exception as e:
-                    self.logger.error(f"Error getting YubiKey info: {e}")
-            return yubikeys
+            return self._current_yubikeys()
         except Exception as e:
             self.logger.exception("Error listing YubiKeys")
             return []
@@ -183,9 +170,65 @@ class SSHManager:
             self.logger.exception("Error selecting YubiKey")
             return False
 
-    def deploy_key(self, server_data: Dict, password: str, pin: str) -> Dict:
-        """Deploy SSH key to remote server"""
+    def _export_public_key(self, serial: str) -> Dict:
+        """Get the slot 9a public key of a YubiKey in OpenSSH format.
+
+        The key is read from the device on every call (slot metadata over an
+        in-process PIV session, no subprocess), so a key regenerated on the
+        YubiKey is picked up straight away. The per-serial cache under
+        keys_dir is only rewritten when the fingerprint changed.
+        """
+        self.logger.debug("Reading public key from YubiKey")
+        from .piv import YubiKeyNotFoundError, read_public_key
+        try:
+            with PIV_OPERATION_SECONDS.time(operation='read_public_key'), \
+                    self.open_piv_session(serial) as session:
+                public_key = public_key_to_openssh(read_public_key(session))
+        except YubiKeyNotFoundError as e:
+            self.logger.error(str(e))
+            return {"success": False, "message": "Selected YubiKey not found"}
+        except Exception as e:
+            self.logger.error(f"Failed to export public key: {e}")
+            return {"success": False, "message": "Failed to export public key"}
+
+        if self.key_cache.get(serial) != public_key:
+            fingerprint = self.key_cache.put(serial, public_key)
+            self.logger.info(f"Cached public key {fingerprint} for YubiKey {serial}")
+        return {"success": True, "public_key": public_key}
+
+    def _install_key(self, server_data: Dict, public_key: str, password: str, timeout: float = 10) -> Dict:
+        """Add a public key to a server's authorized_keys over SSH (idempotent)."""
+        # Connect to server, reusing a pooled connection if there is one
+        self.logger.debug(f"Connecting to {server_data['hostname']}")
+        try:
+            with self.ssh_pool.connection(
+                server_data['hostname'],
+                int(server_data['port']),
+                server_data['username'],
+                password=password,
+                timeout=timeout
+            ) as ssh:
+                # Create ~/.ssh if needed and add the key unless it is already there, in one round trip
+                stdin, stdout, stderr = ssh.exec_command(build_install_command(public_key), timeout=timeout)
+                exit_status = stdout.channel.recv_exit_status()
+                result = install_result(exit_status, stdout.read().decode(), stderr.read().decode())
+                if not result["success"]:
+                    self.logger.error(f"Failed to install key on {server_data['hostname']}: {result['message']}")
+                return result
+                
+        except Exception as e:
+            self.logger.error(f"Connection failed: {str(e)}")
+            return {"success": False, "message": f"Connection failed: {str(e)}"}
+
+    def deploy_key(self, server_data: Dict, password: str, pin: str,
+                   progress: Optional[Callable[..., None]] = None) -> Dict:
+        """Deploy SSH key to remote server
+
+        ``progress`` is called with the name of each step as it starts, and
+        may raise to stop the deployment until the key has been installed.
+        """
         self.logger.info(f"Starting key deployment for server: {server_data['name']}")
+        progress = progress or (lambda step, cancellable=True: None)
         
         try:
             # Get the selected YubiKey
@@ -195,96 +238,326 @@ class SSHManager:
             
             self.logger.debug(f"Using YubiKey with serial: {selected_serial}")
             
-            # Get the public key using ykman with the specific YubiKey
-            self.logger.debug("Exporting public key from YubiKey")
-            result = subprocess.run(
-                ['ykman', '--device', selected_serial, 'piv', 'keys', 'export', '9a', '-'],
-                capture_output=True,
-                text=True
-            )
-            
-            if result.returncode != 0:
-                self.logger.error(f"Failed to export public key: {result.stderr}")
-                return {"success": False, "message": "Failed to export public key"}
+            progress('export_key')
+            exported = self._export_public_key(selected_serial)
+            if not exported["success"]:
+                return exported
             
-            # Convert to SSH format
-            self.logger.debug("Converting to SSH format")
-            with tempfile.NamedTemporaryFile(mode='w+', suffix='.pem') as temp_key:
-                temp_key.write(result.stdout)
-                temp_key.flush()
-                
-                ssh_key_result = subprocess.run(
-                    ['ssh-keygen', '-i', '-m', 'PKCS8', '-f', temp_key.name],
-                    capture_output=True,
-                    text=True
-                )
-                
-                if ssh_key_result.returncode != 0:
-                    self.logger.error("Failed to convert key to SSH format")
-                    return {"success": False, "message": "Failed to convert key to SSH format"}
-                
-                public_key = ssh_key_result.stdout.strip()
-            
-            # Connect to server and verify SSH setup
-            self.logger.debug(f"Connecting to {server_data['hostname']}")
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
-            try:
-                ssh.connect(
-                    server_data['hostname'],
-                    port=int(server_data['port']),
-                    username=server_data['username'],
-                    password=password,
-                    timeout=10
-                )
-                
-                # Check if .ssh directory exists
-                stdin, stdout, stderr = ssh.exec_command('test -d ~/.ssh && echo "EXISTS"')
-                if stdout.channel.recv_exit_status() != 0:
-                    self.logger.error("SSH directory not found on server")
-                    return {"success": False, "message": "SSH is not properly configured on the server. The .ssh directory is missing."}
-                
-                # Check if authorized_keys exists and is writable
-                stdin, stdout, stderr = ssh.exec_command('test -w ~/.ssh/authorized_keys || test -w ~/.ssh')
-                if stdout.channel.recv_exit_status() != 0:
-                    self.logger.error("Cannot write to authorized_keys")
-                    return {"success": False, "message": "Cannot write to authorized_keys file. Please check SSH configuration on the server."}
-                
-                # Append the key
-                cmd = f'echo "{public_key}" >> ~/.ssh/authorized_keys'
-                stdin, stdout, stderr = ssh.exec_command(cmd)
-                if stdout.channel.recv_exit_status() != 0:
-                    error = stderr.read().decode().strip()
-                    self.logger.error(f"Failed to append key: {error}")
-                    return {"success": False, "message": f"Failed to add key: {error}"}
-                
+            progress('install_key')
+            result = self._install_key(server_data, exported["public_key"], password)
+            if result["success"]:
+                # The key is on the server now, so it is recorded even if cancelled meanwhile
+                progress('record_serial', cancellable=False)
                 # Update server data with YubiKey serial number
-                servers = json.loads(self.servers_file.read_text())
-                for server in servers:
-                    if str(server.get('id', '')) == str(server_data['id']):
-                        # Initialize yubikey_serials list if it doesn't exist
-                        if 'yubikey_serials' not in server:
-                            server['yubikey_serials'] = []
-                        # Add the serial if it's not already in the list
-                        if selected_serial not in server['yubikey_serials']:
-                            server['yubikey_serials'].append(selected_serial)
-                        break
-                self.servers_file.write_text(json.dumps(servers, indent=2))
-                
+                self.inventory.add_serial(str(server_data['id']), selected_serial)
                 self.logger.info("Key deployed successfully")
-                return {"success": True, "message": "Key deployed successfully"}
-                
-            except Exception as e:
-                self.logger.error(f"Connection failed: {str(e)}")
-                return {"success": False, "message": f"Connection failed: {str(e)}"}
-            finally:
-                ssh.close()
+            return result
                 
+        except JobCancelled:
+            raise
         except Exception as e:
             self.logger.error(f"Deployment failed: {str(e)}")
             return {"success": False, "message": f"Deployment failed: {str(e)}"}
 
+    def deploy_key_bulk(self, password: str, pin: str, server_ids: Optional[List[str]] = None,
+                        selector: Optional[Dict] = None, concurrency: int = DEFAULT_CONCURRENCY,
+                        timeout: float = 10) -> Iterator[Dict]:
+        """Deploy the selected YubiKey's key to many servers concurrently.
+
+        The public key is exported once, then installed over a bounded worker
+        pool. Yields one result per host as it completes, followed by a
+        summary; the authorized serials are recorded in a single inventory
+        write at the end.
+        """
+        selected_serial = self.get_selected_yubikey()
+        if not selected_serial:
+            yield {"summary": True, "success": False, "message": "No YubiKey selected"}
+            return
+
+        servers = select_servers(self, server_ids, selector)
+        if not servers:
+            yield {"summary": True, "success": False, "message": "No servers matched the selection"}
+            return
+
+        exported = self._export_public_key(selected_serial)
+        if not exported["success"]:
+            yield dict(exported, summary=True)
+            return
+        public_key = exported["public_key"]
+
+        self.logger.info(f"Deploying YubiKey {selected_serial} to {len(servers)} server(s) "
+                         f"with concurrency {clamp_concurrency(concurrency)}")
+
+        def deploy_one(server):
+            started = time.monotonic()
+            result = self._install_key(server, public_key, password, timeout=timeout)
+            return dict(result, duration=round(time.monotonic() - started, 3))
+
+        deployed = []
+        failed = 0
+        for server, result in run_parallel(servers, deploy_one, concurrency, thread_name_prefix='deploy'):
+            if isinstance(result, Exception):
+                result = {"success": False, "message": f"Deployment failed: {result}"}
+            if result["success"]:
+                deployed.append(server['id'])
+            else:
+                failed += 1
+            yield dict(result, server_id=server['id'], name=server.get('name'), hostname=server.get('hostname'))
+
+        if deployed:
+            self.inventory.apply_batch([
+                {'op': 'add_serial', 'id': server_id, 'serial': selected_serial} for server_id in deployed
+            ])
+        self.logger.info(f"Bulk deployment finished: {len(deployed)} succeeded, {failed} failed")
+        yield {
+            "summary": True,
+            "success": failed == 0,
+            "total": len(servers),
+            "succeeded": len(deployed),
+            "failed": failed
+        }
+
+    def audit_authorized_keys(self, password: Optional[str] = None, server_ids: Optional[List[str]] = None,
+                              selector: Optional[Dict] = None, concurrency: int = DEFAULT_CONCURRENCY,
+                              timeout: float = 10, full: bool = False) -> Iterator[Dict]:
+        """Check which known YubiKeys are in each server's authorized_keys.
+
+        Servers are read concurrently over SFTP (with the password if given,
+        otherwise the SSH agent and default keys). Yields one result per host,
+        then a summary; yubikey_serials are corrected in one inventory write.
+        Files whose size and mtime haven't changed since the last audit are
+        not downloaded again unless ``full`` is set.
+        """
+        servers = select_servers(self, server_ids, selector or ({} if server_ids else {'all': True}))
+        if not servers:
+            yield {"summary": True, "success": False, "message": "No servers matched the selection"}
+            return
+
+        known = self.key_cache.fingerprints()
+        known_serials = set(known.values())
+        self.logger.info(f"Auditing authorized_keys on {len(servers)} server(s) against "
+                         f"{len(known_serials)} known YubiKey(s)")
+
+        def audit_one(server):
+            started = time.monotonic()
+            try:
+                with self.ssh_pool.connection(server['hostname'], server['port'], server['username'],
+                                              password, timeout=timeout) as client:
+                    found = read_authorized_keys(client, self.audit_state, server, full=full)
+            except Exception as e:
+                # Unreachable hosts and failed logins are expected in a fleet audit
+                self.logger.warning(f"Audit of {server.get('hostname')} failed: {e}")
+                return e
+            return dict(found, duration=round(time.monotonic() - started, 3))
+
+        records = []
+        counts = {"audited": 0, "cached": 0, "updated": 0, "failed": 0}
+        for server, result in run_parallel(servers, audit_one, concurrency, thread_name_prefix='audit'):
+            host = {"server_id": server['id'], "name": server.get('name'), "hostname": server.get('hostname')}
+            if isinstance(result, Exception):
+                counts["failed"] += 1
+                yield dict(host, success=False, message=f"Audit failed: {result}")
+                continue
+
+            matched = [known[fingerprint] for fingerprint in result["fingerprints"] if fingerprint in known]
+            current = [str(serial) for serial in server.get('yubikey_serials', [])]
+            serials = reconcile_serials(current, matched, known_serials)
+            counts["audited"] += 1
+            counts["cached"] += result["cached"]
+            if serials != current:
+                counts["updated"] += 1
+                records.append({'op': 'update', 'id': server['id'], 'fields': {'yubikey_serials': serials}})
+            yield dict(host, success=True, cached=result["cached"], exists=result["exists"],
+                       keys=len(result["fingerprints"]), unknown_keys=len(result["fingerprints"]) - len(matched),
+                       yubikey_serials=serials,
+                       added=[serial for serial in serials if serial not in current],
+                       removed=[serial for serial in current if serial not in serials],
+                       duration=result["duration"])
+
+        if records:
+            self.inventory.apply_batch(records)
+        self.audit_state.save()
+        self.logger.info(f"Audit finished: {counts['audited']} audited ({counts['cached']} unchanged), "
+                         f"{counts['updated']} updated, {counts['failed']} failed")
+        yield dict(counts, summary=True, success=counts["failed"] == 0, total=len(servers))
+
+    def _remove_key(self, server_data: Dict, public_key: str, password: Optional[str], timeout: float = 10) -> Dict:
+        """Drop every authorized_keys line holding a public key, in one round trip."""
+        with self.ssh_pool.connection(server_data['hostname'], int(server_data['port']), server_data['username'],
+                                      password=password, timeout=timeout) as ssh:
+            stdin, stdout, stderr = ssh.exec_command(build_remove_command(public_key), timeout=timeout)
+            exit_status = stdout.channel.recv_exit_status()
+            return remove_result(exit_status, stdout.read().decode(), stderr.read().decode())
+
+    def get_revocation_report(self, serial: str) -> Optional[Dict]:
+        """The latest revocation report for a YubiKey serial, if any."""
+        if not str(serial).isdigit():
+            return None
+        # Timestamps in the names sort chronologically
+        reports = sorted(self.revocations_dir.glob(f"revoke_{serial}_*.json"))
+        for path in reversed(reports):
+            try:
+                return json.loads(path.read_text())
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"Ignoring unreadable revocation report {path}: {e}")
+        return None
+
+    def _save_revocation_report(self, report: Dict) -> Optional[str]:
+        finished = report['finished_at']
+        stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime(finished)) + f"{int(finished % 1 * 1e6):06d}"
+        name = f"revoke_{report['serial']}_{stamp}.json"
+        try:
+            self.revocations_dir.mkdir(parents=True, exist_ok=True)
+            (self.revocations_dir / name).write_text(json.dumps(report, indent=2))
+        except OSError as e:
+            self.logger.error(f"Could not save revocation report {name}: {e}")
+            return None
+        return name
+
+    def revoke_key(self, serial: str, password: Optional[str] = None, public_key: Optional[str] = None,
+                   retry_failed: bool = False, concurrency: int = DEFAULT_CONCURRENCY,
+                   timeout: float = 10) -> Iterator[Dict]:
+        """Remove a lost or retired YubiKey's key from every server it is authorized on.
+
+        Each server listed under the serial gets its authorized_keys rewritten
+        without the key (concurrently, with the password if given, otherwise
+        the SSH agent and default keys). Yields one result per host, then a
+        summary; the serial is dropped from yubikey_serials of every server
+        the key is gone from in one inventory write. With ``retry_failed``
+        only the servers that failed in the latest report are tried again.
+        """
+        serial = str(serial)
+        if not serial.isdigit():
+            yield {"summary": True, "success": False, "message": "Invalid YubiKey serial"}
+            return
+        public_key = (public_key or self.key_cache.get(serial) or '').strip()
+        if not public_key:
+            yield {"summary": True, "success": False,
+                   "message": f"No public key known for YubiKey {serial}; pass the key to revoke"}
+            return
+        try:
+            fingerprint = openssh_fingerprint(public_key)
+        except (ValueError, IndexError):
+            yield {"summary": True, "success": False, "message": "Not an OpenSSH public key"}
+            return
+
+        servers = self.inventory.find_by_serial(serial)
+        if retry_failed:
+            previous = self.get_revocation_report(serial)
+            failed = {host['server_id'] for host in (previous or {}).get('hosts', []) if not host['success']}
+            servers = [server for server in servers if server['id'] in failed]
+        if not servers:
+            yield {"summary": True, "success": True, "serial": serial, "total": 0,
+                   "message": "No servers left to revoke this YubiKey from"}
+            return
+        self.logger.info(f"Revoking YubiKey {serial} on {len(servers)} server(s)")
+
+        def revoke_one(server):
+            started = time.monotonic()
+            try:
+                result = self._remove_key(server, public_key, password, timeout=timeout)
+            except Exception as e:
+                # Unreachable hosts and failed logins are reported and can be retried
+                self.logger.warning(f"Revoking YubiKey {serial} on {server.get('hostname')} failed: {e}")
+                return e
+            return dict(result, duration=round(time.monotonic() - started, 3))
+
+        hosts = []
+        records = []
+        for server, result in run_parallel(servers, revoke_one, concurrency, thread_name_prefix='revoke'):
+            host = {"server_id": server['id'], "name": server.get('name'), "hostname": server.get('hostname')}
+            if isinstance(result, Exception):
+                host.update(success=False, status='error', message=f"Connection failed: {result}")
+            else:
+                host.update(result)
+                if result["success"]:
+                    records.append({'op': 'remove_serial', 'id': server['id'], 'serial': serial})
+            hosts.append(host)
+            yield host
+
+        if records:
+            self.inventory.apply_batch(records)
+        failed = sum(1 for host in hosts if not host['success'])
+        report = {"serial": serial, "fingerprint": fingerprint, "finished_at": time.time(),
+                  "retry": retry_failed, "total": len(hosts), "revoked": len(records), "failed": failed,
+                  "hosts": hosts}
+        report_name = self._save_revocation_report(report)
+        self.logger.info(f"Revocation of YubiKey {serial} finished: {len(records)} revoked, {failed} failed")
+        yield {"summary": True, "success": failed == 0, "serial": serial, "total": len(hosts),
+               "revoked": len(records), "failed": failed, "report": report_name}
+
+    def run_command(self, command: str, password: Optional[str] = None, server_ids: Optional[List[str]] = None,
+                    selector: Optional[Dict] = None, concurrency: int = DEFAULT_CONCURRENCY,
+                    timeout: float = 60) -> Iterator[Dict]:
+        """Run one shell command on many servers, streaming their output.
+
+        Servers are reached concurrently (with the password if given,
+        otherwise the SSH agent and default keys). Yields every stdout and
+        stderr line tagged with its server as it arrives, a ``done`` result
+        per host with its exit code and duration, then a summary. ``timeout``
+        bounds each host, connecting included.
+        """
+        if not command or not command.strip():
+            yield {"summary": True, "success": False, "message": "No command given"}
+            return
+        servers = select_servers(self, server_ids, selector)
+        if not servers:
+            yield {"summary": True, "success": False, "message": "No servers matched the selection"}
+            return
+        self.logger.info(f"Running command on {len(servers)} server(s): {command}")
+
+        def run_one(server, on_line, cancelled):
+            started = time.monotonic()
+            try:
+                with self.ssh_pool.connection(server['hostname'], int(server['port']), server['username'],
+                                              password, timeout=timeout) as client:
+                    remaining = max(timeout - (time.monotonic() - started), 0.1)
+                    result = exec_streaming(client, command, remaining, on_line, cancelled)
+            except Exception as e:
+                # Unreachable hosts and failed logins are reported per host
+                self.logger.warning(f"Running command on {server.get('hostname')} failed: {e}")
+                return e
+            return dict(result, duration=round(time.monotonic() - started, 3))
+
+        started = time.monotonic()
+        exit_codes: Dict[str, int] = {}
+        durations = []
+        counts = {"succeeded": 0, "failed": 0, "timed_out": 0, "errors": 0}
+        for event in fan_out(servers, run_one, concurrency, thread_name_prefix='command'):
+            server = event["server"]
+            host = {"server_id": server['id'], "hostname": server.get('hostname')}
+            if "line" in event:
+                yield dict(host, stream=event["stream"], line=event["line"])
+                continue
+
+            result = event["result"]
+            host.update(name=server.get('name'), done=True)
+            if isinstance(result, Exception):
+                counts["errors"] += 1
+                REMOTE_COMMANDS.inc(result='error')
+                yield dict(host, success=False, exit_code=None, message=f"Connection failed: {result}")
+                continue
+            durations.append(result["duration"])
+            if result["timed_out"]:
+                counts["timed_out"] += 1
+                REMOTE_COMMANDS.inc(result='timeout')
+                yield dict(host, success=False, exit_code=None, timed_out=True, duration=result["duration"],
+                           message=f"Timed out after {timeout:g}s")
+                continue
+            exit_codes[str(result["exit_code"])] = exit_codes.get(str(result["exit_code"]), 0) + 1
+            success = result["exit_code"] == 0
+            counts["succeeded" if success else "failed"] += 1
+            REMOTE_COMMANDS.inc(result='ok' if success else 'nonzero')
+            yield dict(host, success=success, exit_code=result["exit_code"], timed_out=False,
+                       duration=result["duration"])
+
+        self.logger.info(f"Command finished: {counts['succeeded']} succeeded, {counts['failed']} failed, "
+                         f"{counts['timed_out']} timed out, {counts['errors']} unreachable")
+        yield dict(counts, summary=True, success=counts["succeeded"] == len(servers), total=len(servers),
+                   exit_codes=exit_codes, elapsed=round(time.monotonic() - started, 3),
+                   duration={"min": min(durations), "max": max(durations),
+                             "mean": round(sum(durations) / len(durations), 3)} if durations else None)
+
     def connect_to_server(self, server_id: str) -> Dict:
         """Connect to a server using the YubiKey."""
         try:
@@ -294,14 +567,14 @@ class SSHManager:
                 return {"success": False, "message": "Server not found"}
             
             # Get the current YubiKey
-            device_list = list_all_devices()
+            device_list = self._current_yubikeys()
             selected_serial = self.get_selected_yubikey()
             
             if not selected_serial:
                 return {"success": False, "message": "No YubiKey selected"}
             
             self.logger.debug(f"Using YubiKey with serial: {selected_serial}")
-            device_info = next((d for d in device_list if d[1].serial == int(selected_serial)), None)
+            device_info = next((d for d in device_list if d['serial'] == str(selected_serial)), None)
             if not device_info:
                 return {"success": False, "message": "Selected YubiKey not found"}
 
@@ -318,6 +591,8 @@ class SSHManager:
                 f"{server['username']}@{server['hostname']}",
                 '-p', str(server['port'])
             ]
+            if server.get('proxy_jump'):
+                ssh_command[1:1] = ['-J', server['proxy_jump']]
             
             applescript_command = [
                 'osascript',
@@ -337,80 +612,62 @@ class SSHManager:
     def get_servers(self) -> List[Dict]:
         """Get list of configured servers."""
         try:
-            if not self.servers_file.exists():
-                self.servers_file.write_text('[]')
-                return []
-            
-            content = self.servers_file.read_text().strip()
-            if not content:
-                self.servers_file.write_text('[]')
-                return []
-            
-            servers = json.loads(content)
-            if not isinstance(servers, list):
-                self.logger.error("Invalid server data in file")
-                self.servers_file.write_text('[]')
-                return []
-            
-            # Ensure each server has a valid UUID
-            modified = False
-            for server in servers:
-                if 'id' not in server or not server['id']:
-                    server['id'] = str(uuid.uuid4())
-                    modified = True
-                else:
-                    try:
-                        # Validate and normalize UUID format
-                        uuid_obj = uuid.UUID(str(server['id']))
-                        if str(uuid_obj) != server['id']:
-                            server['id'] = str(uuid_obj)
-                            modified = True
-                    except ValueError:
-                        # Replace invalid UUID with a new one
-                        server['id'] = str(uuid.uuid4())
-                        modified = True
-            
-            # Save back with normalized UUIDs if needed
-            if modified:
-                self.servers_file.write_text(json.dumps(servers, indent=2))
-            
-            return servers
-            
-        except json.JSONDecodeError as e:
-            self.logger.error(f"Invalid JSON in servers file: {e}")
-            self.servers_file.write_text('[]')
-            return []
+            return self.inventory.all()
         except Exception as e:
             self.logger.exception("Error loading servers")
             return []
 
+    def search_servers(self, **query) -> Dict:
+        """One page of servers matching a search (see ServerIndex.search)."""
+        return self.search_index.get().search(**query)
+
     def add_server(self, server_data: Dict) -> bool:
         """Add a new server configuration."""
         try:
-            servers = self.get_servers()
-            
             # Generate new UUID
             server_data['id'] = str(uuid.uuid4())
-            
-            servers.append(server_data)
-            self.servers_file.write_text(json.dumps(servers, indent=2))
+            self.inventory.add(server_data)
             return True
             
         except Exception as e:
             self.logger.exception("Error adding server")
             return False
 
+    def get_server_health(self, server_ids: Optional[List[str]] = None, refresh: bool = False) -> Dict[str, Dict]:
+        """Reachability and SSH banner per server id, from the probe cache where fresh."""
+        if server_ids:
+            servers = select_servers(self, server_ids=server_ids)
+        else:
+            servers = self.get_servers()
+        return get_probe_engine().probe_servers(servers, refresh=refresh)
+
+    def sync_ssh_config(self, preview: bool = False, config_path: Optional[Path] = DEFAULT_CONFIG_PATH,
+                        known_hosts_path: Optional[Path] = None) -> Dict:
+        """Add or update servers from ssh_config (and optionally known_hosts) in one batched write."""
+        try:
+            hosts, cached = self.ssh_config_cache.hosts(config_path, known_hosts_path)
+        except SSHConfigError as e:
+            return {"success": False, "message": str(e)}
+        changes = plan_sync(hosts, self.inventory.all())
+        counts = {action: sum(1 for c in changes if c['action'] == action)
+                  for action in ('add', 'update', 'exists', 'stale')}
+        if not preview:
+            records = batch_records(changes)
+            try:
+                self.inventory.apply_batch(records)
+            except Exception as e:
+                self.logger.exception("Error importing servers from ssh config")
+                return {"success": False, "message": f"Failed to import servers: {e}"}
+            self.logger.info(f"Imported ssh config: {counts['add']} added, {counts['update']} updated")
+        return {"success": True, "preview": preview, "cached": cached, "hosts": len(hosts),
+                "counts": counts, "changes": changes}
+
     def delete_server(self, server_id: str) -> bool:
         """Delete a server configuration."""
         try:
             # Ensure server_id is a valid UUID string
-            uuid_obj = uuid.UUID(str(server_id))
-            server_id = str(uuid_obj)
-            
-            servers = self.get_servers()
-            # Remove server with matching UUID
-            servers = [s for s in servers if str(s.get('id', '')) != server_id]
-            self.servers_file.write_text(json.dumps(servers, indent=2))
+            server_id = normalize_server_id(server_id)
+            self.inventory.delete(server_id)
             return True
             
         except ValueError:
@@ -423,32 +680,14 @@ class SSHManager:
     def get_server(self, server_id) -> Optional[Dict]:
         """Get a server by ID."""
         try:
-            if not self.servers_file.exists():
-                self.logger.error("Servers file does not exist")
-                return None
-
             # Ensure server_id is a valid UUID string
-            uuid_obj = uuid.UUID(str(server_id))
-            target_id = str(uuid_obj)
-            
-            servers = json.loads(self.servers_file.read_text())
+            target_id = normalize_server_id(server_id)
             
-            # Debug logging
             self.logger.debug(f"Looking for server with ID: {target_id}")
-            self.logger.debug(f"Available servers: {servers}")
-            
-            for server in servers:
-                try:
-                    # Convert stored ID to UUID for comparison
-                    stored_id = str(uuid.UUID(str(server.get('id', ''))))
-                    if stored_id == target_id:
-                        self.logger.debug(f"Found server: {server}")
-                        return server
-                except ValueError:
-                    continue
-                    
-            self.logger.error(f"No server found with ID {target_id}")
-            return None
+            server = self.inventory.get(target_id)
+            if server is None:
+                self.logger.error(f"No server found with ID {target_id}")
+            return server
             
         except ValueError:
             self.logger.error(f"Invalid UUID format: {server_id}")
@@ -457,30 +696,31 @@ class SSHManager:
             self.logger.exception(f"Error getting server with ID {server_id}")
             return None
 
+    def get_inventory_revision(self) -> int:
+        """Counter that changes whenever the server inventory changes."""
+        return self.inventory.revision()
+
+    def get_servers_by_hostname(self, hostname: str) -> List[Dict]:
+        """Get all servers configured for a hostname."""
+        return self.inventory.find_by_hostname(hostname)
+
+    def get_servers_for_yubikey(self, serial: str) -> List[Dict]:
+        """Get all servers a YubiKey is authorized on."""
+        return self.inventory.find_by_serial(serial)
+
     def update_server(self, server_id, server_data):
         """Update server details"""
         try:
             # Ensure server_id is a valid UUID string
-            uuid_obj = uuid.UUID(str(server_id))
-            target_id = str(uuid_obj)
-            
-            servers = self.get_servers()
-            for server in servers:
-                try:
-                    stored_id = str(uuid.UUID(str(server.get('id', ''))))
-                    if stored_id == target_id:
-                        # Update server details while preserving the ID
-                        server.update({
-                            'name': server_data['name'],
-                            'hostname': server_data['hostname'],
-                            'username': server_data['username'],
-                            'port': server_data['port']
-                        })
-                        self.servers_file.write_text(json.dumps(servers, indent=2))
-                        return True
-                except ValueError:
-                    continue
-            return False
+            target_id = normalize_server_id(server_id)
+            
+            # Update server details while preserving the ID
+            return self.inventory.update(target_id, {
+                'name': server_data['name'],
+                'hostname': server_data['hostname'],
+                'username': server_data['username'],
+                'port': server_data['port']
+            })
         except ValueError:
             self.logger.error(f"Invalid UUID format: {server_id}")
             return False
@@ -495,28 +735,19 @@ class SSHManager:
             if not public_key:
                 return False
 
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
             # Connect to the server
-            ssh.connect(
-                hostname=server_data['hostname'],
-                username=server_data['username'],
-                port=int(server_data['port'])
-            )
-
-            # Create .ssh directory if it doesn't exist
-            commands = [
-                'mkdir -p ~/.ssh',
-                'chmod 700 ~/.ssh',
-                f'echo "{public_key}" >> ~/.ssh/authorized_keys',
-                'chmod 600 ~/.ssh/authorized_keys'
-            ]
+            with self.ssh_pool.connection(
+                server_data['hostname'],
+                int(server_data['port']),
+                server_data['username']
+            ) as ssh:
+                stdin, stdout, stderr = ssh.exec_command(build_install_command(public_key))
+                exit_status = stdout.channel.recv_exit_status()
+                result = install_result(exit_status, stdout.read().decode(), stderr.read().decode())
+                if not result["success"]:
+                    self.logger.error(f"Failed to install key: {result['message']}")
+                    return False
 
-            for cmd in commands:
-                ssh.exec_command(cmd)
-
-            ssh.close()
             return True
             
         except Exception as e:
@@ -532,33 +763,11 @@ class SSHManager:
                 self.logger.error("No YubiKey selected")
                 return None
 
-            # Try to get the public key directly
-            result = subprocess.run(
-                [
-                    'ykman', 'piv', 'keys', 'export', '9a', '-',
-                    '--format', 'PEM'
-                ],
-                capture_output=True,
-                text=True
-            )
-
-            if result.returncode == 0 and result.stdout:
-                # Write the key to a temporary file
-                with tempfile.NamedTemporaryFile(mode='w+', suffix='.pem') as temp_key:
-                    temp_key.write(result.stdout)
-                    temp_key.flush()
-                    
-                    # Convert to SSH public key format
-                    ssh_key_result = subprocess.run(
-                        ['ssh-keygen', '-y', '-f', temp_key.name],
-                        capture_output=True,
-                        text=True
-                    )
-                    
-                    if ssh_key_result.returncode == 0 and ssh_key_result.stdout:
-                        return ssh_key_result.stdout.strip()
+            exported = self._export_public_key(selected_serial)
+            if exported["success"]:
+                return exported["public_key"]
             
-            self.logger.error(f"Failed to get public key: {result.stderr}")
+            self.logger.error(f"Failed to get public key: {exported['message']}")
             return None
             
         except Exception as e:
@@ -0,0 +1,199 @@
+import time
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from .metrics import SSH_CONNECT_SECONDS, SSH_CONNECTIONS
+
+if TYPE_CHECKING:
+    import paramiko
+
+logger = logging.getLogger(__name__)
+
+
+class PoolExhaustedError(Exception):
+    """Raised when no connection slot for a host frees up in time."""
+
+
+class SSHConnectionPool:
+    """Reusable authenticated paramiko clients.
+
+    Clients are keyed by (host, port, user, auth identity) so a password is
+    never reused for a different one. At most ``max_per_host`` clients per
+    host:port are checked out at once, idle clients are checked before
+    reuse and closed after ``idle_ttl`` seconds, and transports send
+    keepalives so NAT and firewalls don't drop them while idle.
+    """
+
+    def __init__(self, max_per_host: int = 4, idle_ttl: float = 300.0, keepalive: int = 30):
+        self.max_per_host = max_per_host
+        self.idle_ttl = idle_ttl
+        self.keepalive = keepalive
+        self._lock = threading.Lock()
+        self._idle: Dict[Tuple, List[Tuple[float, 'paramiko.SSHClient']]] = {}
+        self._slots: Dict[Tuple[str, int], threading.BoundedSemaphore] = {}
+        self._reaper = None
+        # Bumped by close_all; clients checked out under an older epoch aren't pooled again
+        self._epoch = 0
+
+    @staticmethod
+    def _identity(password: Optional[str]) -> str:
+        # Keys only ever hold a digest of the password, never the password itself
+        if password is None:
+            return 'agent'
+        return 'password:' + hashlib.sha256(password.encode()).hexdigest()
+
+    def _host_slots(self, hostname: str, port: int) -> threading.BoundedSemaphore:
+        with self._lock:
+            slots = self._slots.get((hostname, port))
+            if slots is None:
+                slots = threading.BoundedSemaphore(self.max_per_host)
+                self._slots[(hostname, port)] = slots
+            return slots
+
+    @SSH_CONNECT_SECONDS.time()
+    def _connect(self, hostname: str, port: int, username: str, password: Optional[str],
+                 timeout: float) -> 'paramiko.SSHClient':
+        # paramiko is slow to import, so it is loaded with the first connection
+        import paramiko
+
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(
+            hostname,
+            port=port,
+            username=username,
+            password=password,
+            timeout=timeout,
+            banner_timeout=timeout,
+            auth_timeout=timeout
+        )
+        client.get_transport().set_keepalive(self.keepalive)
+        return client
+
+    @staticmethod
+    def _healthy(client: 'paramiko.SSHClient') -> bool:
+        transport = client.get_transport()
+        if transport is None or not transport.is_active() or not transport.is_authenticated():
+            return False
+        try:
+            transport.send_ignore()
+            return True
+        except Exception:
+            return False
+
+    def _checkout_idle(self, key: Tuple) -> Optional['paramiko.SSHClient']:
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    return None
+                _, client = idle.pop()
+            if self._healthy(client):
+                return client
+            logger.debug(f"Discarding dead pooled connection to {key[0]}:{key[1]}")
+            client.close()
+
+    @contextmanager
+    def connection(self, hostname: str, port: int, username: str, password: Optional[str] = None,
+                   timeout: float = 10):
+        """Check out a connected client, returning it to the pool afterwards.
+
+        If the block raises, the client is closed rather than reused.
+        """
+        port = int(port)
+        key = (hostname, port, username, self._identity(password))
+        slots = self._host_slots(hostname, port)
+        epoch = self._epoch
+        if not slots.acquire(timeout=timeout):
+            raise PoolExhaustedError(f"No free connection slot for {hostname}:{port}")
+        client = None
+        reusable = False
+        try:
+            client = self._checkout_idle(key)
+            if client is None:
+                logger.debug(f"Opening new SSH connection to {username}@{hostname}:{port}")
+                client = self._connect(hostname, port, username, password, timeout)
+                SSH_CONNECTIONS.inc(result='new')
+            else:
+                SSH_CONNECTIONS.inc(result='reused')
+                logger.debug(f"Reusing pooled SSH connection to {username}@{hostname}:{port}")
+            yield client
+            reusable = True
+        finally:
+            if client is not None:
+                with self._lock:
+                    pooled = reusable and epoch == self._epoch
+                    if pooled:
+                        self._idle.setdefault(key, []).append((time.monotonic(), client))
+                if pooled:
+                    self._start_reaper()
+                else:
+                    client.close()
+            slots.release()
+
+    def evict_idle(self, max_idle: Optional[float] = None) -> int:
+        """Close clients idle for longer than max_idle (default idle_ttl)."""
+        max_idle = self.idle_ttl if max_idle is None else max_idle
+        cutoff = time.monotonic() - max_idle
+        expired = []
+        with self._lock:
+            for key in list(self._idle):
+                keep = []
+                for last_used, client in self._idle[key]:
+                    (expired if last_used <= cutoff else keep).append((last_used, client))
+                if keep:
+                    self._idle[key] = keep
+                else:
+                    del self._idle[key]
+        for _, client in expired:
+            client.close()
+        if expired:
+            logger.debug(f"Evicted {len(expired)} idle SSH connection(s)")
+        return len(expired)
+
+    def _start_reaper(self):
+        with self._lock:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap, args=(self._epoch,), name='ssh-pool-reaper',
+                                            daemon=True)
+            self._reaper.start()
+
+    def _reap(self, epoch: int):
+        interval = max(1.0, min(self.idle_ttl / 2, 30.0))
+        while True:
+            time.sleep(interval)
+            if self._epoch != epoch:
+                return
+            try:
+                self.evict_idle()
+            except Exception:
+                logger.exception("Error evicting idle SSH connections")
+
+    def close_all(self):
+        """Close every pooled client; checked-out clients are closed on return.
+
+        The pool stays usable: later connections are opened afresh and
+        pooled again, and the reaper restarts with the first of them.
+        """
+        with self._lock:
+            self._epoch += 1
+            self._reaper = None
+        closed = self.evict_idle(max_idle=-1)
+        logger.info(f"SSH connection pool closed ({closed} idle connection(s))")
+
+
+_pool: Optional[SSHConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_connection_pool() -> SSHConnectionPool:
+    """The process-wide SSH connection pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SSHConnectionPool()
+        return _pool
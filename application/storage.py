@@ -0,0 +1,736 @@
+import os
+import json
+import logging
+import sqlite3
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .metrics import INVENTORY_IO_SECONDS
+
+STORE_ENV_VAR = 'YUBIKEY_SSH_MANAGER_STORE'
+DEFAULT_STORE = 'json'
+
+# Columns that live in their own SQLite column; anything else goes to `extra`
+CORE_FIELDS = ('name', 'hostname', 'username', 'port')
+
+
+def normalize_server_id(server_id) -> str:
+    """Return the canonical string form of a server UUID (raises ValueError)."""
+    return str(uuid.UUID(str(server_id)))
+
+
+def normalize_server_ids(servers: List[Dict]) -> bool:
+    """Give every server a canonical UUID in place. Returns True if any changed."""
+    modified = False
+    for server in servers:
+        if 'id' not in server or not server['id']:
+            server['id'] = str(uuid.uuid4())
+            modified = True
+        else:
+            try:
+                # Validate and normalize UUID format
+                normalized = normalize_server_id(server['id'])
+                if normalized != server['id']:
+                    server['id'] = normalized
+                    modified = True
+            except ValueError:
+                # Replace invalid UUID with a new one
+                server['id'] = str(uuid.uuid4())
+                modified = True
+    return modified
+
+
+class InventoryStore:
+    """Interface shared by the server inventory backends.
+
+    Server records are plain dicts with an ``id`` plus the fields the UI
+    edits (``name``, ``hostname``, ``username``, ``port``) and an optional
+    ``yubikey_serials`` list. Returned dicts must be treated as read-only.
+    """
+
+    _instances: Dict[Tuple[str, Path], 'InventoryStore'] = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def for_path(cls, path: Path) -> 'InventoryStore':
+        """Get the store shared by every manager using this file."""
+        path = Path(path).resolve()
+        key = (cls.__name__, path)
+        with InventoryStore._instances_lock:
+            store = InventoryStore._instances.get(key)
+            if store is None:
+                store = cls(path)
+                InventoryStore._instances[key] = store
+            return store
+
+    def all(self) -> List[Dict]:
+        """Get all servers in insertion order."""
+        raise NotImplementedError
+
+    def iter_all(self, page_size: int = 500) -> Iterator[Dict]:
+        """Iterate over all servers in insertion order without building a new list of records."""
+        yield from self.all()
+
+    def get(self, server_id: str) -> Optional[Dict]:
+        """Get a server by its normalized UUID."""
+        raise NotImplementedError
+
+    def find_by_hostname(self, hostname: str) -> List[Dict]:
+        """Get all servers with the given hostname (case-insensitive)."""
+        raise NotImplementedError
+
+    def find_by_serial(self, serial: str) -> List[Dict]:
+        """Get all servers the given YubiKey serial is authorized on."""
+        raise NotImplementedError
+
+    def add(self, server_data: Dict):
+        raise NotImplementedError
+
+    def update(self, server_id: str, fields: Dict) -> bool:
+        raise NotImplementedError
+
+    def delete(self, server_id: str) -> bool:
+        raise NotImplementedError
+
+    def add_serial(self, server_id: str, serial: str) -> bool:
+        """Record that a YubiKey serial is authorized on a server."""
+        raise NotImplementedError
+
+    def remove_serial(self, server_id: str, serial: str) -> bool:
+        """Record that a YubiKey serial is no longer authorized on a server."""
+        raise NotImplementedError
+
+    def apply_batch(self, records: List[Dict]):
+        """Apply several mutation records (see apply_journal_record) in one write."""
+        raise NotImplementedError
+
+    def revision(self) -> int:
+        """A counter that changes whenever the inventory changes."""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        """Number of servers in the inventory."""
+        raise NotImplementedError
+
+
+class JSONInventoryStore(InventoryStore):
+    """Shared, indexed view of servers.json.
+
+    The file is only re-read when its mtime, size or inode changes, so
+    lookups by id, hostname or YubiKey serial are dictionary hits instead of
+    a parse and a linear scan per request. Records left in servers.journal by
+    the journal backend are folded into servers.json on load, so switching
+    backends never drops or resurrects servers.
+    """
+
+    def __init__(self, path: Path):
+        self.logger = logging.getLogger(__name__)
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._signature = None
+        self._servers: List[Dict] = []
+        self._by_id: Dict[str, Dict] = {}
+        self._by_hostname: Dict[str, List[Dict]] = {}
+        self._by_serial: Dict[str, List[Dict]] = {}
+        self._revision = 0
+        # Written by JournaledJSONInventoryStore; every JSON backend replays it
+        self.journal_path = self.path.with_suffix('.journal')
+
+    @staticmethod
+    def _file_signature(path: Path) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _stat_signature(self):
+        return (self._file_signature(self.path), self._file_signature(self.journal_path))
+
+    def _ensure_loaded(self):
+        if self._stat_signature() == self._signature:
+            return
+        self._load()
+
+    def _read_snapshot(self) -> Tuple[List[Dict], bool]:
+        """The servers in servers.json with normalized ids, and whether the file needs rewriting."""
+        try:
+            content = self.path.read_text().strip() if self.path.exists() else ''
+            servers = json.loads(content) if content else []
+            if not isinstance(servers, list):
+                self.logger.error("Invalid server data in file")
+                return [], True
+        except json.JSONDecodeError as e:
+            self.logger.error(f"Invalid JSON in servers file: {e}")
+            return [], True
+        return servers, normalize_server_ids(servers) or not content
+
+    def _replay_journal(self, servers: List[Dict]) -> Tuple[List[Dict], int]:
+        """Apply servers.journal over a snapshot; returns the servers and the records applied."""
+        state = {server['id']: server for server in servers}
+        replayed = 0
+        if self.journal_path.exists():
+            with open(self.journal_path, 'rb+') as journal:
+                valid_bytes = 0
+                for line_number, line in enumerate(journal, 1):
+                    if not line.endswith(b'\n'):
+                        # A torn final line is expected after a crash mid-append;
+                        # drop it so the next append starts on a fresh line
+                        self.logger.warning(f"Discarding incomplete journal line {line_number}")
+                        journal.truncate(valid_bytes)
+                        break
+                    valid_bytes += len(line)
+                    if not line.strip():
+                        continue
+                    try:
+                        apply_journal_record(state, json.loads(line))
+                        replayed += 1
+                    except (json.JSONDecodeError, KeyError, ValueError) as e:
+                        self.logger.warning(f"Skipping journal line {line_number}: {e}")
+        return list(state.values()), replayed
+
+    @INVENTORY_IO_SECONDS.time(backend='json', operation='load')
+    def _load(self):
+        """Parse servers.json, normalize ids and rebuild the indexes."""
+        servers, modified = self._read_snapshot()
+        # Records the journal backend hasn't compacted yet are part of the
+        # inventory; fold them in before servers.json is rewritten over them
+        servers, replayed = self._replay_journal(servers)
+        if replayed:
+            self.logger.warning(f"Folding {replayed} record(s) from {self.journal_path} into {self.path}")
+            self._replace_snapshot(servers)
+        elif modified:
+            # Save back with normalized UUIDs if needed
+            self._write(servers)
+        else:
+            self._index(servers)
+            self._signature = self._stat_signature()
+
+    def _index(self, servers: List[Dict]):
+        by_id = {}
+        by_hostname = {}
+        by_serial = {}
+        for server in servers:
+            by_id[server['id']] = server
+            hostname = str(server.get('hostname', '')).lower()
+            by_hostname.setdefault(hostname, []).append(server)
+            for serial in server.get('yubikey_serials', []):
+                by_serial.setdefault(str(serial), []).append(server)
+        self._servers = servers
+        self._by_id = by_id
+        self._by_hostname = by_hostname
+        self._by_serial = by_serial
+        self._revision += 1
+
+    @INVENTORY_IO_SECONDS.time(backend='json', operation='write')
+    def _write(self, servers: List[Dict]):
+        self.path.write_text(json.dumps(servers, indent=2))
+        self._index(servers)
+        self._signature = self._stat_signature()
+
+    def _write_snapshot(self, servers: List[Dict]):
+        """Atomically replace servers.json (temp file, fsync, rename)."""
+        tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as tmp:
+            tmp.write(json.dumps(servers, indent=2))
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(tmp_path, self.path)
+        dir_fd = os.open(self.path.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def _replace_snapshot(self, servers: List[Dict]):
+        """Write servers as the new snapshot, then empty the journal it supersedes."""
+        # In this order, a crash in between leaves a journal whose replay is a no-op
+        self._write_snapshot(servers)
+        self.journal_path.write_text('')
+        self._index(servers)
+        self._signature = self._stat_signature()
+
+    def _commit(self, servers: List[Dict], record: Dict):
+        """Persist the new server list produced by a single mutation record."""
+        self._write(servers)
+
+    def revision(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return self._revision
+
+    def all(self) -> List[Dict]:
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._servers)
+
+    def count(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self._servers)
+
+    def get(self, server_id: str) -> Optional[Dict]:
+        with self._lock:
+            self._ensure_loaded()
+            return self._by_id.get(server_id)
+
+    def find_by_hostname(self, hostname: str) -> List[Dict]:
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._by_hostname.get(hostname.lower(), []))
+
+    def find_by_serial(self, serial: str) -> List[Dict]:
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._by_serial.get(str(serial), []))
+
+    def add(self, server_data: Dict):
+        with self._lock:
+            self._ensure_loaded()
+            self._commit(self._servers + [server_data], {'op': 'add', 'server': server_data})
+
+    def update(self, server_id: str, fields: Dict) -> bool:
+        with self._lock:
+            self._ensure_loaded()
+            current = self._by_id.get(server_id)
+            if current is None:
+                return False
+            servers = [dict(s, **fields) if s is current else s for s in self._servers]
+            self._commit(servers, {'op': 'update', 'id': server_id, 'fields': fields})
+            return True
+
+    def delete(self, server_id: str) -> bool:
+        with self._lock:
+            self._ensure_loaded()
+            if server_id not in self._by_id:
+                return False
+            servers = [s for s in self._servers if s['id'] != server_id]
+            self._commit(servers, {'op': 'delete', 'id': server_id})
+            return True
+
+    def add_serial(self, server_id: str, serial: str) -> bool:
+        with self._lock:
+            self._ensure_loaded()
+            current = self._by_id.get(server_id)
+            if current is None:
+                return False
+            if serial in current.get('yubikey_serials', []):
+                return True
+            serials = list(current.get('yubikey_serials', [])) + [serial]
+            servers = [dict(s, yubikey_serials=serials) if s is current else s for s in self._servers]
+            self._commit(servers, {'op': 'add_serial', 'id': server_id, 'serial': serial})
+            return True
+
+    def remove_serial(self, server_id: str, serial: str) -> bool:
+        with self._lock:
+            self._ensure_loaded()
+            current = self._by_id.get(server_id)
+            if current is None:
+                return False
+            if serial not in current.get('yubikey_serials', []):
+                return True
+            serials = [s for s in current.get('yubikey_serials', []) if s != serial]
+            servers = [dict(s, yubikey_serials=serials) if s is current else s for s in self._servers]
+            self._commit(servers, {'op': 'remove_serial', 'id': server_id, 'serial': serial})
+            return True
+
+    def apply_batch(self, records: List[Dict]):
+        if not records:
+            return
+        with self._lock:
+            self._ensure_loaded()
+            state = {server['id']: server for server in self._servers}
+            for record in records:
+                apply_journal_record(state, record)
+            self._commit(list(state.values()), {'op': 'batch', 'records': records})
+
+
+def apply_journal_record(state: Dict[str, Dict], record: Dict):
+    """Apply one journal record to an id-ordered server mapping.
+
+    Replaying a record more than once has no further effect, so a journal
+    that survives a crash between snapshot rename and truncation is safe.
+    """
+    op = record.get('op')
+    if op == 'add':
+        server = record['server']
+        state[server['id']] = server
+    elif op == 'update':
+        if record['id'] in state:
+            state[record['id']] = dict(state[record['id']], **record['fields'])
+    elif op == 'delete':
+        state.pop(record['id'], None)
+    elif op == 'add_serial':
+        server = state.get(record['id'])
+        if server is not None and record['serial'] not in server.get('yubikey_serials', []):
+            serials = list(server.get('yubikey_serials', [])) + [record['serial']]
+            state[record['id']] = dict(server, yubikey_serials=serials)
+    elif op == 'remove_serial':
+        server = state.get(record['id'])
+        if server is not None and record['serial'] in server.get('yubikey_serials', []):
+            serials = [serial for serial in server['yubikey_serials'] if serial != record['serial']]
+            state[record['id']] = dict(server, yubikey_serials=serials)
+    elif op == 'batch':
+        for sub_record in record['records']:
+            apply_journal_record(state, sub_record)
+    else:
+        raise ValueError(f"Unknown journal operation: {op}")
+
+
+class JournaledJSONInventoryStore(JSONInventoryStore):
+    """servers.json snapshot plus an append-only NDJSON mutation journal.
+
+    Each mutation is one fsynced line in servers.journal instead of a full
+    rewrite of servers.json. On load the journal is replayed over the
+    snapshot; once it grows past ``compact_bytes`` a background thread folds
+    it into a new snapshot written atomically (temp file plus rename).
+    """
+
+    compact_bytes = 1024 * 1024
+
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self._compacting = False
+
+    @INVENTORY_IO_SECONDS.time(backend='journal', operation='load')
+    def _load(self):
+        """Read the snapshot, replay the journal over it and rebuild the indexes."""
+        servers, modified = self._read_snapshot()
+        # Persist generated ids right away so journal records keep matching them
+        if modified:
+            self._write_snapshot(servers)
+
+        servers, replayed = self._replay_journal(servers)
+        if replayed:
+            self.logger.debug(f"Replayed {replayed} journal record(s) over {self.path}")
+
+        self._index(servers)
+        self._signature = self._stat_signature()
+
+    @INVENTORY_IO_SECONDS.time(backend='journal', operation='write')
+    def _write_snapshot(self, servers: List[Dict]):
+        super()._write_snapshot(servers)
+
+    def _write(self, servers: List[Dict]):
+        self._replace_snapshot(servers)
+
+    @INVENTORY_IO_SECONDS.time(backend='journal', operation='append')
+    def _commit(self, servers: List[Dict], record: Dict):
+        with open(self.journal_path, 'a') as journal:
+            journal.write(json.dumps(record, separators=(',', ':')) + '\n')
+            journal.flush()
+            os.fsync(journal.fileno())
+        self._index(servers)
+        self._signature = self._stat_signature()
+
+        if not self._compacting and self._signature[1] and self._signature[1][1] > self.compact_bytes:
+            self._compacting = True
+            threading.Thread(target=self.compact, name='inventory-compaction', daemon=True).start()
+
+    def compact(self):
+        """Fold the journal into a fresh snapshot and truncate it."""
+        try:
+            with self._lock:
+                self._ensure_loaded()
+                self.logger.info(f"Compacting inventory journal {self.journal_path}")
+                self._write(self._servers)
+        except Exception:
+            self.logger.exception("Error compacting inventory journal")
+        finally:
+            self._compacting = False
+
+
+class SQLiteInventoryStore(InventoryStore):
+    """Server inventory kept in an indexed SQLite database (WAL mode).
+
+    Single-row mutations touch one B-tree row instead of rewriting the whole
+    inventory. On first open an existing servers.json (with any
+    servers.journal) next to the database is imported once.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS servers (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            id TEXT NOT NULL UNIQUE,
+            name TEXT,
+            hostname TEXT,
+            username TEXT,
+            port,
+            extra TEXT NOT NULL DEFAULT '{}'
+        );
+        CREATE INDEX IF NOT EXISTS idx_servers_hostname ON servers (hostname COLLATE NOCASE);
+        CREATE INDEX IF NOT EXISTS idx_servers_username ON servers (username);
+        CREATE TABLE IF NOT EXISTS server_yubikeys (
+            server_id TEXT NOT NULL REFERENCES servers (id) ON DELETE CASCADE,
+            serial TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            PRIMARY KEY (server_id, serial)
+        );
+        CREATE INDEX IF NOT EXISTS idx_server_yubikeys_serial ON server_yubikeys (serial);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """
+
+    def __init__(self, path: Path, json_path: Optional[Path] = None):
+        self.logger = logging.getLogger(__name__)
+        self.path = Path(path)
+        self.json_path = Path(json_path) if json_path else self.path.with_name('servers.json')
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA foreign_keys=ON')
+        with self._conn:
+            self._conn.executescript(self.SCHEMA)
+        self._import_json_once()
+
+    def _import_json_once(self):
+        """Import an existing servers.json the first time the database is opened."""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'json_imported'").fetchone()
+            if row is not None:
+                return
+            imported = 0
+            json_store = JournaledJSONInventoryStore(self.json_path)
+            if self.json_path.exists() or json_store.journal_path.exists():
+                # Read through the journal backend, so records it hasn't compacted
+                # into servers.json yet are imported too (ids come out normalized)
+                for server in json_store.all():
+                    if self._conn.execute('SELECT 1 FROM servers WHERE id = ?', (server['id'],)).fetchone():
+                        continue
+                    self._insert(server)
+                    imported += 1
+            self._conn.execute("INSERT INTO meta (key, value) VALUES ('json_imported', ?)", (str(imported),))
+            self._bump_revision()
+            if imported:
+                self.logger.info(f"Imported {imported} server(s) from {self.json_path} into {self.path}")
+
+    def _insert(self, server: Dict):
+        extra = {k: v for k, v in server.items() if k not in CORE_FIELDS and k not in ('id', 'yubikey_serials')}
+        self._conn.execute(
+            'INSERT INTO servers (id, name, hostname, username, port, extra) VALUES (?, ?, ?, ?, ?, ?)',
+            (server['id'], server.get('name'), server.get('hostname'), server.get('username'),
+             server.get('port'), json.dumps(extra))
+        )
+        self._set_serials(server['id'], server.get('yubikey_serials', []))
+
+    def _set_serials(self, server_id: str, serials: List[str]):
+        self._conn.execute('DELETE FROM server_yubikeys WHERE server_id = ?', (server_id,))
+        self._conn.executemany(
+            'INSERT OR IGNORE INTO server_yubikeys (server_id, serial, position) VALUES (?, ?, ?)',
+            [(server_id, str(serial), position) for position, serial in enumerate(serials)]
+        )
+
+    def _serials_for(self, server_ids: List[str]) -> Dict[str, List[str]]:
+        serials: Dict[str, List[str]] = {}
+        if not server_ids:
+            return serials
+        if len(server_ids) <= 500:
+            placeholders = ', '.join('?' * len(server_ids))
+            rows = self._conn.execute(
+                f'SELECT server_id, serial FROM server_yubikeys WHERE server_id IN ({placeholders}) '
+                'ORDER BY server_id, position',
+                server_ids
+            )
+        else:
+            rows = self._conn.execute(
+                'SELECT server_id, serial FROM server_yubikeys ORDER BY server_id, position'
+            )
+        for row in rows:
+            serials.setdefault(row['server_id'], []).append(row['serial'])
+        return serials
+
+    def _rows_to_servers(self, rows) -> List[Dict]:
+        rows = list(rows)
+        serials = self._serials_for([row['id'] for row in rows])
+        servers = []
+        for row in rows:
+            server = {
+                'id': row['id'],
+                'name': row['name'],
+                'hostname': row['hostname'],
+                'username': row['username'],
+                'port': row['port'],
+            }
+            server.update(json.loads(row['extra']))
+            if row['id'] in serials:
+                server['yubikey_serials'] = serials[row['id']]
+            servers.append(server)
+        return servers
+
+    @INVENTORY_IO_SECONDS.time(backend='sqlite', operation='load')
+    def all(self) -> List[Dict]:
+        with self._lock:
+            return self._rows_to_servers(self._conn.execute('SELECT * FROM servers ORDER BY seq'))
+
+    def iter_all(self, page_size: int = 500) -> Iterator[Dict]:
+        # Keyset pages, so only one page of rows is held at a time
+        last_seq = 0
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    'SELECT * FROM servers WHERE seq > ? ORDER BY seq LIMIT ?', (last_seq, page_size)
+                ).fetchall()
+                if not rows:
+                    return
+                last_seq = rows[-1]['seq']
+                servers = self._rows_to_servers(rows)
+            yield from servers
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM servers').fetchone()[0]
+
+    def get(self, server_id: str) -> Optional[Dict]:
+        with self._lock:
+            servers = self._rows_to_servers(
+                self._conn.execute('SELECT * FROM servers WHERE id = ?', (server_id,))
+            )
+            return servers[0] if servers else None
+
+    def find_by_hostname(self, hostname: str) -> List[Dict]:
+        with self._lock:
+            return self._rows_to_servers(self._conn.execute(
+                'SELECT * FROM servers WHERE hostname = ? COLLATE NOCASE ORDER BY seq', (hostname,)
+            ))
+
+    def find_by_serial(self, serial: str) -> List[Dict]:
+        with self._lock:
+            return self._rows_to_servers(self._conn.execute(
+                'SELECT s.* FROM servers s JOIN server_yubikeys y ON y.server_id = s.id '
+                'WHERE y.serial = ? ORDER BY s.seq', (str(serial),)
+            ))
+
+    def _update(self, server_id: str, fields: Dict) -> bool:
+        row = self._conn.execute('SELECT extra FROM servers WHERE id = ?', (server_id,)).fetchone()
+        if row is None:
+            return False
+        core = {k: v for k, v in fields.items() if k in CORE_FIELDS}
+        extra_fields = {k: v for k, v in fields.items() if k not in CORE_FIELDS and k not in ('id', 'yubikey_serials')}
+        if core:
+            assignments = ', '.join(f'{k} = ?' for k in core)
+            self._conn.execute(f'UPDATE servers SET {assignments} WHERE id = ?', (*core.values(), server_id))
+        if extra_fields:
+            extra = json.loads(row['extra'])
+            extra.update(extra_fields)
+            self._conn.execute('UPDATE servers SET extra = ? WHERE id = ?', (json.dumps(extra), server_id))
+        if 'yubikey_serials' in fields:
+            self._set_serials(server_id, fields['yubikey_serials'])
+        return True
+
+    def _delete(self, server_id: str) -> bool:
+        return self._conn.execute('DELETE FROM servers WHERE id = ?', (server_id,)).rowcount > 0
+
+    def _add_serial(self, server_id: str, serial: str) -> bool:
+        if not self._conn.execute('SELECT 1 FROM servers WHERE id = ?', (server_id,)).fetchone():
+            return False
+        position = self._conn.execute(
+            'SELECT COALESCE(MAX(position) + 1, 0) FROM server_yubikeys WHERE server_id = ?', (server_id,)
+        ).fetchone()[0]
+        self._conn.execute(
+            'INSERT OR IGNORE INTO server_yubikeys (server_id, serial, position) VALUES (?, ?, ?)',
+            (server_id, str(serial), position)
+        )
+        return True
+
+    def _remove_serial(self, server_id: str, serial: str) -> bool:
+        if not self._conn.execute('SELECT 1 FROM servers WHERE id = ?', (server_id,)).fetchone():
+            return False
+        self._conn.execute('DELETE FROM server_yubikeys WHERE server_id = ? AND serial = ?', (server_id, str(serial)))
+        return True
+
+    def _apply(self, record: Dict):
+        op = record.get('op')
+        if op == 'add':
+            self._delete(record['server']['id'])
+            self._insert(record['server'])
+        elif op == 'update':
+            self._update(record['id'], record['fields'])
+        elif op == 'delete':
+            self._delete(record['id'])
+        elif op == 'add_serial':
+            self._add_serial(record['id'], record['serial'])
+        elif op == 'remove_serial':
+            self._remove_serial(record['id'], record['serial'])
+        elif op == 'batch':
+            for sub_record in record['records']:
+                self._apply(sub_record)
+        else:
+            raise ValueError(f"Unknown inventory operation: {op}")
+
+    def _bump_revision(self):
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('revision', 1) "
+            "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+        )
+
+    def revision(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+            return int(row['value']) if row else 0
+
+    @INVENTORY_IO_SECONDS.time(backend='sqlite', operation='write')
+    def add(self, server_data: Dict):
+        with self._lock, self._conn:
+            self._insert(server_data)
+            self._bump_revision()
+
+    @INVENTORY_IO_SECONDS.time(backend='sqlite', operation='write')
+    def update(self, server_id: str, fields: Dict) -> bool:
+        with self._lock, self._conn:
+            updated = self._update(server_id, fields)
+            if updated:
+                self._bump_revision()
+            return updated
+
+    @INVENTORY_IO_SECONDS.time(backend='sqlite', operation='write')
+    def delete(self, server_id: str) -> bool:
+        with self._lock, self._conn:
+            deleted = self._delete(server_id)
+            if deleted:
+                self._bump_revision()
+            return deleted
+
+    @INVENTORY_IO_SECONDS.time(backend='sqlite', operation='write')
+    def add_serial(self, server_id: str, serial: str) -> bool:
+        with self._lock, self._conn:
+            added = self._add_serial(server_id, serial)
+            if added:
+                self._bump_revision()
+            return added
+
+    @INVENTORY_IO_SECONDS.time(backend='sqlite', operation='write')
+    def remove_serial(self, server_id: str, serial: str) -> bool:
+        with self._lock, self._conn:
+            removed = self._remove_serial(server_id, serial)
+            if removed:
+                self._bump_revision()
+            return removed
+
+    @INVENTORY_IO_SECONDS.time(backend='sqlite', operation='write')
+    def apply_batch(self, records: List[Dict]):
+        with self._lock, self._conn:
+            for record in records:
+                self._apply(record)
+            self._bump_revision()
+
+
+STORES = {
+    'json': ('servers.json', JSONInventoryStore),
+    'journal': ('servers.json', JournaledJSONInventoryStore),
+    'sqlite': ('servers.db', SQLiteInventoryStore),
+}
+
+
+def open_store(app_dir: Path, backend: Optional[str] = None) -> InventoryStore:
+    """Open the inventory backend selected by name or $YUBIKEY_SSH_MANAGER_STORE."""
+    backend = (backend or os.environ.get(STORE_ENV_VAR) or DEFAULT_STORE).lower()
+    if backend not in STORES:
+        raise ValueError(f"Unknown inventory store '{backend}', expected one of: {', '.join(STORES)}")
+    filename, store_class = STORES[backend]
+    return store_class.for_path(Path(app_dir) / filename)
@@ -0,0 +1,151 @@
+"""Moving inventories in and out as NDJSON (one server per line).
+
+Export streams the store page by page and import parses one line at a
+time and writes in chunks, so memory use doesn't grow with the file.
+orjson is used for serializing when it is installed.
+"""
+import json
+import uuid
+import logging
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from .storage import normalize_server_id
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder is used instead
+    orjson = None
+
+REQUIRED_FIELDS = ('name', 'hostname', 'username')
+# Copied through when present (set by the ssh_config importer)
+OPTIONAL_FIELDS = ('proxy_jump', 'import_source', 'ssh_alias')
+IMPORT_CHUNK_SIZE = 1000
+# Export lines are grouped into writes of about this many bytes
+EXPORT_BUFFER_BYTES = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def dumps(obj) -> bytes:
+    """Serialize to compact JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+
+def loads(data: Union[str, bytes]):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def server_record(data: Dict) -> Dict:
+    """Validate and normalize one server record for the inventory (without an id)."""
+    if not isinstance(data, dict):
+        raise ValueError("expected a JSON object")
+    missing = [field for field in REQUIRED_FIELDS if not data.get(field)]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    record = {field: str(data[field]) for field in REQUIRED_FIELDS}
+    try:
+        record['port'] = int(data.get('port') or 22)
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid port: {data.get('port')}")
+    serials = data.get('yubikey_serials') or []
+    if not isinstance(serials, list):
+        raise ValueError("yubikey_serials must be a list")
+    record['yubikey_serials'] = [str(serial) for serial in serials]
+    record.update({field: data[field] for field in OPTIONAL_FIELDS if data.get(field)})
+    return record
+
+
+def dedup_key(server: Dict) -> Tuple[str, int, str]:
+    """Servers with the same hostname, port and username are the same server."""
+    try:
+        port = int(server.get('port') or 22)
+    except (TypeError, ValueError):
+        port = 22
+    return str(server.get('hostname', '')).lower(), port, str(server.get('username', ''))
+
+
+def imported_id(store, data: Dict, taken: set) -> str:
+    """Keep an exported server's id unless it is malformed or already used."""
+    server_id: Optional[str] = None
+    try:
+        server_id = normalize_server_id(data.get('id'))
+    except ValueError:
+        pass
+    if server_id is None or server_id in taken or store.get(server_id) is not None:
+        server_id = str(uuid.uuid4())
+    taken.add(server_id)
+    return server_id
+
+
+def export_servers(store) -> Iterator[bytes]:
+    """NDJSON lines for every server in the store, in buffered chunks."""
+    buffer = []
+    size = 0
+    for server in store.iter_all():
+        line = dumps(server) + b'\n'
+        buffer.append(line)
+        size += len(line)
+        if size >= EXPORT_BUFFER_BYTES:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def import_servers(store, items: Iterable[Union[str, bytes, Dict]],
+                   chunk_size: int = IMPORT_CHUNK_SIZE) -> Iterator[Dict]:
+    """Add servers from NDJSON lines (or already parsed dicts), skipping known ones.
+
+    Yields one result per non-blank input line once its chunk has been
+    written, then a summary with ``summary: True``.
+    """
+    # The only state that grows with the inventory: one key per known server
+    known = {dedup_key(server) for server in store.iter_all()}
+    taken = set()
+    pending: List[Dict] = []
+    results: List[Dict] = []
+    counts = {'added': 0, 'duplicate': 0, 'invalid': 0}
+
+    def flush():
+        if pending:
+            store.apply_batch([{'op': 'add', 'server': server} for server in pending])
+            pending.clear()
+        yield from results
+        results.clear()
+
+    def add(line_number: int, item) -> Dict:
+        if isinstance(item, (str, bytes)):
+            try:
+                item = loads(item)
+            except ValueError as e:
+                return {"line": line_number, "status": "invalid", "message": f"Invalid JSON: {e}"}
+        try:
+            server = server_record(item)
+        except ValueError as e:
+            return {"line": line_number, "status": "invalid", "message": str(e)}
+        key = dedup_key(server)
+        if key in known:
+            return {"line": line_number, "status": "duplicate", "hostname": server['hostname']}
+        known.add(key)
+        server['id'] = imported_id(store, item, taken)
+        pending.append(server)
+        return {"line": line_number, "status": "added", "id": server['id'], "hostname": server['hostname']}
+
+    for line_number, item in enumerate(items, 1):
+        if isinstance(item, (str, bytes)) and not item.strip():
+            continue
+        result = add(line_number, item)
+        counts[result['status']] += 1
+        results.append(result)
+        if len(results) >= chunk_size:
+            yield from flush()
+
+    yield from flush()
+    logger.info(f"Imported {counts['added']} server(s), skipped {counts['duplicate']} duplicate(s) "
+                f"and {counts['invalid']} invalid line(s)")
+    yield {"summary": True, "success": counts['invalid'] == 0, **counts}
@@ -1,16 +1,122 @@
-from flask import render_template, jsonify, request, send_from_directory, make_response
+from flask import render_template, jsonify, request, send_from_directory, make_response, Response, stream_with_context, g
 from application.ssh_manager import SSHManager
+from application.device_watcher import get_device_watcher
+from application.jobs import QueueFullError, get_job_queue
+from application import metrics, search, transfer
+from application.ssh_config import DEFAULT_KNOWN_HOSTS_PATH
+from application.probe import get_probe_engine
+from application.profiling import DEFAULT_THREAD_PATTERN, get_request_profiler, get_stack_dumper
 from application.logger import setup_logger
 import os
+import re
+import hmac
+import json
+import time
 import logging
+import threading
 import uuid
+import secrets
+from collections import OrderedDict
+from urllib.parse import urlsplit
 
 logger = logging.getLogger(__name__)
 
-def setup_routes(app):
+# How long /api/events waits between change checks, and between keepalives
+EVENTS_POLL_SECONDS = 1.0
+EVENTS_HEARTBEAT_SECONDS = 15.0
+
+
+def format_sse(event: str, data, event_id: str = None) -> str:
+    """Encode one Server-Sent Events message."""
+    message = f"event: {event}\n"
+    if event_id:
+        message += f"id: {event_id}\n"
+    return message + f"data: {json.dumps(data)}\n\n"
+
+
+# Sections /api/state can return; `fields=` selects a subset
+STATE_FIELDS = ('status', 'yubikeys', 'selected', 'servers')
+STATE_CACHE_SIZE = 16
+
+def json_response(data) -> Response:
+    """Like jsonify, but with orjson when it is installed."""
+    return Response(transfer.dumps(data), mimetype='application/json')
+
+
+def ndjson_response(results) -> Response:
+    """Stream an iterable of dicts as JSON lines while they are produced."""
+    def generate():
+        for result in results:
+            yield transfer.dumps(result) + b'\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+# Query parameters that switch /api/servers from the plain list to a search page
+SEARCH_PARAMS = ('q', 'match', 'field', 'serial', 'without_serial', 'sort', 'order', 'limit', 'cursor')
+
+
+# Device generations and inventory revisions restart at 1 with the process, so
+# event ids and ETags carry this boot id to tell them apart across restarts
+BOOT_ID = uuid.uuid4().hex[:12]
+
+
+def make_event_id(generation: int, revision: int, selected) -> str:
+    return f"{BOOT_ID}-{generation}-{revision}-{selected or ''}"
+
+
+def parse_event_id(event_id):
+    """Split a '<boot id>-<device generation>-<inventory revision>-<selected serial>' event id.
+
+    Ids from before a restart (another boot id) parse as no id at all, so
+    the client gets a full resync.
+    """
+    try:
+        boot_id, generation, revision, selected = (event_id or '').split('-', 3)
+        if boot_id != BOOT_ID:
+            return None, None, None
+        return int(generation), int(revision), selected or None
+    except ValueError:
+        return None, None, None
+
+
+# Endpoints that reach out to the fleet over SSH require this per-process
+# token in the X-API-Token header. The page served to local, same-origin
+# requests carries it, so other sites can neither read nor guess it.
+API_TOKEN = secrets.token_urlsafe(32)
+TOKEN_HEADER = 'X-API-Token'
+LOOPBACK_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+
+def setup_routes(app, ssh_manager=None):
+    profiler = get_request_profiler()
+
+    @app.before_request
+    def before_request():
+        g.request_started = time.perf_counter()
+        if profiler.enabled:
+            g.profile = profiler.start(request.path)
+
+    @app.teardown_request
+    def teardown_request(exc):
+        # Runs even when a view raised, so the profiler is always released
+        profile = g.pop('profile', None)
+        if profile is not None:
+            duration = time.perf_counter() - g.get('request_started', time.perf_counter())
+            profiler.stop(profile, request.method, request.path, duration)
+
     # Allow CORS for all origins during testing
     @app.after_request
     def after_request(response):
+        started = g.get('request_started')
+        if started is not None:
+            # Label by URL rule so ids in paths don't explode the label set
+            metrics.HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=request.method,
+                route=request.url_rule.rule if request.url_rule else 'unmatched',
+                status=response.status_code
+            )
         origin = request.headers.get('Origin')
         if origin in ['http://localhost:5000', 'http://127.0.0.1:5000']:
             response.headers.add('Access-Control-Allow-Origin', origin)
@@ -22,13 +128,15 @@ def setup_routes(app):
         return response
 
     app.config['SECRET_KEY'] = os.urandom(24)
-    ssh_manager = SSHManager()
+    if ssh_manager is None:
+        ssh_manager = SSHManager()
+    metrics.INVENTORY_SERVERS.set_function(ssh_manager.inventory.count)
 
     @app.route('/')
     def index():
         """Serve the main application page"""
         logger.debug("Serving index.html")
-        return render_template('index.html')
+        return render_template('index.html', api_token=API_TOKEN if local_origin() else '')
 
     @app.route('/static/<path:filename>')
     def serve_static(filename):
@@ -66,6 +174,8 @@ def setup_routes(app):
     @app.route('/api/yubikeys', methods=['GET'])
     def get_yubikeys():
         """Get list of connected YubiKeys"""
+        # Someone is looking at the list: rescan promptly rather than at the next tick
+        get_device_watcher().poke()
         try:
             yubikeys = ssh_manager.get_yubikeys()
             selected = ssh_manager.get_selected_yubikey()
@@ -77,6 +187,184 @@ def setup_routes(app):
             logger.exception("Error getting YubiKeys")
             return jsonify({"yubikeys": [], "selected": None})
 
+    # Serialized /api/state bodies keyed by (state version, fields)
+    state_cache = OrderedDict()
+    state_cache_lock = threading.Lock()
+
+    def ensure_watcher():
+        """Start the shared YubiKey watcher if nothing has yet"""
+        watcher = get_device_watcher()
+        if not watcher.running:
+            watcher.start()
+        return watcher
+
+    @app.route('/api/state')
+    def get_state():
+        """Device status, YubiKeys, selection and servers as one versioned snapshot"""
+        requested = request.args.get('fields')
+        fields = tuple(f.strip() for f in requested.split(',') if f.strip()) if requested else STATE_FIELDS
+        unknown = [f for f in fields if f not in STATE_FIELDS]
+        if unknown:
+            return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+
+        watcher = ensure_watcher()
+        generation = watcher.snapshot().generation
+        revision = ssh_manager.get_inventory_revision()
+        selected = ssh_manager.get_selected_yubikey()
+        # The boot id keeps a pre-restart ETag from matching a different state
+        version = make_event_id(generation, revision, selected)
+        etag = f"{version}:{','.join(fields)}"
+
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
+
+        with state_cache_lock:
+            body = state_cache.get(etag)
+        if body is None:
+            state = {"version": version}
+            if 'status' in fields:
+                state['status'] = ssh_manager.get_yubikey_status()
+            if 'yubikeys' in fields:
+                state['yubikeys'] = ssh_manager.get_yubikeys()
+            if 'selected' in fields:
+                state['selected'] = selected
+            if 'servers' in fields:
+                state['servers'] = ssh_manager.get_servers()
+            body = json.dumps(state)
+            with state_cache_lock:
+                state_cache[etag] = body
+                while len(state_cache) > STATE_CACHE_SIZE:
+                    state_cache.popitem(last=False)
+
+        response = make_response(body)
+        response.mimetype = 'application/json'
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    @app.route('/api/events')
+    def events():
+        """Stream YubiKey and inventory changes as Server-Sent Events"""
+        watcher = ensure_watcher()
+        watcher.poke()
+        # Resume from the state the client last saw, if it tells us
+        last_generation, last_revision, last_selected = parse_event_id(
+            request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+        )
+
+        def generate():
+            generation, revision, selected = last_generation, last_revision, last_selected
+            yield "retry: 3000\n\n"
+            last_sent = time.monotonic()
+            while watcher.running:
+                snapshot = watcher.snapshot()
+                current_revision = ssh_manager.get_inventory_revision()
+                current_selected = ssh_manager.get_selected_yubikey()
+                event_id = make_event_id(snapshot.generation, current_revision, current_selected)
+
+                if snapshot.generation != generation or current_selected != selected:
+                    generation, selected = snapshot.generation, current_selected
+                    yield format_sse('devices', {
+                        "generation": generation,
+                        "status": ssh_manager.get_yubikey_status(),
+                        "yubikeys": ssh_manager.get_yubikeys(),
+                        "selected": selected
+                    }, event_id)
+                    last_sent = time.monotonic()
+                if current_revision != revision:
+                    revision = current_revision
+                    yield format_sse('inventory', {"revision": revision}, event_id)
+                    last_sent = time.monotonic()
+                if time.monotonic() - last_sent >= EVENTS_HEARTBEAT_SECONDS:
+                    yield ": keepalive\n\n"
+                    last_sent = time.monotonic()
+
+                # Wakes immediately on device changes; inventory and selection
+                # changes are picked up on the next tick
+                watcher.wait_for_change(generation, timeout=EVENTS_POLL_SECONDS)
+
+        response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+    @app.route('/metrics')
+    def get_metrics():
+        """Counters, gauges and latency histograms in Prometheus text format"""
+        return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+    def local_only():
+        """Admin endpoints only answer requests from this machine"""
+        if request.remote_addr not in ('127.0.0.1', '::1'):
+            return jsonify({"success": False, "message": "Admin endpoints are only available locally"}), 403
+        return None
+
+    def local_origin():
+        """A request to a loopback host name from this page's own origin (or with no Origin)"""
+        if request.remote_addr not in ('127.0.0.1', '::1') or urlsplit(request.host_url).hostname not in LOOPBACK_HOSTS:
+            return False
+        origin = request.headers.get('Origin')
+        return origin is None or origin.rstrip('/') == request.host_url.rstrip('/')
+
+    def fleet_access():
+        """Endpoints that act on the fleet need a local, same-origin request with the API token"""
+        denied = local_only()
+        if denied:
+            return denied
+        if not local_origin():
+            return jsonify({"success": False, "message": "Cross-origin requests are not allowed"}), 403
+        if not hmac.compare_digest(request.headers.get(TOKEN_HEADER, ''), API_TOKEN):
+            return jsonify({"success": False, "message": f"Missing or invalid {TOKEN_HEADER} header"}), 403
+        return None
+
+    def missing_credential(data):
+        """The SSH agent is only used when asked for; otherwise a password is required"""
+        if data.get('password') or data.get('use_agent') is True:
+            return None
+        return jsonify({"success": False, "message": "A password is required (or \"use_agent\": true)"}), 400
+
+    @app.route('/api/admin/profiling', methods=['GET', 'POST'])
+    def request_profiling():
+        """Show or change per-request cProfile capture"""
+        denied = local_only()
+        if denied:
+            return denied
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            try:
+                profiler.configure(data.get('pattern'), float(data.get('rate', 1.0)))
+            except (re.error, TypeError, ValueError) as e:
+                return jsonify({"success": False, "message": f"Invalid profiling settings: {e}"}), 400
+        return jsonify(profiler.status())
+
+    @app.route('/api/admin/profiling/threads', methods=['POST'])
+    def sample_threads():
+        """Sample the stacks of the watcher, server and worker threads in the background"""
+        denied = local_only()
+        if denied:
+            return denied
+        data = request.get_json(silent=True) or {}
+        try:
+            path = get_stack_dumper().start(
+                duration=min(float(data.get('duration', 5.0)), 300.0),
+                interval=max(float(data.get('interval', 0.01)), 0.001),
+                thread_pattern=data.get('threads') or DEFAULT_THREAD_PATTERN
+            )
+        except RuntimeError as e:
+            return jsonify({"success": False, "message": str(e)}), 409
+        except (re.error, TypeError, ValueError) as e:
+            return jsonify({"success": False, "message": f"Invalid sampling settings: {e}"}), 400
+        return jsonify({"success": True, "profile": path.name}), 202
+
+    @app.route('/api/admin/profiling/<path:name>')
+    def download_profile(name):
+        denied = local_only()
+        if denied:
+            return denied
+        return send_from_directory(profiler.directory, name, as_attachment=True)
+
     @app.route('/api/yubikeys/select/<string:serial>', methods=['POST'])
     def select_yubikey(serial):
         """Select a YubiKey to use"""
@@ -90,17 +378,69 @@ def setup_routes(app):
 
     @app.route('/api/servers')
     def get_servers():
-        """Get list of servers"""
+        """Get list of servers, or one page of a search when query parameters are given"""
+        if any(param in request.args for param in SEARCH_PARAMS):
+            try:
+                limit = int(request.args.get('limit', search.DEFAULT_LIMIT))
+            except ValueError:
+                return jsonify({"success": False, "message": "limit must be a number"}), 400
+            fields = [field for value in request.args.getlist('field') for field in value.split(',') if field]
+            try:
+                return json_response(ssh_manager.search_servers(
+                    query=request.args.get('q', ''),
+                    match=request.args.get('match', 'substring'),
+                    fields=fields,
+                    serial=request.args.get('serial') or None,
+                    without_serial=request.args.get('without_serial') or None,
+                    sort=request.args.get('sort', 'name'),
+                    order=request.args.get('order', 'asc'),
+                    limit=limit,
+                    cursor=request.args.get('cursor') or None,
+                ))
+            except search.InvalidQueryError as e:
+                return jsonify({"success": False, "message": str(e)}), 400
+
         try:
             servers = ssh_manager.get_servers()
             if not isinstance(servers, list):
                 logger.error("Invalid server data type returned")
                 return jsonify([])
-            return jsonify(servers)
+            return json_response(servers)
         except Exception as e:
             logger.exception("Error getting servers")
             return jsonify([])
 
+    @app.route('/api/servers/health')
+    def server_health():
+        """Probe results per server; `id` limits the servers, `refresh=1` skips the cache"""
+        server_ids = [server_id for value in request.args.getlist('id') for server_id in value.split(',') if server_id]
+        refresh = request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+        results = ssh_manager.get_server_health(server_ids, refresh=refresh)
+        return json_response({"results": results, "ttl": get_probe_engine().ttl})
+
+    @app.route('/api/servers/export')
+    def export_servers():
+        """Stream the inventory as NDJSON, one server per line"""
+        response = Response(stream_with_context(transfer.export_servers(ssh_manager.inventory)),
+                            mimetype='application/x-ndjson')
+        response.headers['Content-Disposition'] = 'attachment; filename=servers.ndjson'
+        return response
+
+    @app.route('/api/servers/import/ssh-config', methods=['POST'])
+    def import_ssh_config():
+        """Add or update servers from ~/.ssh/config (and ~/.ssh/known_hosts)"""
+        data = request.get_json(silent=True) or {}
+        result = ssh_manager.sync_ssh_config(
+            preview=bool(data.get('preview', False)),
+            known_hosts_path=DEFAULT_KNOWN_HOSTS_PATH if data.get('known_hosts') else None,
+        )
+        return jsonify(result), (200 if result.get('success') else 400)
+
+    @app.route('/api/servers/import', methods=['POST'])
+    def import_servers():
+        """Add servers from an NDJSON body, streaming back one result per line"""
+        return ndjson_response(transfer.import_servers(ssh_manager.inventory, request.stream))
+
     @app.route('/api/servers', methods=['POST'])
     def add_server():
         if ssh_manager.add_server(request.json):
@@ -158,6 +498,133 @@ def setup_routes(app):
             logger.exception("Error connecting to server")
             return jsonify({"success": False, "message": str(e)})
 
+    @app.route('/api/deploy-key/bulk', methods=['POST'])
+    def deploy_key_bulk():
+        """Deploy the selected YubiKey to many servers, streaming NDJSON results"""
+        denied = fleet_access()
+        if denied:
+            return denied
+        data = request.get_json(silent=True) or {}
+        pin = data.get('pin')
+        password = data.get('password')
+        if not pin or not password:
+            logger.error("Missing PIN or password in request")
+            return jsonify({"success": False, "message": "PIN and password are required"}), 400
+
+        server_ids = data.get('server_ids')
+        selector = data.get('selector')
+        if not server_ids and not selector:
+            return jsonify({"success": False, "message": "server_ids or selector is required"}), 400
+        try:
+            server_ids = [str(uuid.UUID(str(server_id))) for server_id in server_ids or []]
+            timeout = float(data.get('timeout', 10))
+        except (TypeError, ValueError):
+            return jsonify({"success": False, "message": "Invalid server ID or timeout"}), 400
+
+        results = ssh_manager.deploy_key_bulk(
+            password, pin,
+            server_ids=server_ids,
+            selector=selector,
+            concurrency=data.get('concurrency'),
+            timeout=timeout
+        )
+        return ndjson_response(results)
+
+    @app.route('/api/audit', methods=['POST'])
+    def audit_authorized_keys():
+        """Audit authorized_keys on many servers and reconcile yubikey_serials, streaming NDJSON results"""
+        denied = fleet_access()
+        if denied:
+            return denied
+        data = request.get_json(silent=True) or {}
+        denied = missing_credential(data)
+        if denied:
+            return denied
+        try:
+            server_ids = [str(uuid.UUID(str(server_id))) for server_id in data.get('server_ids') or []]
+            timeout = float(data.get('timeout', 10))
+        except (TypeError, ValueError):
+            return jsonify({"success": False, "message": "Invalid server ID or timeout"}), 400
+
+        # With use_agent instead of a password the SSH agent and default keys are used
+        results = ssh_manager.audit_authorized_keys(
+            password=data.get('password') or None,
+            server_ids=server_ids,
+            selector=data.get('selector'),
+            concurrency=data.get('concurrency'),
+            timeout=timeout,
+            full=bool(data.get('full', False))
+        )
+        return ndjson_response(results)
+
+    @app.route('/api/command', methods=['POST'])
+    def run_command():
+        """Run a command on many servers, streaming host-tagged output as NDJSON"""
+        denied = fleet_access()
+        if denied:
+            return denied
+        data = request.get_json(silent=True) or {}
+        command = data.get('command')
+        if not isinstance(command, str) or not command.strip():
+            return jsonify({"success": False, "message": "A command is required"}), 400
+        try:
+            server_ids = [str(uuid.UUID(str(server_id))) for server_id in data.get('server_ids') or []]
+            timeout = float(data.get('timeout', 60))
+        except (TypeError, ValueError):
+            return jsonify({"success": False, "message": "Invalid server ID or timeout"}), 400
+        if not server_ids and not data.get('selector'):
+            return jsonify({"success": False, "message": "Select servers with server_ids or a selector"}), 400
+        denied = missing_credential(data)
+        if denied:
+            return denied
+
+        # With use_agent instead of a password the SSH agent and default keys are used
+        results = ssh_manager.run_command(
+            command,
+            password=data.get('password') or None,
+            server_ids=server_ids,
+            selector=data.get('selector'),
+            concurrency=data.get('concurrency'),
+            timeout=timeout
+        )
+        return ndjson_response(results)
+
+    @app.route('/api/revoke/<string:serial>', methods=['POST'])
+    def revoke_key(serial):
+        """Remove a YubiKey's key from every server it is authorized on, streaming NDJSON results"""
+        denied = fleet_access()
+        if denied:
+            return denied
+        if not serial.isdigit():
+            return jsonify({"success": False, "message": "Invalid YubiKey serial"}), 400
+        data = request.get_json(silent=True) or {}
+        denied = missing_credential(data)
+        if denied:
+            return denied
+        try:
+            timeout = float(data.get('timeout', 10))
+        except (TypeError, ValueError):
+            return jsonify({"success": False, "message": "Invalid timeout"}), 400
+
+        # With use_agent instead of a password the SSH agent and default keys are used
+        results = ssh_manager.revoke_key(
+            serial,
+            password=data.get('password') or None,
+            public_key=data.get('public_key') or None,
+            retry_failed=bool(data.get('retry_failed', False)),
+            concurrency=data.get('concurrency'),
+            timeout=timeout
+        )
+        return ndjson_response(results)
+
+    @app.route('/api/revoke/<string:serial>/report', methods=['GET'])
+    def get_revocation_report(serial):
+        """Latest revocation report for a YubiKey serial"""
+        report = ssh_manager.get_revocation_report(serial)
+        if report is None:
+            return jsonify({"success": False, "message": "No revocation report for this YubiKey"}), 404
+        return jsonify(report)
+
     @app.route('/api/deploy-key/<string:server_id>', methods=['POST'])
     def deploy_key(server_id):
         try:
@@ -183,12 +650,59 @@ def setup_routes(app):
                 logger.error(f"Server not found with ID: {server_id}")
                 return jsonify({"success": False, "message": "Server not found"})
                 
-            logger.info("Starting key deployment process")
-            result = ssh_manager.deploy_key(server, password, pin)
-            logger.info(f"Key deployment result: {result}")
-            
-            return jsonify(result)
+            if data.get('wait'):
+                # Synchronous mode for scripts that want the result inline
+                logger.info("Starting key deployment process")
+                result = ssh_manager.deploy_key(server, password, pin)
+                logger.info(f"Key deployment result: {result}")
+                return jsonify(result)
+
+            def run(job):
+                result = ssh_manager.deploy_key(server, password, pin, progress=job.step)
+                if result.get("success"):
+                    result["server"] = ssh_manager.get_server(server_id)
+                return result
+
+            try:
+                job = get_job_queue().submit('deploy_key', run, {
+                    "server_id": server_id,
+                    "name": server.get('name'),
+                    "hostname": server.get('hostname')
+                })
+            except QueueFullError as e:
+                response = jsonify({"success": False, "message": str(e)})
+                response.headers['Retry-After'] = '5'
+                return response, 429
+
+            logger.info(f"Queued key deployment job {job.id}")
+            return jsonify({
+                "success": True,
+                "job_id": job.id,
+                "status_url": f"/api/jobs/{job.id}"
+            }), 202
             
         except Exception as e:
             logger.exception("Error in deploy_key endpoint")
-            return jsonify({"success": False, "message": str(e)})
\ No newline at end of file
+            return jsonify({"success": False, "message": str(e)})
+
+    @app.route('/api/jobs')
+    def list_jobs():
+        """Background jobs, optionally filtered by ?state="""
+        jobs = get_job_queue().list(request.args.get('state'))
+        return jsonify({"jobs": [job.to_dict() for job in jobs]})
+
+    @app.route('/api/jobs/<string:job_id>')
+    def get_job(job_id):
+        job = get_job_queue().get(job_id)
+        if job is None:
+            return jsonify({"success": False, "message": "Job not found"}), 404
+        return jsonify(job.to_dict())
+
+    @app.route('/api/jobs/<string:job_id>/cancel', methods=['POST'])
+    def cancel_job(job_id):
+        jobs = get_job_queue()
+        if jobs.get(job_id) is None:
+            return jsonify({"success": False, "message": "Job not found"}), 404
+        if not jobs.cancel(job_id):
+            return jsonify({"success": False, "message": "Job has already finished"}), 409
+        return jsonify({"success": True, "message": "Cancellation requested"})
@@ -0,0 +1,158 @@
+"""Latency and allocations of SSHManager hot paths as the inventory grows.
+
+YubiKeys come from a fake list_all_devices() provider backed by fake PIV
+connections, and deployments go to a paramiko server on loopback, so no
+hardware or remote hosts are needed. Run from the repository root:
+
+    python -m benchmarks.bench_manager [--sizes 10,1000,100000] [--store json]
+        [--iterations N] [--save-baseline] [--compare]
+
+--save-baseline writes the results to benchmarks/baseline.json (or
+--baseline PATH); --compare reports each benchmark's p50 against it.
+"""
+import argparse
+import itertools
+import json
+import logging
+import sys
+import tempfile
+import uuid
+from pathlib import Path
+
+from application.device_watcher import get_device_watcher
+from application.ssh_manager import SSHManager
+from application.storage import STORES
+from benchmarks.fakes import fake_list_all_devices, patched_devices
+from benchmarks.harness import BASELINE_PATH, compare, load_baseline, measure, measure_allocations, save_baseline
+from benchmarks.sshd_stub import StubSSHServer
+
+SERIALS = ('12345678', '87654321')
+PASSWORD = 'secret'
+
+
+def make_server(index: int, hostname: str = None, port: int = 22) -> dict:
+    return {
+        'id': str(uuid.uuid4()),
+        'name': f'server-{index}',
+        'hostname': hostname or f'host-{index}.example.net',
+        'username': 'deploy',
+        'port': port,
+        'yubikey_serials': [SERIALS[0]] if index % 3 == 0 else []
+    }
+
+
+def iterations_for(size: int, iterations: int) -> int:
+    # Writes at 100k servers take long enough that fewer samples will do
+    return iterations if size < 10000 else max(5, iterations // 10)
+
+
+def bench_paths(benchmarks: dict, iterations: int, alloc_iterations: int) -> dict:
+    results = {}
+    for name, (func, setup) in benchmarks.items():
+        results[name] = measure(func, iterations, setup=setup)
+        results[name].update(measure_allocations(func, alloc_iterations, setup=setup))
+    return results
+
+
+def bench_inventory(size: int, args, sshd: StubSSHServer) -> dict:
+    with tempfile.TemporaryDirectory() as app_dir:
+        manager = SSHManager(app_dir=app_dir, store=args.store)
+        manager.set_selected_yubikey(SERIALS[0])
+        servers = [make_server(i) for i in range(size)]
+        manager.inventory.apply_batch([{'op': 'add', 'server': server} for server in servers])
+
+        iterations = iterations_for(size, args.iterations)
+        ids = itertools.cycle([server['id'] for server in servers[::max(1, size // 100)]])
+        added = itertools.count(size)
+
+        # Every deployment records a serial on a different server, so the
+        # inventory write is part of each sample
+        deploy_iterations = min(iterations, args.deploy_iterations)
+        targets = [dict(make_server(next(added), '127.0.0.1', sshd.port), yubikey_serials=[])
+                   for _ in range(deploy_iterations + 5)]
+        manager.inventory.apply_batch([{'op': 'add', 'server': target} for target in targets])
+        targets = itertools.cycle(targets)
+        connections_before = sshd.connections
+
+        results = bench_paths({
+            'get_servers': (manager.get_servers, None),
+            'get_server': (lambda: manager.get_server(next(ids)), None),
+            'add_server': (lambda: manager.add_server(make_server(next(added))), None),
+        }, iterations, args.alloc_iterations)
+        results.update(bench_paths({
+            'deploy_key': (lambda: manager.deploy_key(next(targets), PASSWORD, '123456'), None),
+        }, deploy_iterations, min(args.alloc_iterations, 3)))
+        results['deploy_key']['ssh_connections'] = sshd.connections - connections_before
+        manager.ssh_pool.evict_idle(max_idle=-1)
+        return results
+
+
+def bench_devices(args) -> dict:
+    """get_yubikey_status does not depend on inventory size, so it runs once per mode."""
+    with tempfile.TemporaryDirectory() as app_dir:
+        manager = SSHManager(app_dir=app_dir, store=args.store)
+        manager.set_selected_yubikey(SERIALS[0])
+        results = bench_paths({
+            # Every call enumerates devices
+            'yubikey_status_enumerate': (manager.get_yubikey_status, None),
+        }, args.iterations, args.alloc_iterations)
+        watcher = get_device_watcher()
+        watcher.start()
+        try:
+            # Calls read the watcher's published snapshot
+            results.update(bench_paths({
+                'yubikey_status_watcher': (manager.get_yubikey_status, None),
+            }, args.iterations, args.alloc_iterations))
+        finally:
+            watcher.stop()
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10,1000,100000', help="comma-separated inventory sizes")
+    parser.add_argument('--store', choices=sorted(STORES), default='json')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--deploy-iterations', type=int, default=20)
+    parser.add_argument('--alloc-iterations', type=int, default=5)
+    parser.add_argument('--enumeration-delay', type=float, default=0.0,
+                        help="seconds each fake device enumeration takes")
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true')
+    args = parser.parse_args()
+
+    # Keep per-call debug logging, and the stub server's teardown noise, out of the output
+    logging.disable(logging.INFO)
+    logging.getLogger('paramiko').setLevel(logging.CRITICAL)
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    results = {'store': args.store, 'sizes': {}}
+    with patched_devices(fake_list_all_devices(SERIALS, args.enumeration_delay)):
+        sshd = StubSSHServer(PASSWORD)
+        try:
+            results['devices'] = bench_devices(args)
+            for size in sizes:
+                print(f"Benchmarking {size} servers...", file=sys.stderr)
+                results['sizes'][str(size)] = bench_inventory(size, args, sshd)
+        finally:
+            sshd.close()
+
+    print(json.dumps(results, indent=2))
+
+    if args.compare:
+        baseline = load_baseline(args.baseline)
+        if baseline is None:
+            print(f"No baseline at {args.baseline}", file=sys.stderr)
+        else:
+            for row in compare(results, baseline):
+                flag = '  REGRESSED' if row['regressed'] else ''
+                print(f"{row['benchmark']:<45} {row['baseline']:>10.3f} -> {row['current']:>10.3f} ms "
+                      f"(x{row['ratio']}){flag}", file=sys.stderr)
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(f"Baseline saved to {args.baseline}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
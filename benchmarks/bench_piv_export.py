@@ -0,0 +1,43 @@
+"""Latency of SSHManager's public key export path against a fake PIV connection.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_piv_export [--iterations N]
+"""
+import argparse
+import json
+import tempfile
+
+from application.ssh_manager import SSHManager
+from benchmarks.fakes import FakePivConnection, fake_piv_session_opener
+from benchmarks.harness import measure
+
+SERIAL = '12345678'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as app_dir:
+        manager = SSHManager(app_dir=app_dir)
+        connection = FakePivConnection()
+        manager.open_piv_session = fake_piv_session_opener(connection)
+
+        def clear_cache():
+            manager.key_cache.invalidate(SERIAL)
+
+        # Every call opens a PivSession and reads slot metadata
+        results = {
+            # First export of a key: the cache file is written
+            "export_new_key": measure(lambda: manager._export_public_key(SERIAL), args.iterations, setup=clear_cache),
+            # Repeat deployments: the key matches the cache, nothing is written
+            "export_known_key": measure(lambda: manager._export_public_key(SERIAL), args.iterations),
+        }
+        results["apdus_sent"] = connection.apdus
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Latency of /api/servers searches against the in-memory search index.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_search [--size 100000] [--iterations 200]
+
+"first page" numbers rebuild the match list every call (the query cache is
+cleared); "next page" numbers follow a cursor through a cached query.
+"""
+import argparse
+import json
+import sys
+import time
+
+from application.search import ServerIndex
+from benchmarks.bench_manager import SERIALS, make_server
+from benchmarks.harness import measure
+
+QUERIES = {
+    'all': {},
+    'substring_selective': {'query': 'server-4242'},
+    'substring_broad': {'query': '42'},
+    'prefix_name': {'query': 'server-99', 'match': 'prefix', 'fields': ['name']},
+    'serial': {'serial': SERIALS[0]},
+    'without_serial_by_port': {'without_serial': SERIALS[0], 'sort': 'port', 'order': 'desc'},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    servers = [make_server(i) for i in range(args.size)]
+    started = time.perf_counter()
+    index = ServerIndex(servers, revision=1)
+    index.search()
+    results = {'build_and_first_page_ms': round((time.perf_counter() - started) * 1000, 1)}
+
+    for name, query in QUERIES.items():
+        # Warm the lazily built sort orders and text blob, then time the query itself
+        cursor = index.search(**query)['next_cursor']
+        results[name] = {
+            'first_page': measure(lambda: index.search(**query), args.iterations, setup=index._cache.clear),
+            'next_page': measure(lambda: index.search(cursor=cursor, **query), args.iterations),
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""Stand-ins for YubiKey hardware used by the benchmarks."""
+import time
+from contextlib import contextmanager
+from typing import Iterable, Tuple
+
+from cryptography.hazmat.primitives.asymmetric import rsa
+from yubikit.core import TRANSPORT, Tlv
+from yubikit.core.smartcard import SmartCardConnection
+from yubikit.piv import KEY_TYPE, PivSession
+
+SW_OK = 0x9000
+SW_FILE_NOT_FOUND = 0x6A82
+
+INS_SELECT = 0xA4
+INS_GET_VERSION = 0xFD
+INS_GET_METADATA = 0xF7
+SLOT_CARD_MANAGEMENT = 0x9B
+
+
+class FakePivConnection(SmartCardConnection):
+    """Answers the PIV APDUs needed to open a session and read slot metadata.
+
+    Responses are canned, so a PivSession over this connection exercises
+    yubikit's real APDU encoding and TLV parsing without a device.
+    """
+
+    def __init__(self, public_key=None, version=(5, 4, 3)):
+        self.public_key = public_key or rsa.generate_private_key(public_exponent=65537, key_size=2048).public_key()
+        self.version = bytes(version)
+        numbers = self.public_key.public_numbers()
+        encoded = (
+            Tlv(0x81, numbers.n.to_bytes((numbers.n.bit_length() + 7) // 8, 'big'))
+            + Tlv(0x82, numbers.e.to_bytes((numbers.e.bit_length() + 7) // 8, 'big'))
+        )
+        self.slot_metadata = (
+            Tlv(0x01, bytes([KEY_TYPE.RSA2048]))
+            + Tlv(0x02, b'\x02\x01')  # PIN policy ONCE, touch policy NEVER
+            + Tlv(0x03, b'\x01')      # generated on device
+            + Tlv(0x04, encoded)
+        )
+        self.management_metadata = Tlv(0x01, b'\x03') + Tlv(0x02, b'\x00\x01') + Tlv(0x05, b'\x01')
+        self.apdus = 0
+
+    @property
+    def transport(self):
+        return TRANSPORT.USB
+
+    def send_and_receive(self, apdu: bytes):
+        self.apdus += 1
+        ins, p2 = apdu[1], apdu[3]
+        if ins == INS_SELECT:
+            return b'', SW_OK
+        if ins == INS_GET_VERSION:
+            return self.version, SW_OK
+        if ins == INS_GET_METADATA:
+            if p2 == SLOT_CARD_MANAGEMENT:
+                return self.management_metadata, SW_OK
+            return self.slot_metadata, SW_OK
+        return b'', SW_FILE_NOT_FOUND
+
+
+def fake_piv_session_opener(connection: FakePivConnection):
+    """Drop-in for SSHManager.open_piv_session that uses a fake connection."""
+    @contextmanager
+    def open_piv_session(serial):
+        yield PivSession(connection)
+    return open_piv_session
+
+
+class FakeDeviceInfo:
+    """The parts of ykman's DeviceInfo the application reads."""
+
+    def __init__(self, serial, version: Tuple[int, int, int] = (5, 4, 3)):
+        self.serial = int(serial)
+        self.version = version
+
+
+class FakeDevice:
+    """A device whose smart card connection is a FakePivConnection."""
+
+    def __init__(self, connection: FakePivConnection):
+        self.connection = connection
+
+    def open_connection(self, connection_type):
+        return self.connection
+
+
+def fake_list_all_devices(serials: Iterable, delay: float = 0.0):
+    """A list_all_devices() replacement reporting one fake YubiKey per serial.
+
+    ``delay`` simulates the cost of a real USB/PCSC enumeration.
+    """
+    devices = [(FakeDevice(FakePivConnection()), FakeDeviceInfo(serial)) for serial in serials]
+
+    def list_all_devices(*args, **kwargs):
+        if delay:
+            time.sleep(delay)
+        return list(devices)
+    return list_all_devices
+
+
+@contextmanager
+def patched_devices(list_all_devices):
+    """Route ykman device enumeration, and PIV sessions opened by serial, to a fake."""
+    import ykman.device
+    from application import piv
+
+    saved = ykman.device.list_all_devices, piv.list_all_devices
+    ykman.device.list_all_devices = list_all_devices
+    piv.list_all_devices = list_all_devices
+    try:
+        yield
+    finally:
+        ykman.device.list_all_devices, piv.list_all_devices = saved
@@ -0,0 +1,105 @@
+import json
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+BASELINE_PATH = Path(__file__).with_name('baseline.json')
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples."""
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(samples: List[float]) -> Dict:
+    """Latency summary in milliseconds."""
+    return {
+        "count": len(samples),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 4),
+        "p50_ms": round(percentile(samples, 50) * 1000, 4),
+        "p95_ms": round(percentile(samples, 95) * 1000, 4),
+        "p99_ms": round(percentile(samples, 99) * 1000, 4),
+        "max_ms": round(max(samples) * 1000, 4),
+    }
+
+
+def measure(func: Callable, iterations: int = 100, warmup: int = 5, setup: Callable = None) -> Dict:
+    """Call func repeatedly and summarize its latency; setup runs untimed before each call."""
+    for _ in range(warmup):
+        if setup:
+            setup()
+        func()
+    samples = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+
+def measure_allocations(func: Callable, iterations: int = 10, setup: Callable = None) -> Dict:
+    """Average memory allocated per call, traced separately from latency runs."""
+    peaks = []
+    retained = []
+    tracemalloc.start()
+    try:
+        for _ in range(iterations):
+            if setup:
+                setup()
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            func()
+            after, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(after - before)
+    finally:
+        tracemalloc.stop()
+    return {
+        "alloc_peak_kb": round(statistics.fmean(peaks) / 1024, 2),
+        "alloc_retained_kb": round(statistics.fmean(retained) / 1024, 2),
+    }
+
+
+def save_baseline(results: Dict, path: Path = BASELINE_PATH):
+    path.write_text(json.dumps(results, indent=2, sort_keys=True) + '\n')
+
+
+def load_baseline(path: Path = BASELINE_PATH) -> Optional[Dict]:
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def compare(results: Dict, baseline: Dict, metric: str = 'p50_ms', threshold: float = 1.25) -> List[Dict]:
+    """Compare nested benchmark results with a baseline of the same shape.
+
+    Returns one row per benchmark present in both; ``regressed`` is set
+    when the metric grew by more than ``threshold`` times.
+    """
+    rows = []
+
+    def walk(current, previous, name):
+        if not isinstance(current, dict) or not isinstance(previous, dict):
+            return
+        if metric in current and metric in previous:
+            ratio = current[metric] / previous[metric] if previous[metric] else float('inf')
+            rows.append({
+                "benchmark": name,
+                "baseline": previous[metric],
+                "current": current[metric],
+                "ratio": round(ratio, 3),
+                "regressed": ratio > threshold,
+            })
+            return
+        for key in current:
+            if key in previous:
+                walk(current[key], previous[key], f"{name}.{key}" if name else key)
+
+    walk(results, baseline, '')
+    return rows
@@ -0,0 +1,212 @@
+"""Mixed HTTP load against the Flask API with fake YubiKeys and a temp inventory.
+
+The app is built from setup_routes() and served by werkzeug's threaded
+server on loopback, while client threads issue a weighted mix of status,
+list and CRUD requests over keep-alive connections. Run from the
+repository root:
+
+    python -m benchmarks.loadtest [--clients 8] [--duration 10] [--servers 1000]
+
+Reports throughput and p50/p95/p99 latency per endpoint as JSON.
+"""
+import argparse
+import collections
+import http.client
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from application.storage import STORES
+from benchmarks.fakes import fake_list_all_devices, patched_devices
+from benchmarks.harness import summarize
+
+SERIALS = ('12345678', '87654321')
+
+# (endpoint label, weight)
+DEFAULT_MIX = (
+    ('GET /api/yubikey-status', 30),
+    ('GET /api/yubikeys', 20),
+    ('GET /api/servers', 30),
+    ('POST /api/servers', 8),
+    ('PUT /api/servers/<id>', 8),
+    ('DELETE /api/servers/<id>', 4),
+)
+
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    """HTTP/1.1 so clients reuse connections, without per-request access logs."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def make_app(app_dir: str, servers: int, store: Optional[str] = None):
+    """Build the API app over a temp inventory seeded with ``servers`` entries.
+
+    Returns (app, update_ids, delete_ids): ids reserved for update and
+    delete traffic so the two never collide.
+    """
+    # setup_routes() builds its SSHManager under the home directory
+    os.environ['HOME'] = app_dir
+    if store:
+        os.environ['YUBIKEY_SSH_MANAGER_STORE'] = store
+
+    from flask import Flask
+    from application.ssh_manager import SSHManager
+    from backend.routes import setup_routes
+
+    app = Flask(__name__)
+    setup_routes(app)
+    # Same app directory, so this shares the routes' inventory store
+    manager = SSHManager()
+    manager.set_selected_yubikey(SERIALS[0])
+
+    seeded = [{
+        'id': str(uuid.uuid4()),
+        'name': f'server-{i}',
+        'hostname': f'host-{i}.example.net',
+        'username': 'deploy',
+        'port': 22,
+        'yubikey_serials': []
+    } for i in range(servers)]
+    manager.inventory.apply_batch([{'op': 'add', 'server': server} for server in seeded])
+    ids = [server['id'] for server in seeded]
+    half = len(ids) // 2
+    return app, ids[:half], collections.deque(ids[half:])
+
+
+class Client(threading.Thread):
+    """One simulated browser tab or script, issuing requests until stopped."""
+
+    def __init__(self, port: int, mix, update_ids, delete_ids, results, stop: threading.Event, seed: int):
+        super().__init__(name=f'loadtest-client-{seed}', daemon=True)
+        self.port = port
+        self.labels = [label for label, _ in mix]
+        self.weights = [weight for _, weight in mix]
+        self.update_ids = update_ids
+        self.delete_ids = delete_ids
+        self.results = results
+        self.stop_event = stop
+        self.random = random.Random(seed)
+        self.conn = None
+
+    def request(self, method: str, path: str, body: Optional[Dict] = None):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+        payload = json.dumps(body) if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload else {}
+        try:
+            self.conn.request(method, path, payload, headers)
+            response = self.conn.getresponse()
+            response.read()
+            return response.status
+        except (http.client.HTTPException, OSError):
+            self.conn.close()
+            self.conn = None
+            raise
+
+    def next_request(self, label: str):
+        method, path = label.split(' ', 1)
+        body = None
+        if label == 'POST /api/servers':
+            n = self.random.randrange(1 << 30)
+            body = {'name': f'load-{n}', 'hostname': f'load-{n}.example.net', 'username': 'deploy', 'port': 22}
+        elif label == 'PUT /api/servers/<id>':
+            server_id = self.random.choice(self.update_ids)
+            path = f'/api/servers/{server_id}'
+            n = self.random.randrange(1000)
+            body = {'name': f'renamed-{n}', 'hostname': f'renamed-{n}.example.net', 'username': 'deploy', 'port': 22}
+        elif label == 'DELETE /api/servers/<id>':
+            try:
+                path = f'/api/servers/{self.delete_ids.popleft()}'
+            except IndexError:
+                return None
+        return method, path, body
+
+    def run(self):
+        while not self.stop_event.is_set():
+            label = self.random.choices(self.labels, self.weights)[0]
+            request = self.next_request(label)
+            if request is None:
+                continue
+            started = time.perf_counter()
+            try:
+                status = self.request(*request)
+                ok = status < 400
+            except (http.client.HTTPException, OSError):
+                ok = False
+            elapsed = time.perf_counter() - started
+            # list.append is atomic, so clients share one sample list per endpoint
+            self.results[label]['samples' if ok else 'errors'].append(elapsed)
+        if self.conn is not None:
+            self.conn.close()
+
+
+def run_load(clients: int = 8, duration: float = 10.0, servers: int = 1000, mix=DEFAULT_MIX,
+             store: Optional[str] = None, enumeration_delay: float = 0.0) -> Dict:
+    """Serve the API in-process, drive it for ``duration`` seconds and summarize."""
+    with tempfile.TemporaryDirectory() as app_dir, \
+            patched_devices(fake_list_all_devices(SERIALS, enumeration_delay)):
+        app, update_ids, delete_ids = make_app(app_dir, servers, store)
+        server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=KeepAliveRequestHandler)
+        thread = threading.Thread(target=server.serve_forever, name='loadtest-server', daemon=True)
+        thread.start()
+        try:
+            results = {label: {'samples': [], 'errors': []} for label, _ in mix}
+            stop = threading.Event()
+            workers = [Client(server.port, mix, update_ids, delete_ids, results, stop, seed)
+                       for seed in range(clients)]
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            time.sleep(duration)
+            stop.set()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            server.shutdown()
+
+    report = {'clients': clients, 'duration_s': round(elapsed, 3), 'servers': servers, 'endpoints': {}}
+    total = 0
+    for label, result in results.items():
+        count = len(result['samples'])
+        total += count
+        entry = {'requests_per_s': round(count / elapsed, 2), 'errors': len(result['errors'])}
+        if count:
+            entry.update(summarize(result['samples']))
+        report['endpoints'][label] = entry
+    report['requests_per_s'] = round(total / elapsed, 2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds of load")
+    parser.add_argument('--servers', type=int, default=1000, help="inventory size to seed")
+    parser.add_argument('--store', choices=sorted(STORES))
+    parser.add_argument('--enumeration-delay', type=float, default=0.0,
+                        help="seconds each fake device enumeration takes")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    print(f"Driving {args.clients} clients for {args.duration}s...", file=sys.stderr)
+    report = run_load(args.clients, args.duration, args.servers, store=args.store,
+                      enumeration_delay=args.enumeration_delay)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
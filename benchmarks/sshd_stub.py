@@ -0,0 +1,149 @@
+"""A paramiko SSH server on loopback for exercising the deploy, audit and command paths.
+
+Commands sent over exec channels are run with ``sh -c`` under a temporary
+home directory, so the real install script runs against a real
+authorized_keys file without touching the machine's own accounts. Output
+is streamed back as it is written. A read-only SFTP subsystem serves the
+same home directory.
+"""
+import os
+import socket
+import subprocess
+import tempfile
+import threading
+
+import paramiko
+
+_host_key = None
+
+
+def host_key() -> paramiko.RSAKey:
+    global _host_key
+    if _host_key is None:
+        _host_key = paramiko.RSAKey.generate(2048)
+    return _host_key
+
+
+class _ServerInterface(paramiko.ServerInterface):
+    def __init__(self, server: 'StubSSHServer'):
+        self.server = server
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_auth_password(self, username, password):
+        if password == self.server.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self.server.run_command, args=(channel, command), daemon=True).start()
+        return True
+
+
+class _SFTPHandle(paramiko.SFTPHandle):
+    def stat(self):
+        return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+
+
+class _SFTPServerInterface(paramiko.SFTPServerInterface):
+    """Read-only SFTP rooted at the stub's home directory."""
+
+    def __init__(self, server, stub: 'StubSSHServer', *args, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.stub = stub
+
+    def _local(self, path: str) -> str:
+        return os.path.join(self.stub.home, os.path.normpath('/' + path).lstrip('/'))
+
+    def _stat(self, path: str, stat_func):
+        try:
+            return paramiko.SFTPAttributes.from_stat(stat_func(self._local(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        return self._stat(path, os.stat)
+
+    def lstat(self, path):
+        return self._stat(path, os.lstat)
+
+    def open(self, path, flags, attr):
+        if flags & (os.O_WRONLY | os.O_RDWR):
+            return paramiko.SFTP_PERMISSION_DENIED
+        try:
+            handle = _SFTPHandle(flags)
+            handle.readfile = open(self._local(path), 'rb')
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return handle
+
+
+class StubSSHServer:
+    """Accepts password logins on 127.0.0.1 and runs exec requests locally."""
+
+    def __init__(self, password: str = 'secret', home: str = None):
+        self.password = password
+        self.home = home or tempfile.mkdtemp(prefix='sshd-stub-')
+        self.connections = 0
+        self.commands = 0
+        self._transports = []
+        self._sock = socket.socket()
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind(('127.0.0.1', 0))
+        self._sock.listen(128)
+        self.port = self._sock.getsockname()[1]
+        threading.Thread(target=self._accept, name='sshd-stub', daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            # The handshake runs on its own thread, so a client that never completes it
+            # (a banner probe, say) doesn't hold up the next connection
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        transport = paramiko.Transport(conn)
+        transport.add_server_key(host_key())
+        transport.set_subsystem_handler('sftp', paramiko.SFTPServer, _SFTPServerInterface, self)
+        self._transports.append(transport)
+        try:
+            transport.start_server(server=_ServerInterface(self))
+        except (paramiko.SSHException, EOFError, OSError):
+            transport.close()
+
+    def run_command(self, channel, command: bytes):
+        self.commands += 1
+        env = {'HOME': self.home, 'PATH': os.environ.get('PATH', '/usr/bin:/bin')}
+        process = subprocess.Popen(['sh', '-c', command.decode()], stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, env=env)
+
+        # Output is forwarded as it is produced, like a real sshd
+        def forward(pipe, send):
+            try:
+                for chunk in iter(lambda: os.read(pipe.fileno(), 32768), b''):
+                    send(chunk)
+            except (OSError, EOFError):
+                # The client closed the channel; stop the command like sshd would
+                process.kill()
+
+        stderr = threading.Thread(target=forward, args=(process.stderr, channel.sendall_stderr), daemon=True)
+        stderr.start()
+        forward(process.stdout, channel.sendall)
+        stderr.join()
+        channel.send_exit_status(process.wait())
+        channel.close()
+
+    def close(self):
+        self._sock.close()
+        for transport in self._transports:
+            transport.close()
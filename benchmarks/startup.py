@@ -0,0 +1,211 @@
+"""Startup cost of app.py and the CLI: import time, first HTTP response, ``servers list``.
+
+Each run is a fresh interpreter with an empty temporary home directory.
+The server is started headless (``app.py --no-tray``) so this works where
+rumps isn't available. Run from the repository root:
+
+    python -m benchmarks.startup [--runs 5] [--max-import-ms 500] [--max-first-response-ms 2000] [--max-cli-ms 150]
+    python -m benchmarks.startup --capture-importtime benchmarks/importtime/app.txt
+
+Exits with status 1 if a median exceeds its limit or rumps, paramiko, ykman,
+yubikit or cryptography load at import time or during
+``python -m application servers list`` (timed end to end on a 1k-server
+inventory). --capture-importtime
+saves the raw ``python -X importtime`` output for the app module, so
+changes to the import graph show up in review.
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+# Modules that should only load on first use
+HEAVY_MODULES = ('rumps', 'paramiko', 'ykman', 'ykman.device', 'yubikit', 'cryptography')
+
+# Default limits on the medians, shared with tests/test_startup.py
+MAX_IMPORT_MS = 500.0
+MAX_FIRST_RESPONSE_MS = 2000.0
+MAX_CLI_MS = 150.0
+
+
+def _env(home: str) -> Dict[str, str]:
+    env = dict(os.environ, HOME=home)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(REPO_ROOT), env.get('PYTHONPATH')]))
+    return env
+
+
+def importtime(module: str = 'app') -> List[Dict]:
+    """One ``-X importtime`` run; returns rows of self/cumulative microseconds per module."""
+    with tempfile.TemporaryDirectory() as home:
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            cwd=REPO_ROOT, env=_env(home), capture_output=True, text=True, check=True
+        )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append({'module': name.strip(), 'depth': (len(name) - len(name.lstrip()) - 1) // 2,
+                     'self_us': int(self_us), 'cumulative_us': int(cumulative_us)})
+    return rows
+
+
+def import_ms_of(rows: List[Dict], module: str = 'app') -> float:
+    """Cumulative import time of ``module`` in one importtime() run, in milliseconds."""
+    return next(row['cumulative_us'] for row in rows if row['module'] == module) / 1000
+
+
+def loaded_heavy_modules(module: str = 'app') -> List[str]:
+    code = f"import sys, json, {module}; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    with tempfile.TemporaryDirectory() as home:
+        result = subprocess.run([sys.executable, '-c', code], cwd=REPO_ROOT, env=_env(home),
+                                capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def first_response(path: str = '/', timeout: float = 30.0) -> float:
+    """Seconds from spawning app.py until it answers ``path`` with a 2xx."""
+    port = _free_port()
+    url = f'http://127.0.0.1:{port}{path}'
+    with tempfile.TemporaryDirectory() as home:
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, str(REPO_ROOT / 'app.py'), '--no-tray', '--host', '127.0.0.1', '--port', str(port)],
+            # app.py creates a keys/ directory in its working directory
+            cwd=home, env=_env(home), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            while time.perf_counter() - started < timeout:
+                if process.poll() is not None:
+                    raise RuntimeError(f"app.py exited with status {process.returncode}")
+                try:
+                    with urllib.request.urlopen(url, timeout=1) as response:
+                        if 200 <= response.status < 300:
+                            return time.perf_counter() - started
+                except (urllib.error.URLError, ConnectionError, socket.timeout):
+                    time.sleep(0.01)
+            raise TimeoutError(f"No response from {url} within {timeout}s")
+        finally:
+            process.terminate()
+            try:
+                process.wait(5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def cli_list(servers: int = 1000) -> Tuple[float, List[str]]:
+    """Wall time of ``python -m application servers list`` and the heavy modules it loaded."""
+    code = (
+        "import sys, json, runpy\n"
+        "sys.argv = ['application', 'servers', 'list']\n"
+        "try:\n"
+        "    runpy.run_module('application', run_name='__main__')\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        f"sys.stderr.write(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))\n"
+    )
+    with tempfile.TemporaryDirectory() as home:
+        app_dir = Path(home) / '.yubikey-ssh-manager'
+        app_dir.mkdir()
+        inventory = [{'id': str(i), 'name': f'server-{i}', 'hostname': f'host-{i}.example.com',
+                      'username': 'deploy', 'port': 22, 'yubikey_serials': []} for i in range(servers)]
+        (app_dir / 'servers.json').write_text(json.dumps(inventory))
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, '-c', code], cwd=REPO_ROOT, env=_env(home),
+                                capture_output=True, text=True, check=True)
+        elapsed = time.perf_counter() - started
+    if len(result.stdout.splitlines()) != servers:
+        raise RuntimeError(f"servers list printed {len(result.stdout.splitlines())} lines, expected {servers}")
+    return elapsed, json.loads(result.stderr.strip().splitlines()[-1])
+
+
+def capture_importtime(path: Path, module: str = 'app'):
+    with tempfile.TemporaryDirectory() as home:
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            cwd=REPO_ROOT, env=_env(home), capture_output=True, text=True, check=True
+        )
+    header = (
+        f"# python -X importtime -c 'import {module}'\n"
+        f"# Python {platform.python_version()} on {platform.platform()}, "
+        f"captured {time.strftime('%Y-%m-%d')}\n"
+    )
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(header + result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/', help="URL path polled for the first response")
+    parser.add_argument('--max-import-ms', type=float, default=MAX_IMPORT_MS)
+    parser.add_argument('--max-first-response-ms', type=float, default=MAX_FIRST_RESPONSE_MS)
+    parser.add_argument('--max-cli-ms', type=float, default=MAX_CLI_MS)
+    parser.add_argument('--top', type=int, default=10, help="slowest top-level imports to list")
+    parser.add_argument('--capture-importtime', type=Path, metavar='PATH')
+    args = parser.parse_args()
+
+    if args.capture_importtime:
+        capture_importtime(args.capture_importtime)
+        print(f"Saved import times to {args.capture_importtime}", file=sys.stderr)
+        return
+
+    import_runs = [importtime() for _ in range(args.runs)]
+    import_ms = [import_ms_of(rows) for rows in import_runs]
+    # Children of the app module, slowest first, from the median run
+    median_run = sorted(zip(import_ms, import_runs), key=lambda pair: pair[0])[len(import_runs) // 2][1]
+    top_level = sorted((row for row in median_run if row['depth'] == 1),
+                       key=lambda row: row['cumulative_us'], reverse=True)[:args.top]
+    response_ms = [first_response(args.path) * 1000 for _ in range(args.runs)]
+    cli_runs = [cli_list() for _ in range(args.runs)]
+    cli_ms = [elapsed * 1000 for elapsed, _ in cli_runs]
+
+    report = {
+        'import_ms': {'median': round(statistics.median(import_ms), 1), 'runs': [round(v, 1) for v in import_ms]},
+        'first_response_ms': {'median': round(statistics.median(response_ms), 1),
+                              'runs': [round(v, 1) for v in response_ms]},
+        'cli_servers_list_ms': {'median': round(statistics.median(cli_ms), 1), 'runs': [round(v, 1) for v in cli_ms]},
+        'slowest_imports_ms': {row['module']: round(row['cumulative_us'] / 1000, 1) for row in top_level},
+        'heavy_modules_loaded_at_import': loaded_heavy_modules(),
+        'heavy_modules_loaded_by_cli': sorted({m for _, loaded in cli_runs for m in loaded}),
+    }
+    print(json.dumps(report, indent=2))
+
+    failures = []
+    if report['import_ms']['median'] > args.max_import_ms:
+        failures.append(f"import took {report['import_ms']['median']}ms (limit {args.max_import_ms}ms)")
+    if report['first_response_ms']['median'] > args.max_first_response_ms:
+        failures.append(f"first response took {report['first_response_ms']['median']}ms "
+                        f"(limit {args.max_first_response_ms}ms)")
+    if report['cli_servers_list_ms']['median'] > args.max_cli_ms:
+        failures.append(f"servers list took {report['cli_servers_list_ms']['median']}ms (limit {args.max_cli_ms}ms)")
+    if report['heavy_modules_loaded_by_cli']:
+        failures.append(f"heavy modules loaded by servers list: {', '.join(report['heavy_modules_loaded_by_cli'])}")
+    if report['heavy_modules_loaded_at_import']:
+        failures.append(f"heavy modules loaded at import: {', '.join(report['heavy_modules_loaded_at_import'])}")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
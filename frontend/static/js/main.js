@@ -11,16 +11,49 @@ const emptyState = document.getElementById('empty-state');
 const yubikeyStatus = document.getElementById('yubikey-status');
 const yubikeyStatusDot = document.getElementById('yubikey-status-dot');
 const yubikeySelect = document.getElementById('yubikey-select');
+const serverSearch = document.getElementById('server-search');
+const serversMore = document.getElementById('servers-more');
+const serversCount = document.getElementById('servers-count');
+
+// Servers are fetched a page at a time; more load as the list scrolls into view
+const SERVERS_PAGE_SIZE = 100;
+const SEARCH_DEBOUNCE_MS = 200;
 
 // State
 let servers = [];
 let editingServerId = null;
+let currentYubiKey = null;
+let inventoryRevision = null;
+let eventSource = null;
+let pollTimer = null;
+let searchQuery = '';
+let nextCursor = null;
+let totalServers = 0;
+let serversRequest = 0;
+let loadingMore = false;
+let searchTimer = null;
+let serverHealth = {};
 
 // Event Listeners
 document.addEventListener('DOMContentLoaded', initialize);
 addServerBtn.addEventListener('click', () => openModal('server-modal'));
 serverForm.addEventListener('submit', handleServerSubmit);
 deployKeyForm.addEventListener('submit', handleDeployKey);
+document.getElementById('load-more-btn').addEventListener('click', loadMoreServers);
+serverSearch.addEventListener('input', () => {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(() => {
+        searchQuery = serverSearch.value.trim();
+        loadServers();
+    }, SEARCH_DEBOUNCE_MS);
+});
+if (window.IntersectionObserver) {
+    new IntersectionObserver((entries) => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadMoreServers();
+        }
+    }, { rootMargin: '400px' }).observe(serversMore);
+}
 yubikeySelect.addEventListener('change', async (event) => {
     const serial = event.target.value;
     try {
@@ -42,76 +75,157 @@ yubikeySelect.addEventListener('change', async (event) => {
 
 // Functions
 async function initialize() {
-    checkYubiKeyStatus();
     await loadServers();
+    // The first event (or poll) fills in the YubiKey status
     startYubiKeyMonitor();
 }
 
 async function checkYubiKeyStatus() {
     try {
-        const [statusResponse, yubikeyResponse] = await Promise.all([
-            fetch('/api/yubikey-status'),
-            fetch('/api/yubikeys')
-        ]);
-        
-        const status = await statusResponse.json();
-        const yubikeysData = await yubikeyResponse.json();
-        
-        const statusElement = document.querySelector('#yubikey-status .status-text');
-        const selectElement = document.getElementById('yubikey-select');
-        
-        // Update status text
-        statusElement.textContent = status.message;
-        if (status.status === 'connected') {
-            statusElement.classList.remove('error');
-            statusElement.classList.add('success');
-        } else {
-            statusElement.classList.remove('success');
-            statusElement.classList.add('error');
-        }
-        
-        // Update YubiKey selection dropdown
-        if (yubikeysData.yubikeys && yubikeysData.yubikeys.length > 0) {
-            selectElement.innerHTML = '<option value="">Select YubiKey</option>' +
-                yubikeysData.yubikeys.map(yk => 
-                    `<option value="${yk.serial}" ${yk.serial === status.selected ? 'selected' : ''}>
-                        YubiKey ${yk.serial} (v${yk.version})
-                    </option>`
-                ).join('');
-            selectElement.classList.remove('hidden');
-        } else {
-            selectElement.classList.add('hidden');
-        }
-        
-        // Re-render servers to update button states
-        renderServers();
+        // One coalesced request; the browser revalidates it with If-None-Match
+        const response = await fetch('/api/state?fields=status,yubikeys,selected');
+        const state = await response.json();
+        applyYubiKeyState(state.status, state.yubikeys, state.selected);
     } catch (error) {
         console.error('Error checking YubiKey status:', error);
     }
 }
 
+function applyYubiKeyState(status, yubikeys, selected) {
+    const statusElement = document.querySelector('#yubikey-status .status-text');
+    const selectElement = document.getElementById('yubikey-select');
+    
+    // Update status text
+    statusElement.textContent = status.message;
+    if (status.status === 'connected') {
+        statusElement.classList.remove('error');
+        statusElement.classList.add('success');
+    } else {
+        statusElement.classList.remove('success');
+        statusElement.classList.add('error');
+    }
+    
+    // Update YubiKey selection dropdown
+    if (yubikeys && yubikeys.length > 0) {
+        selectElement.innerHTML = '<option value="">Select YubiKey</option>' +
+            yubikeys.map(yk => 
+                `<option value="${yk.serial}" ${yk.serial === selected ? 'selected' : ''}>
+                    YubiKey ${yk.serial} (v${yk.version})
+                </option>`
+            ).join('');
+        selectElement.classList.remove('hidden');
+    } else {
+        selectElement.classList.add('hidden');
+    }
+    
+    // Re-render servers to update button states
+    currentYubiKey = selected;
+    renderServers();
+}
+
+function serversPageUrl(cursor) {
+    const params = new URLSearchParams({ q: searchQuery, limit: SERVERS_PAGE_SIZE });
+    if (cursor) {
+        params.set('cursor', cursor);
+    }
+    return `/api/servers?${params}`;
+}
+
 async function loadServers() {
+    // Responses to superseded searches are dropped
+    const request = ++serversRequest;
     try {
         loadingElement.style.display = 'flex';
         serverGrid.style.display = 'none';
         emptyState.style.display = 'none';
 
-        const response = await fetch('/api/servers');
-        servers = await response.json();
+        const response = await fetch(serversPageUrl(null));
+        const page = await response.json();
+        if (request !== serversRequest) return;
+
+        servers = page.servers;
+        nextCursor = page.next_cursor;
+        totalServers = page.total;
 
         if (servers.length === 0) {
             emptyState.style.display = 'block';
         } else {
-            renderServers();
             serverGrid.style.display = 'grid';
         }
+        renderServers();
+        loadHealth(servers);
+    } catch (error) {
+        showNotification('Error loading servers', 'error');
+    } finally {
+        if (request === serversRequest) {
+            loadingElement.style.display = 'none';
+        }
+    }
+}
+
+async function loadMoreServers() {
+    if (!nextCursor || loadingMore) return;
+    const request = serversRequest;
+    loadingMore = true;
+    try {
+        const response = await fetch(serversPageUrl(nextCursor));
+        const page = await response.json();
+        if (request !== serversRequest) return;
+
+        servers = servers.concat(page.servers);
+        nextCursor = page.next_cursor;
+        totalServers = page.total;
+        // Only the new cards are added to the grid
+        serverGrid.insertAdjacentHTML('beforeend', page.servers.map(serverCard).join(''));
+        updateServersFooter();
+        loadHealth(page.servers);
     } catch (error) {
         showNotification('Error loading servers', 'error');
     } finally {
-        loadingElement.style.display = 'none';
+        loadingMore = false;
+    }
+}
+
+async function loadHealth(page) {
+    if (!page.length) return;
+    try {
+        const params = new URLSearchParams();
+        page.forEach(server => params.append('id', server.id));
+        const response = await fetch(`/api/servers/health?${params}`);
+        const health = await response.json();
+        Object.assign(serverHealth, health.results);
+        Object.entries(health.results).forEach(([serverId, result]) => {
+            const badge = document.querySelector(`.health-badge[data-server-id="${serverId}"]`);
+            if (badge) {
+                badge.outerHTML = healthBadge(serverId);
+            }
+        });
+    } catch (error) {
+        console.error('Error checking server health:', error);
     }
 }
 
+function escapeAttribute(text) {
+    return String(text).replace(/&/g, '&amp;').replace(/"/g, '&quot;').replace(/</g, '&lt;');
+}
+
+function healthBadge(serverId) {
+    const result = serverHealth[serverId];
+    if (!result) {
+        return `<span class="health-badge unknown" data-server-id="${serverId}" title="Checking...">…</span>`;
+    }
+    if (result.ssh) {
+        return `<span class="health-badge up" data-server-id="${serverId}" title="${escapeAttribute(result.banner)}">${Math.round(result.rtt_ms)} ms</span>`;
+    }
+    const state = result.reachable ? 'degraded' : 'down';
+    return `<span class="health-badge ${state}" data-server-id="${serverId}" title="${escapeAttribute(result.error)}">${result.reachable ? 'no SSH' : 'down'}</span>`;
+}
+
+function updateServersFooter() {
+    serversMore.classList.toggle('hidden', !nextCursor);
+    serversCount.textContent = totalServers ? `(${servers.length} of ${totalServers})` : '';
+}
+
 function renderServers() {
     const serversList = document.getElementById('servers-list');
     const emptyState = document.getElementById('empty-state');
@@ -120,8 +234,13 @@ function renderServers() {
     // Hide loading state
     loading.classList.add('hidden');
 
+    updateServersFooter();
+
     // Show empty state if no servers
     if (!servers || servers.length === 0) {
+        emptyState.querySelector('p').textContent = searchQuery
+            ? `No servers match "${searchQuery}".`
+            : 'No servers configured yet. Click "Add Server" to get started.';
         emptyState.classList.remove('hidden');
         serversList.classList.add('hidden');
         return;
@@ -131,72 +250,63 @@ function renderServers() {
     emptyState.classList.add('hidden');
     serversList.classList.remove('hidden');
 
-    // Get current YubiKey status
-    fetch('/api/yubikey-status')
-        .then(response => response.json())
-        .then(status => {
-            const currentYubiKey = status.selected;
-            
-            // Render servers with YubiKey-aware buttons
-            serversList.innerHTML = servers.map(server => {
-                const yubikeys = server.yubikey_serials || [];
-                const canConnect = !yubikeys.length || yubikeys.includes(currentYubiKey);
-                const connectButtonClass = canConnect ? 'btn-primary' : 'btn-disabled';
-                const connectTitle = canConnect ? 'Connect to server' : 'This server requires a different YubiKey';
-                
-                return `
-                    <div class="server-card">
-                        <div class="server-card-header">
-                            <h3 class="server-card-title">${server.name}</h3>
-                            <div class="server-card-actions">
-                                <button onclick="editServer('${server.id}')" class="btn btn-secondary">
-                                    <i class="fas fa-edit"></i>
-                                </button>
-                                <button onclick="deleteServer('${server.id}')" class="btn btn-danger">
-                                    <i class="fas fa-trash"></i>
-                                </button>
-                            </div>
-                        </div>
-                        <div class="server-info">
-                            <p><strong>Host:</strong> ${server.hostname}</p>
-                            <p><strong>Username:</strong> ${server.username}</p>
-                            <p><strong>Port:</strong> ${server.port}</p>
-                            ${yubikeys.length ? `
-                                <p><strong>Authorized YubiKeys:</strong></p>
-                                <ul class="yubikey-list">
-                                    ${yubikeys.map(serial => `
-                                        <li class="yubikey-item ${serial === currentYubiKey ? 'current' : ''}">
-                                            <i class="fas fa-key"></i> ${serial}
-                                            ${serial === currentYubiKey ? ' (current)' : ''}
-                                        </li>
-                                    `).join('')}
-                                </ul>
-                                ${!canConnect ? `
-                                    <p class="text-red-600">
-                                        <i class="fas fa-exclamation-triangle"></i> Current YubiKey not authorized
-                                    </p>
-                                ` : ''}
-                            ` : '<p><em>No YubiKeys authorized yet</em></p>'}
-                        </div>
-                        <div class="server-card-actions" style="margin-top: auto;">
-                            <button onclick="deployKey('${server.id}')" class="btn btn-success">
-                                <i class="fas fa-key"></i> Deploy Key
-                            </button>
-                            <button onclick="connectToServer('${server.id}')" 
-                                    class="btn ${connectButtonClass}"
-                                    ${!canConnect ? 'disabled' : ''}
-                                    title="${connectTitle}">
-                                <i class="fas fa-terminal"></i> Connect
-                            </button>
-                        </div>
-                    </div>
-                `;
-            }).join('');
-        })
-        .catch(error => {
-            console.error('Error fetching YubiKey status:', error);
-            showNotification('Error checking YubiKey status', 'error');
-        });
+    // Render servers with YubiKey-aware buttons
+    serversList.innerHTML = servers.map(serverCard).join('');
+}
+
+function serverCard(server) {
+    const yubikeys = server.yubikey_serials || [];
+    const canConnect = !yubikeys.length || yubikeys.includes(currentYubiKey);
+    const connectButtonClass = canConnect ? 'btn-primary' : 'btn-disabled';
+    const connectTitle = canConnect ? 'Connect to server' : 'This server requires a different YubiKey';
+
+    return `
+        <div class="server-card">
+            <div class="server-card-header">
+                <h3 class="server-card-title">${server.name} ${healthBadge(server.id)}</h3>
+                <div class="server-card-actions">
+                    <button onclick="editServer('${server.id}')" class="btn btn-secondary">
+                        <i class="fas fa-edit"></i>
+                    </button>
+                    <button onclick="deleteServer('${server.id}')" class="btn btn-danger">
+                        <i class="fas fa-trash"></i>
+                    </button>
+                </div>
+            </div>
+            <div class="server-info">
+                <p><strong>Host:</strong> ${server.hostname}</p>
+                <p><strong>Username:</strong> ${server.username}</p>
+                <p><strong>Port:</strong> ${server.port}</p>
+                ${yubikeys.length ? `
+                    <p><strong>Authorized YubiKeys:</strong></p>
+                    <ul class="yubikey-list">
+                        ${yubikeys.map(serial => `
+                            <li class="yubikey-item ${serial === currentYubiKey ? 'current' : ''}">
+                                <i class="fas fa-key"></i> ${serial}
+                                ${serial === currentYubiKey ? ' (current)' : ''}
+                            </li>
+                        `).join('')}
+                    </ul>
+                    ${!canConnect ? `
+                        <p class="text-red-600">
+                            <i class="fas fa-exclamation-triangle"></i> Current YubiKey not authorized
+                        </p>
+                    ` : ''}
+                ` : '<p><em>No YubiKeys authorized yet</em></p>'}
+            </div>
+            <div class="server-card-actions" style="margin-top: auto;">
+                <button onclick="deployKey('${server.id}')" class="btn btn-success">
+                    <i class="fas fa-key"></i> Deploy Key
+                </button>
+                <button onclick="connectToServer('${server.id}')" 
+                        class="btn ${connectButtonClass}"
+                        ${!canConnect ? 'disabled' : ''}
+                        title="${connectTitle}">
+                    <i class="fas fa-terminal"></i> Connect
+                </button>
+            </div>
+        </div>
+    `;
 }
 
 function openModal(modalId) {
@@ -295,7 +405,14 @@ async function handleDeployKey(event) {
             body: JSON.stringify({ pin: yubiKeyPin, password: serverPassword })
         });
 
-        const result = await response.json();
+        let result = await response.json();
+        if (response.status === 202 && result.job_id) {
+            // Deployment runs in the background; close the form and follow the job
+            closeModal('deploy-key-modal');
+            deployKeyForm.reset();
+            showNotification('Deploying SSH key...', 'info');
+            result = await waitForJob(result.job_id);
+        }
         if (result.success) {
             showNotification('SSH key deployed successfully', 'success');
             // Update the server in our local data with the new YubiKey info
@@ -319,6 +436,23 @@ async function handleDeployKey(event) {
     deployKeyForm.reset();
 }
 
+const JOB_POLL_INTERVAL = 500;
+
+async function waitForJob(jobId) {
+    // Poll a background job until it finishes and return its result
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL));
+        const response = await fetch(`/api/jobs/${jobId}`);
+        const job = await response.json();
+        if (!response.ok) {
+            return { success: false, message: job.message || 'Job not found' };
+        }
+        if (['succeeded', 'failed', 'cancelled'].includes(job.state)) {
+            return job.result || { success: false, message: `Job ${job.state}` };
+        }
+    }
+}
+
 async function connectToServer(serverId) {
     try {
         const response = await fetch(`/api/servers/${serverId}/connect`, {
@@ -338,7 +472,43 @@ async function connectToServer(serverId) {
 }
 
 function startYubiKeyMonitor() {
-    setInterval(checkYubiKeyStatus, 1000);
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+
+    // The server pushes device and inventory changes; reconnects resume via Last-Event-ID
+    eventSource = new EventSource('/api/events');
+    eventSource.addEventListener('devices', (event) => {
+        stopPolling();
+        const data = JSON.parse(event.data);
+        applyYubiKeyState(data.status, data.yubikeys, data.selected);
+    });
+    eventSource.addEventListener('inventory', (event) => {
+        stopPolling();
+        const data = JSON.parse(event.data);
+        if (inventoryRevision !== null && data.revision !== inventoryRevision) {
+            loadServers();
+        }
+        inventoryRevision = data.revision;
+    });
+    eventSource.onerror = () => {
+        // Poll until the stream is back
+        startPolling();
+    };
+}
+
+function startPolling() {
+    if (pollTimer === null) {
+        pollTimer = setInterval(checkYubiKeyStatus, 1000);
+    }
+}
+
+function stopPolling() {
+    if (pollTimer !== null) {
+        clearInterval(pollTimer);
+        pollTimer = null;
+    }
 }
 
 function showNotification(message, type = 'success') {
@@ -0,0 +1,63 @@
+from pathlib import Path
+
+import pytest
+from flask import Flask
+
+from application import device_watcher
+from application.device_watcher import DeviceWatcher, PollingEventSource
+from application.ssh_manager import SSHManager
+from tests.test_device_watcher import SimulatedDevices
+
+
+@pytest.fixture
+def devices(monkeypatch):
+    """A simulated device feed behind the process-wide YubiKey watcher."""
+    feed = SimulatedDevices()
+    watcher = DeviceWatcher(enumerate_devices=feed,
+                            event_source=PollingEventSource(min_interval=0.01, max_interval=0.05))
+    monkeypatch.setattr(device_watcher, '_watcher', watcher)
+    watcher.start()
+    yield feed
+    watcher.stop()
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return SSHManager(app_dir=tmp_path / 'app')
+
+
+@pytest.fixture
+def app(manager, devices):
+    from backend.routes import setup_routes
+
+    app = Flask(__name__, template_folder=str(Path(__file__).parent.parent / 'frontend' / 'templates'))
+    setup_routes(app, manager)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def sshd():
+    """A loopback SSH server running commands under a temporary home directory."""
+    from benchmarks.sshd_stub import StubSSHServer
+
+    server = StubSSHServer('secret')
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def openssh_key():
+    """Make a fresh OpenSSH public key line."""
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+
+    def make(comment: str = '') -> str:
+        key = ed25519.Ed25519PrivateKey.generate().public_key().public_bytes(
+            serialization.Encoding.OpenSSH, serialization.PublicFormat.OpenSSH).decode()
+        return f"{key} {comment}".strip()
+    return make
@@ -0,0 +1,122 @@
+import os
+
+import pytest
+
+from application.audit import reconcile_serials
+
+
+@pytest.fixture
+def keys(manager, openssh_key):
+    """Cached public keys for YubiKeys 111 and 222; 333 is a serial with no cached key."""
+    known = {serial: openssh_key(f'yubikey {serial}') for serial in ('111', '222')}
+    for serial, key in known.items():
+        manager.key_cache.put(serial, key)
+    return known
+
+
+def add_server(manager, stub, serials):
+    manager.add_server({'name': f'stub{stub.port}', 'hostname': '127.0.0.1', 'port': stub.port,
+                        'username': 'deploy', 'yubikey_serials': serials})
+    return next(server for server in manager.get_servers() if server['port'] == stub.port)
+
+
+def write_authorized_keys(stub, *lines, mode='w'):
+    path = os.path.join(stub.home, '.ssh', 'authorized_keys')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, mode) as f:
+        f.write(''.join(line + '\n' for line in lines))
+    return path
+
+
+def audit(manager, **kwargs):
+    *hosts, summary = manager.audit_authorized_keys('secret', timeout=5, **kwargs)
+    return hosts, summary
+
+
+def test_serials_follow_the_file(manager, sshd, keys, openssh_key):
+    server = add_server(manager, sshd, ['222', '333'])
+    # 111 was installed by hand with options; 222 was removed; the other key is nobody's YubiKey
+    write_authorized_keys(sshd, f'from="10.0.0.0/8",no-pty {keys["111"]}', openssh_key('laptop'))
+
+    hosts, summary = audit(manager)
+
+    assert hosts[0]['added'] == ['111'] and hosts[0]['removed'] == ['222']
+    assert hosts[0]['keys'] == 2 and hosts[0]['unknown_keys'] == 1
+    # 333 has no cached key, so the audit can't tell and leaves it
+    assert manager.get_server(server['id'])['yubikey_serials'] == ['333', '111']
+    assert summary == {"summary": True, "success": True, "total": 1, "audited": 1, "cached": 0,
+                       "updated": 1, "failed": 0}
+
+
+def test_missing_file_drops_known_serials_only(manager, sshd, keys):
+    server = add_server(manager, sshd, ['111', '333'])
+
+    hosts, _ = audit(manager)
+
+    assert hosts[0]['exists'] is False
+    assert manager.get_server(server['id'])['yubikey_serials'] == ['333']
+
+
+def test_corrections_are_one_inventory_write(manager, sshd, keys, monkeypatch):
+    from benchmarks.sshd_stub import StubSSHServer
+
+    others = [StubSSHServer('secret'), StubSSHServer('secret')]
+    try:
+        add_server(manager, sshd, [])
+        add_server(manager, others[0], ['111'])
+        add_server(manager, others[1], [])
+        write_authorized_keys(sshd, keys['111'], keys['222'])
+        batches = []
+        apply_batch = manager.inventory.apply_batch
+        monkeypatch.setattr(manager.inventory, 'apply_batch',
+                            lambda records: (batches.append(records), apply_batch(records)))
+
+        _, summary = audit(manager)
+    finally:
+        for other in others:
+            other.close()
+
+    assert summary['updated'] == 2
+    assert len(batches) == 1
+    assert sorted(record['fields']['yubikey_serials'] for record in batches[0]) == [[], ['111', '222']]
+
+
+def test_unchanged_files_are_not_downloaded_again(manager, sshd, keys):
+    server = add_server(manager, sshd, [])
+    path = write_authorized_keys(sshd, keys['111'])
+    assert audit(manager)[0][0]['cached'] is False
+
+    hosts, summary = audit(manager)
+    assert hosts[0]['cached'] is True and summary['cached'] == 1
+    assert hosts[0]['yubikey_serials'] == ['111']
+
+    write_authorized_keys(sshd, keys['222'], mode='a')
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 5))
+    hosts, _ = audit(manager)
+
+    assert hosts[0]['cached'] is False
+    assert manager.get_server(server['id'])['yubikey_serials'] == ['111', '222']
+    # full=True downloads even an unchanged file
+    assert audit(manager, full=True)[0][0]['cached'] is False
+
+
+def test_unreachable_hosts_are_reported(manager, sshd, keys):
+    add_server(manager, sshd, ['111'])
+    manager.inventory.update(manager.get_servers()[0]['id'], {'port': 1})
+
+    hosts, summary = audit(manager)
+
+    assert not hosts[0]['success'] and hosts[0]['message'].startswith("Audit failed")
+    assert summary['failed'] == 1 and not summary['success']
+    assert manager.get_servers()[0]['yubikey_serials'] == ['111']
+
+
+@pytest.mark.parametrize('current, matched, expected', [
+    (['222', '333'], ['111'], ['333', '111']),
+    (['111'], ['111', '111'], ['111']),
+    ([], ['222', '111'], ['222', '111']),
+    (['333'], [], ['333']),
+])
+def test_reconcile_serials(current, matched, expected):
+    assert reconcile_serials(current, matched, {'111', '222'}) == expected
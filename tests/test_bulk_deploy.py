@@ -0,0 +1,153 @@
+import os
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from application.fleet import MAX_CONCURRENCY, clamp_concurrency, run_parallel
+from backend import routes
+
+SERIAL = '12345678'
+
+
+@pytest.fixture
+def public_key(manager, openssh_key, monkeypatch):
+    """Select a YubiKey whose export returns a fixed public key."""
+    key = openssh_key('yubikey')
+    manager.set_selected_yubikey(SERIAL)
+    monkeypatch.setattr(manager, '_export_public_key', lambda serial: {"success": True, "public_key": key})
+    return key
+
+
+@pytest.fixture
+def fleet(manager, sshd):
+    """Three live stub sshds plus one server on a port nothing listens on."""
+    from benchmarks.sshd_stub import StubSSHServer
+
+    stubs = [sshd, StubSSHServer('secret'), StubSSHServer('secret')]
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        dead_port = sock.getsockname()[1]
+    for number, port in enumerate([stub.port for stub in stubs] + [dead_port]):
+        manager.add_server({'name': f'host{number}', 'hostname': '127.0.0.1', 'port': port, 'username': 'deploy'})
+    yield stubs
+    for stub in stubs[1:]:
+        stub.close()
+
+
+def servers_by_port(manager):
+    return {server['port']: server for server in manager.get_servers()}
+
+
+def authorized_keys(stub):
+    path = os.path.join(stub.home, '.ssh', 'authorized_keys')
+    return open(path).read() if os.path.exists(path) else ''
+
+
+def test_results_stream_per_host_with_a_summary(manager, fleet, public_key):
+    results = list(manager.deploy_key_bulk('secret', '123456', selector={'all': True}, concurrency=4, timeout=5))
+
+    *hosts, summary = results
+    assert sorted(result['name'] for result in hosts) == ['host0', 'host1', 'host2', 'host3']
+    assert [result['success'] for result in hosts].count(True) == 3
+    assert summary == {"summary": True, "success": False, "total": 4, "succeeded": 3, "failed": 1}
+    for stub in fleet:
+        assert authorized_keys(stub) == public_key + '\n'
+
+
+def test_serial_is_recorded_in_one_write_on_successful_hosts_only(manager, fleet, public_key, monkeypatch):
+    batches = []
+    apply_batch = manager.inventory.apply_batch
+    monkeypatch.setattr(manager.inventory, 'apply_batch',
+                        lambda records: (batches.append(records), apply_batch(records)))
+
+    list(manager.deploy_key_bulk('secret', '123456', selector={'all': True}, timeout=5))
+
+    assert len(batches) == 1
+    live = {servers_by_port(manager)[stub.port]['id'] for stub in fleet}
+    assert {record['id'] for record in batches[0]} == live
+    assert all(record == {'op': 'add_serial', 'id': record['id'], 'serial': SERIAL} for record in batches[0])
+    serials = {server['name']: server.get('yubikey_serials', []) for server in manager.get_servers()}
+    assert serials == {'host0': [SERIAL], 'host1': [SERIAL], 'host2': [SERIAL], 'host3': []}
+
+
+def test_without_serial_selector_skips_authorized_hosts(manager, fleet, public_key):
+    list(manager.deploy_key_bulk('secret', '123456', server_ids=[servers_by_port(manager)[fleet[0].port]['id']]))
+    connections = [stub.connections for stub in fleet]
+
+    results = list(manager.deploy_key_bulk('secret', '123456', selector={'without_yubikey_serial': SERIAL},
+                                           timeout=5))
+
+    assert sorted(result['name'] for result in results[:-1]) == ['host1', 'host2', 'host3']
+    assert fleet[0].connections == connections[0]
+    assert results[-1]['succeeded'] == 2
+
+
+def test_failed_export_stops_before_connecting(manager, fleet, monkeypatch):
+    manager.set_selected_yubikey(SERIAL)
+    monkeypatch.setattr(manager, '_export_public_key',
+                        lambda serial: {"success": False, "message": "Selected YubiKey not found"})
+
+    results = list(manager.deploy_key_bulk('secret', '123456', selector={'all': True}))
+
+    assert results == [{"success": False, "message": "Selected YubiKey not found", "summary": True}]
+    assert [stub.connections for stub in fleet] == [0, 0, 0]
+
+
+@pytest.mark.parametrize('requested, expected', [
+    (None, 8), (0, 8), ('4', 4), ('many', 8), (-3, 1), (10 ** 6, MAX_CONCURRENCY)])
+def test_concurrency_is_clamped(requested, expected):
+    assert clamp_concurrency(requested) == expected
+
+
+def test_run_parallel_keeps_at_most_concurrency_in_flight():
+    lock = threading.Lock()
+    running = peak = 0
+
+    def work(item):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.02)
+        with lock:
+            running -= 1
+        if item == 7:
+            raise ValueError("boom")
+        return item * 2
+
+    results = dict(run_parallel(range(20), work, concurrency=3))
+
+    assert peak == 3
+    assert isinstance(results.pop(7), ValueError)
+    assert results == {item: item * 2 for item in range(20) if item != 7}
+
+
+def post(client, body):
+    return client.post('/api/deploy-key/bulk', json=body, headers={routes.TOKEN_HEADER: routes.API_TOKEN})
+
+
+@pytest.mark.parametrize('body, message', [
+    ({'password': 'secret', 'selector': {'all': True}}, "PIN and password are required"),
+    ({'pin': '123456', 'selector': {'all': True}}, "PIN and password are required"),
+    ({'pin': '123456', 'password': 'secret'}, "server_ids or selector is required"),
+    ({'pin': '123456', 'password': 'secret', 'server_ids': ['not-a-uuid']}, "Invalid server ID or timeout"),
+    ({'pin': '123456', 'password': 'secret', 'selector': {'all': True}, 'timeout': 'soon'},
+     "Invalid server ID or timeout"),
+])
+def test_route_rejects_incomplete_requests(client, body, message):
+    response = post(client, body)
+
+    assert response.status_code == 400
+    assert response.get_json()['message'] == message
+
+
+def test_route_streams_ndjson(client, manager, fleet, public_key):
+    response = post(client, {'pin': '123456', 'password': 'secret', 'selector': {'all': True}, 'timeout': 5})
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert response.mimetype == 'application/x-ndjson'
+    assert len(lines) == 5
+    assert lines[-1]['summary'] and lines[-1]['succeeded'] == 3
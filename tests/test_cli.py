@@ -0,0 +1,92 @@
+import io
+import json
+
+import pytest
+
+from application import cli
+
+
+@pytest.fixture
+def run_cli(tmp_path, capsys, monkeypatch):
+    """Run the CLI against a fresh app directory; returns (exit code, JSON lines printed)."""
+    monkeypatch.delenv(cli.PASSWORD_ENV_VAR, raising=False)
+    monkeypatch.delenv(cli.PIN_ENV_VAR, raising=False)
+
+    def run(*argv, stdin=''):
+        monkeypatch.setattr('sys.stdin', io.StringIO(stdin))
+        code = cli.main(['--app-dir', str(tmp_path / 'app'), *argv])
+        return code, [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    return run
+
+
+def add(run_cli, name, hostname, port=22):
+    return run_cli('servers', 'add', '--name', name, '--hostname', hostname, '--username', 'deploy',
+                   '--port', str(port))
+
+
+def test_add_and_list(run_cli):
+    code, lines = add(run_cli, 'web1', 'web1.example.com', 2222)
+    assert code == 0 and lines[0]['success']
+    add(run_cli, 'db1', 'db1.example.com')
+
+    code, servers = run_cli('servers', 'list')
+
+    assert code == 0
+    assert [(server['name'], server['port']) for server in servers] == [('web1', 2222), ('db1', 22)]
+    assert run_cli('servers', 'list', '--hostname', 'DB1.example.com')[1] == [servers[1]]
+
+
+def test_import_json_lines_from_stdin(run_cli):
+    add(run_cli, 'web1', 'web1.example.com')
+    stdin = ''.join(json.dumps({'name': name, 'hostname': f'{name}.example.com', 'username': 'deploy'}) + '\n'
+                    for name in ('web1', 'web2', 'web3'))
+
+    code, lines = run_cli('servers', 'import', '-', stdin=stdin)
+
+    assert code == 0
+    assert [line.get('status') for line in lines[:-1]] == ['duplicate', 'added', 'added']
+    assert lines[-1] == {"summary": True, "success": True, "added": 2, "duplicate": 1, "invalid": 0}
+
+
+def test_import_json_array_file(run_cli, tmp_path):
+    path = tmp_path / 'servers.json'
+    path.write_text(json.dumps([{'name': 'web1', 'hostname': 'web1.example.com', 'username': 'deploy'},
+                                {'name': 'broken', 'username': 'deploy'}]))
+
+    code, lines = run_cli('servers', 'import', str(path))
+
+    assert code == 1
+    assert [line['status'] for line in lines[:-1]] == ['added', 'invalid']
+    assert len(run_cli('servers', 'list')[1]) == 1
+
+
+def test_import_ssh_config_preview_saves_nothing(run_cli, tmp_path):
+    config = tmp_path / 'ssh_config'
+    config.write_text("Host web1\n    HostName web1.example.com\n    User deploy\n")
+
+    code, lines = run_cli('servers', 'import-ssh-config', '--config', str(config), '--preview')
+
+    assert code == 0
+    assert lines[0]['action'] == 'add' and lines[0]['server']['hostname'] == 'web1.example.com'
+    assert lines[-1]['summary']
+    assert run_cli('servers', 'list')[1] == []
+
+
+def test_deploy_needs_a_selection_and_credentials(run_cli):
+    assert run_cli('deploy')[0] == 2
+    code, lines = run_cli('deploy', '--all')
+
+    assert code == 2
+    assert cli.PIN_ENV_VAR in lines[0]['message']
+
+
+def test_run_streams_output_per_host(run_cli, sshd, monkeypatch):
+    add(run_cli, 'stub', '127.0.0.1', sshd.port)
+    monkeypatch.setenv(cli.PASSWORD_ENV_VAR, 'secret')
+
+    code, lines = run_cli('run', '--all', '--', 'echo hello; echo oops >&2')
+
+    assert code == 0
+    output = [(line['stream'], line['line']) for line in lines if 'line' in line]
+    assert sorted(output) == [('stderr', 'oops'), ('stdout', 'hello')]
+    assert lines[-1]['summary'] and lines[-1]['success']
@@ -0,0 +1,158 @@
+import threading
+import time
+
+import pytest
+
+from application.device_watcher import DeviceWatcher, PollingEventSource, UdevEventSource
+
+YUBIKEY_5 = {'serial': '12345678', 'version': '5.4.3'}
+YUBIKEY_NANO = {'serial': '87654321', 'version': '5.2.7'}
+
+
+class SimulatedDevices:
+    """A device feed the tests plug keys into and out of."""
+
+    def __init__(self):
+        self.devices = []
+        self.error = None
+        self.enumerations = 0
+        self._lock = threading.Lock()
+
+    def plug(self, device):
+        with self._lock:
+            self.devices.append(device)
+
+    def unplug(self, device):
+        with self._lock:
+            self.devices.remove(device)
+
+    def __call__(self):
+        with self._lock:
+            self.enumerations += 1
+            if self.error:
+                raise RuntimeError(self.error)
+            return [dict(device) for device in self.devices]
+
+
+@pytest.fixture
+def feed():
+    return SimulatedDevices()
+
+
+@pytest.fixture
+def start_watcher():
+    watchers = []
+
+    def start(feed, source):
+        watcher = DeviceWatcher(enumerate_devices=feed, event_source=source)
+        watcher.start()
+        watchers.append(watcher)
+        return watcher
+
+    yield start
+    for watcher in watchers:
+        watcher.stop()
+
+
+def test_publishes_plug_and_unplug(feed, start_watcher):
+    watcher = start_watcher(feed, PollingEventSource(min_interval=0.01, max_interval=0.05))
+    seen = []
+    watcher.subscribe(lambda snapshot: seen.append(snapshot))
+    initial = watcher.snapshot()
+    assert initial.generation == 1 and initial.devices == ()
+
+    feed.plug(YUBIKEY_5)
+    plugged = watcher.wait_for_change(initial.generation, timeout=2)
+    assert plugged.generation == 2
+    assert plugged.devices == (YUBIKEY_5,)
+
+    feed.plug(YUBIKEY_NANO)
+    feed.unplug(YUBIKEY_5)
+    swapped = watcher.wait_for_change(plugged.generation, timeout=2)
+    assert swapped.devices == (YUBIKEY_NANO,)
+    assert [snapshot.generation for snapshot in seen] == [2, 3]
+
+
+def test_unchanged_scans_publish_nothing(feed, start_watcher):
+    feed.plug(YUBIKEY_5)
+    watcher = start_watcher(feed, PollingEventSource(min_interval=0.01, max_interval=0.02))
+
+    snapshot = watcher.wait_for_change(watcher.snapshot().generation, timeout=0.3)
+
+    assert snapshot.generation == 1
+    assert feed.enumerations > 3
+
+
+def test_poke_rescans_without_waiting_for_the_interval(feed, start_watcher):
+    watcher = start_watcher(feed, PollingEventSource(min_interval=30, max_interval=30))
+    feed.plug(YUBIKEY_5)
+
+    watcher.poke()
+    snapshot = watcher.wait_for_change(1, timeout=2)
+
+    assert snapshot.devices == (YUBIKEY_5,)
+
+
+def test_enumeration_errors_are_published(feed, start_watcher):
+    watcher = start_watcher(feed, PollingEventSource(min_interval=0.01, max_interval=0.02))
+    feed.error = "PCSC unavailable"
+
+    snapshot = watcher.wait_for_change(1, timeout=2)
+
+    assert snapshot.error == "PCSC unavailable"
+    assert snapshot.devices == ()
+
+
+def test_polling_backoff_is_capped_at_one_second():
+    source = PollingEventSource()
+    for _ in range(20):
+        source.changed(False)
+    assert source.interval == 1.0
+
+    source.changed(True)
+    assert source.interval == source.min_interval
+
+
+def test_polling_backs_off_past_one_second_when_nobody_waits():
+    source = PollingEventSource()
+    for _ in range(20):
+        source.changed(False, active=False)
+    assert source.interval == source.idle_interval > 1.0
+
+    source.changed(False, active=True)
+    assert source.interval == source.max_interval
+
+
+def test_idle_watcher_backs_off_until_a_client_waits(feed, start_watcher):
+    source = PollingEventSource(min_interval=0.01, max_interval=0.02, idle_interval=60, backoff=1000)
+    watcher = start_watcher(feed, source)
+
+    deadline = time.monotonic() + 2
+    while source.interval <= 1.0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not watcher.active()
+    assert source.interval > 1.0
+
+    # A waiter cuts the idle sleep short and keeps the interval short
+    feed.plug(YUBIKEY_5)
+    snapshot = watcher.wait_for_change(1, timeout=2)
+    assert snapshot.devices == (YUBIKEY_5,)
+    assert source.interval <= source.max_interval
+
+
+def test_poke_keeps_the_watcher_active_for_a_while(feed):
+    watcher = DeviceWatcher(enumerate_devices=feed, event_source=PollingEventSource())
+    assert not watcher.active()
+
+    watcher.poke()
+
+    assert watcher.active()
+
+
+def test_udev_event_filter():
+    def uevent(**fields):
+        return b'\0'.join(f'{key}={value}'.encode() for key, value in fields.items())
+
+    assert UdevEventSource.is_yubikey_event(uevent(ACTION='add', SUBSYSTEM='usb', PRODUCT='1050/407/543'))
+    assert not UdevEventSource.is_yubikey_event(uevent(ACTION='change', SUBSYSTEM='usb', PRODUCT='1050/407/543'))
+    assert not UdevEventSource.is_yubikey_event(uevent(ACTION='add', SUBSYSTEM='usb', PRODUCT='46d/c52b/1211'))
@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from backend import routes
+
+
+def post(client, path, body=None, token=routes.API_TOKEN, **kwargs):
+    headers = kwargs.pop('headers', {})
+    if token is not None:
+        headers[routes.TOKEN_HEADER] = token
+    return client.post(path, json=body or {}, headers=headers, **kwargs)
+
+
+@pytest.fixture
+def stub_server(manager, sshd):
+    manager.add_server({'name': 'stub', 'hostname': '127.0.0.1', 'port': sshd.port, 'username': 'deploy'})
+    return manager.get_servers()[0]
+
+
+def test_page_carries_the_token_for_local_requests(client):
+    assert f'content="{routes.API_TOKEN}"' in client.get('/').get_data(as_text=True)
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'environ_base': {'REMOTE_ADDR': '192.168.1.20'}},
+    {'headers': {'Origin': 'https://attacker.example'}},
+    # DNS rebinding: the attacker's name resolves to 127.0.0.1
+    {'base_url': 'http://attacker.example:5000'},
+])
+def test_page_withholds_the_token_from_others(client, kwargs):
+    assert routes.API_TOKEN not in client.get('/', **kwargs).get_data(as_text=True)
+
+
+@pytest.mark.parametrize('path', ['/api/deploy-key/bulk', '/api/audit', '/api/revoke/12345678', '/api/command'])
+class TestFleetAccess:
+    def test_remote_requests_are_refused(self, client, path):
+        response = post(client, path, {'password': 'secret'}, environ_base={'REMOTE_ADDR': '192.168.1.20'})
+
+        assert response.status_code == 403
+
+    def test_requests_without_the_token_are_refused(self, client, path):
+        assert post(client, path, {'password': 'secret'}, token=None).status_code == 403
+        assert post(client, path, {'password': 'secret'}, token='guess').status_code == 403
+
+    @pytest.mark.parametrize('kwargs', [
+        {'headers': {'Origin': 'https://attacker.example'}},
+        {'base_url': 'http://attacker.example:5000'},
+    ])
+    def test_cross_origin_requests_are_refused(self, client, path, kwargs):
+        response = post(client, path, {'password': 'secret'}, **kwargs)
+
+        assert response.status_code == 403
+        assert response.get_json()['message'] == "Cross-origin requests are not allowed"
+
+    def test_a_credential_is_required(self, client, path):
+        response = post(client, path, {'use_agent': 'yes', 'command': 'uptime', 'selector': {'all': True}})
+
+        # Bulk deployment always needs a password; the others can opt into the SSH agent
+        assert response.status_code == 400
+        assert 'password' in response.get_json()['message']
+
+
+def test_audit_runs_with_the_token_and_a_password(client, stub_server):
+    response = post(client, '/api/audit', {'password': 'secret'},
+                    headers={'Origin': 'http://localhost'}, base_url='http://localhost')
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert response.status_code == 200
+    assert lines[0]['server_id'] == stub_server['id']
+    assert lines[-1]['summary']
+
+
+def test_revoke_runs_with_the_token_and_a_password(client, stub_server, openssh_key):
+    response = post(client, '/api/revoke/12345678', {'password': 'secret', 'public_key': openssh_key()})
+
+    assert response.status_code == 200
+    assert [json.loads(line) for line in response.get_data(as_text=True).splitlines()][-1]['summary']
+
+
+def test_command_runs_with_the_token_and_a_password(client, stub_server):
+    response = post(client, '/api/command', {'password': 'secret', 'command': 'echo hello',
+                                             'server_ids': [stub_server['id']]})
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert response.status_code == 200
+    assert {'stream': 'stdout', 'line': 'hello'}.items() <= lines[0].items()
+    assert lines[-1]['summary']
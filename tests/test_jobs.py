@@ -0,0 +1,128 @@
+import time
+import threading
+
+import pytest
+
+from application.jobs import CANCELLED, FAILED, SUCCEEDED, JobQueue
+
+
+@pytest.fixture
+def jobs():
+    queue = JobQueue(workers=1)
+    yield queue
+    queue.shutdown()
+
+
+def wait_finished(queue, job, timeout=5):
+    deadline = time.monotonic() + timeout
+    while job.finished_at is None:
+        assert time.monotonic() < deadline, f"job {job.id} still {job.state}"
+        time.sleep(0.01)
+    return job
+
+
+def test_steps_and_result(jobs):
+    def run(job):
+        job.step('one')
+        job.step('two')
+        return {"success": True}
+
+    job = wait_finished(jobs, jobs.submit('test', run))
+
+    assert job.state == SUCCEEDED
+    assert [step['name'] for step in job.steps] == ['one', 'two']
+    assert all(step['duration'] is not None for step in job.steps)
+
+
+def test_cancel_stops_at_the_next_step(jobs):
+    started = threading.Event()
+    proceed = threading.Event()
+
+    def run(job):
+        job.step('slow')
+        started.set()
+        proceed.wait(5)
+        job.step('never')
+        return {"success": True}
+
+    job = jobs.submit('test', run)
+    started.wait(5)
+    assert jobs.cancel(job.id)
+    proceed.set()
+
+    assert wait_finished(jobs, job).state == CANCELLED
+    assert [step['name'] for step in job.steps] == ['slow']
+
+
+def test_non_cancellable_step_runs_after_cancel(jobs):
+    def run(job):
+        job.step('install')
+        jobs.cancel(job.id)
+        job.step('record', cancellable=False)
+        return {"success": True}
+
+    job = wait_finished(jobs, jobs.submit('test', run))
+
+    assert job.state == SUCCEEDED
+    assert [step['name'] for step in job.steps] == ['install', 'record']
+
+
+@pytest.mark.parametrize('outcome', ['success', 'failure', 'error'])
+def test_finished_jobs_drop_their_closure(jobs, outcome):
+    password = 'hunter2'
+
+    def run(job):
+        # Captures the password, like the deploy route's closure
+        if outcome == 'error':
+            raise RuntimeError(f"login with {len(password)} characters failed")
+        return {"success": outcome == 'success'}
+
+    job = wait_finished(jobs, jobs.submit('test', run))
+
+    assert job.state in (SUCCEEDED, FAILED)
+    assert job.func is None
+
+
+def test_cancelled_queued_job_drops_its_closure(jobs):
+    blocker = threading.Event()
+    first = jobs.submit('test', lambda job: blocker.wait(5) and {"success": True})
+    queued = jobs.submit('test', lambda job: {"success": True})
+
+    assert jobs.cancel(queued.id)
+    blocker.set()
+    wait_finished(jobs, first)
+
+    assert wait_finished(jobs, queued).state == CANCELLED
+    assert queued.func is None
+
+
+def test_deploy_records_serial_when_cancelled_after_install(jobs, manager, sshd, openssh_key, monkeypatch):
+    key = openssh_key()
+    server = {'id': '00000000-0000-0000-0000-000000000001', 'name': 'stub', 'hostname': '127.0.0.1',
+              'port': sshd.port, 'username': 'deploy', 'yubikey_serials': []}
+    manager.inventory.add(server)
+    manager.set_selected_yubikey('12345678')
+    monkeypatch.setattr(manager, '_export_public_key', lambda serial: {"success": True, "public_key": key})
+    install = manager._install_key
+    holder = {}
+
+    def install_then_cancel(*args, **kwargs):
+        result = install(*args, **kwargs)
+        # The user cancels while the install is finishing
+        jobs.cancel(holder['job'].id)
+        return result
+
+    monkeypatch.setattr(manager, '_install_key', install_then_cancel)
+    started = threading.Event()
+
+    def run(job):
+        started.wait(5)
+        return manager.deploy_key(server, 'secret', '123456', progress=job.step)
+
+    holder['job'] = job = jobs.submit('deploy_key', run)
+    started.set()
+    wait_finished(jobs, job)
+
+    assert job.state == SUCCEEDED
+    assert manager.get_server(server['id'])['yubikey_serials'] == ['12345678']
+    assert [step['name'] for step in job.steps] == ['export_key', 'install_key', 'record_serial']
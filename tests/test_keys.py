@@ -0,0 +1,55 @@
+import pytest
+
+from application.keys import PublicKeyCache, openssh_fingerprint
+
+# The export path reads keys through yubikit, which needs pyscard for ykman's device module
+pytest.importorskip('application.piv')
+
+from application.piv import YubiKeyNotFoundError  # noqa: E402
+from application.ssh_manager import SSHManager  # noqa: E402
+from benchmarks.fakes import FakePivConnection, fake_piv_session_opener  # noqa: E402
+
+SERIAL = '12345678'
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return SSHManager(app_dir=tmp_path)
+
+
+def test_export_caches_key_by_fingerprint(manager):
+    connection = FakePivConnection()
+    manager.open_piv_session = fake_piv_session_opener(connection)
+
+    first = manager._export_public_key(SERIAL)
+    second = manager._export_public_key(SERIAL)
+
+    assert first["success"] and second["public_key"] == first["public_key"]
+    fingerprint = openssh_fingerprint(first["public_key"])
+    assert manager.key_cache.fingerprints() == {fingerprint: SERIAL}
+
+
+def test_export_picks_up_regenerated_key(manager):
+    manager.open_piv_session = fake_piv_session_opener(FakePivConnection())
+    old_key = manager._export_public_key(SERIAL)["public_key"]
+
+    # The key in slot 9a is regenerated on the device
+    manager.open_piv_session = fake_piv_session_opener(FakePivConnection())
+    new_key = manager._export_public_key(SERIAL)["public_key"]
+
+    assert new_key != old_key
+    assert manager.key_cache.get(SERIAL) == new_key
+    assert PublicKeyCache(manager.keys_dir).get(SERIAL) == new_key
+    assert manager.key_cache.fingerprints() == {openssh_fingerprint(new_key): SERIAL}
+
+
+def test_export_needs_the_device(manager):
+    manager.key_cache.put(SERIAL, 'ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIOMqqnkVzrm0SdG6UOoqKLsabgH5C9okWi0dh2l9GKJl')
+
+    def missing(serial):
+        raise YubiKeyNotFoundError(f"YubiKey with serial {serial} not found")
+
+    manager.open_piv_session = missing
+    result = manager._export_public_key(SERIAL)
+
+    assert result == {"success": False, "message": "Selected YubiKey not found"}
@@ -0,0 +1,22 @@
+import pytest
+
+# The harness fakes devices by patching ykman's enumeration, which needs pyscard
+pytest.importorskip('ykman.device')
+
+from benchmarks.loadtest import DEFAULT_MIX, run_load  # noqa: E402
+
+
+@pytest.mark.parametrize('store', ['json', 'sqlite'])
+def test_mixed_load_is_served_without_errors(tmp_path, monkeypatch, store):
+    # make_app points HOME (and the store) at its temp directory; undo that afterwards
+    monkeypatch.setenv('HOME', str(tmp_path))
+    monkeypatch.setenv('YUBIKEY_SSH_MANAGER_STORE', store)
+
+    report = run_load(clients=4, duration=1.0, servers=200, store=store)
+
+    assert set(report['endpoints']) == {label for label, _ in DEFAULT_MIX}
+    for label, endpoint in report['endpoints'].items():
+        assert endpoint['errors'] == 0, label
+        assert endpoint['requests_per_s'] > 0, label
+        assert endpoint['p50_ms'] <= endpoint['p95_ms'] <= endpoint['p99_ms'], label
+    assert report['requests_per_s'] > 0
@@ -0,0 +1,79 @@
+import pytest
+
+from application import metrics
+
+
+@pytest.fixture
+def registered():
+    """Remove the metrics a test creates from the process-wide registry afterwards."""
+    before = list(metrics._registry)
+    yield
+    metrics._registry[:] = before
+
+
+def test_counter_and_gauge_exposition(registered):
+    counter = metrics.Counter('test_events_total', "Events.", ('kind',))
+    counter.inc(kind='a')
+    counter.inc(2, kind='quote"back\\slash\nnewline')
+    gauge = metrics.Gauge('test_items', "Items.")
+    gauge.set_function(lambda: 7)
+
+    assert counter.render().splitlines() == [
+        '# HELP test_events_total Events.',
+        '# TYPE test_events_total counter',
+        'test_events_total{kind="a"} 1',
+        'test_events_total{kind="quote\\"back\\\\slash\\nnewline"} 2',
+    ]
+    assert gauge.render().splitlines()[1:] == ['# TYPE test_items gauge', 'test_items 7']
+    with pytest.raises(ValueError):
+        counter.inc(other='x')
+
+
+def test_histogram_buckets_are_cumulative(registered):
+    histogram = metrics.Histogram('test_seconds', "Latency.", ('route',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value, route='/x')
+
+    assert histogram.render().splitlines()[2:] == [
+        'test_seconds_bucket{route="/x",le="0.1"} 1',
+        'test_seconds_bucket{route="/x",le="1.0"} 3',
+        'test_seconds_bucket{route="/x",le="+Inf"} 4',
+        'test_seconds_sum{route="/x"} 4.25',
+        'test_seconds_count{route="/x"} 4',
+    ]
+
+
+def test_timer_counts_errors(registered):
+    errors = metrics.Counter('test_errors_total', "Errors.", ('operation',))
+    histogram = metrics.Histogram('test_op_seconds', "Ops.", ('operation',), errors=errors)
+
+    with histogram.time(operation='ok'):
+        pass
+    with pytest.raises(RuntimeError):
+        with histogram.time(operation='bad'):
+            raise RuntimeError("boom")
+
+    @histogram.time(operation='decorated')
+    def work():
+        return 1
+
+    work()
+    work()
+
+    assert [histogram.count(operation=op) for op in ('ok', 'bad', 'decorated')] == [1, 1, 2]
+    assert errors.value(operation='bad') == 1 and errors.value(operation='ok') == 0
+
+
+def test_metrics_endpoint(client):
+    client.get('/api/servers')
+    client.get('/api/jobs/not-a-job')
+
+    response = client.get('/metrics')
+    body = response.get_data(as_text=True)
+
+    assert response.headers['Content-Type'] == metrics.CONTENT_TYPE
+    assert 'yubikey_ssh_manager_http_request_seconds_count{method="GET",route="/api/servers",status="200"}' in body
+    # Labelled by URL rule, not by the id in the path
+    assert 'route="/api/jobs/<string:job_id>"' in body
+    assert 'not-a-job' not in body
+    assert '# TYPE yubikey_ssh_manager_inventory_servers gauge' in body
@@ -0,0 +1,87 @@
+import time
+import socket
+import asyncio
+
+import pytest
+
+from application.probe import ProbeEngine, probe_host
+
+
+@pytest.fixture
+def closed_port():
+    """A loopback port nothing listens on."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def silent_port():
+    """A loopback port that accepts connections but never sends a banner."""
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(8)
+    yield sock.getsockname()[1]
+    sock.close()
+
+
+def test_probe_reads_the_ssh_banner(sshd):
+    result = asyncio.run(probe_host('127.0.0.1', sshd.port, timeout=2))
+
+    assert result["reachable"] and result["ssh"]
+    assert result["banner"].startswith('SSH-2.0-')
+    assert result["error"] is None
+
+
+def test_probe_reports_a_refused_connection(closed_port):
+    result = asyncio.run(probe_host('127.0.0.1', closed_port, timeout=2))
+
+    assert not result["reachable"]
+    assert result["error"] == "Connection refused"
+
+
+def test_probe_times_out_without_a_banner(silent_port):
+    result = asyncio.run(probe_host('127.0.0.1', silent_port, timeout=0.2))
+
+    assert result["reachable"] and not result["ssh"]
+    assert result["error"] == "Timed out waiting for the SSH banner"
+
+
+def test_results_are_cached_until_the_ttl_expires(sshd):
+    engine = ProbeEngine(ttl=0.5)
+    target = ('127.0.0.1', sshd.port)
+
+    first = engine.probe([target])[target]
+    assert engine.probe([target])[target] is first
+    assert sshd.connections == 1
+
+    time.sleep(0.6)
+    assert engine.cached(*target) is None
+    second = engine.probe([target])[target]
+
+    assert second is not first and second["ssh"]
+    assert sshd.connections == 2
+
+
+def test_refresh_probes_again_within_the_ttl(sshd):
+    engine = ProbeEngine(ttl=60)
+    target = ('127.0.0.1', sshd.port)
+    first = engine.probe([target])[target]
+
+    assert engine.probe([target], refresh=True)[target] is not first
+    assert sshd.connections == 2
+
+
+def test_servers_on_one_host_share_a_probe(sshd, closed_port):
+    engine = ProbeEngine()
+    servers = [
+        {'id': 'a', 'hostname': '127.0.0.1', 'port': sshd.port},
+        {'id': 'b', 'hostname': '127.0.0.1', 'port': str(sshd.port)},
+        {'id': 'c', 'hostname': '127.0.0.1', 'port': closed_port},
+    ]
+
+    results = engine.probe_servers(servers)
+
+    assert results['a'] is results['b'] and results['a']['ssh']
+    assert not results['c']['reachable']
+    assert sshd.connections == 1
@@ -0,0 +1,133 @@
+import os
+import time
+import pstats
+import threading
+
+import pytest
+
+from application import profiling
+from application.profiling import RequestProfiler, ThreadStackDumper, prune_profiles
+
+
+@pytest.fixture
+def profiler(tmp_path, monkeypatch):
+    """The process-wide request profiler, writing under tmp_path."""
+    monkeypatch.delenv(profiling.PROFILE_ENV_VAR, raising=False)
+    profiler = RequestProfiler(tmp_path / 'profiles', max_profiles=5)
+    monkeypatch.setattr(profiling, '_request_profiler', profiler)
+    monkeypatch.setattr(profiling, '_stack_dumper', ThreadStackDumper(tmp_path / 'profiles'))
+    return profiler
+
+
+@pytest.fixture
+def client(profiler, app):
+    # Depends on profiler first, so setup_routes picks up the temporary one
+    return app.test_client()
+
+
+@pytest.fixture
+def busy_thread():
+    """A thread named like a job worker, spinning until the test ends."""
+    stop = threading.Event()
+
+    def spin():
+        while not stop.is_set():
+            time.sleep(0.001)
+
+    thread = threading.Thread(target=spin, name='job-worker-test', daemon=True)
+    thread.start()
+    yield thread
+    stop.set()
+    thread.join()
+
+
+def dumps(profiler, suffix='.pstats'):
+    return sorted(profiler.directory.glob(f'*{suffix}')) if profiler.directory.exists() else []
+
+
+def test_only_matching_requests_are_profiled(client, profiler):
+    assert client.post('/api/admin/profiling', json={'pattern': '^/api/servers$'}).get_json()['enabled']
+
+    client.get('/api/servers')
+    client.get('/api/jobs')
+
+    [dump] = dumps(profiler)
+    assert '-GET-api_servers-' in dump.name
+    assert pstats.Stats(str(dump)).total_calls > 0
+    assert [entry['name'] for entry in client.get('/api/admin/profiling').get_json()['profiles']] == [dump.name]
+
+
+def test_rate_zero_profiles_nothing(client, profiler):
+    client.post('/api/admin/profiling', json={'pattern': '.', 'rate': 0})
+
+    client.get('/api/servers')
+
+    assert dumps(profiler) == []
+
+
+def test_invalid_settings_are_rejected(client, profiler):
+    assert client.post('/api/admin/profiling', json={'pattern': '('}).status_code == 400
+    assert client.post('/api/admin/profiling', json={'pattern': '.', 'rate': 2}).status_code == 400
+    assert not profiler.enabled
+
+
+def test_prune_keeps_the_newest_dumps(tmp_path):
+    for index, name in enumerate(['a.pstats', 'b.folded', 'c.pstats', 'd.folded', 'notes.txt']):
+        (tmp_path / name).write_text(name)
+        os.utime(tmp_path / name, (1000 + index, 1000 + index))
+
+    prune_profiles(tmp_path, keep=2)
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['c.pstats', 'd.folded', 'notes.txt']
+
+
+def test_profiles_are_pruned_as_they_are_written(client, profiler):
+    client.post('/api/admin/profiling', json={'pattern': '^/api/servers$'})
+
+    for _ in range(7):
+        client.get('/api/servers')
+        # Dump names and the pruning order go by time
+        time.sleep(0.002)
+
+    assert len(dumps(profiler)) == profiler.max_profiles
+
+
+@pytest.mark.parametrize('method, path', [
+    ('get', '/api/admin/profiling'),
+    ('post', '/api/admin/profiling'),
+    ('post', '/api/admin/profiling/threads'),
+    ('get', '/api/admin/profiling/some.pstats'),
+])
+def test_admin_routes_are_local_only(client, profiler, method, path):
+    response = getattr(client, method)(path, json={'pattern': '.'}, environ_base={'REMOTE_ADDR': '192.168.1.20'})
+
+    assert response.status_code == 403
+    assert not profiler.enabled
+
+
+def test_thread_stack_dumper_writes_folded_stacks(tmp_path, busy_thread):
+    dumper = ThreadStackDumper(tmp_path)
+
+    path = dumper.start(duration=0.2, interval=0.01, thread_pattern='^job-worker-test$')
+    with pytest.raises(RuntimeError):
+        dumper.start()
+    dumper._thread.join()
+
+    lines = path.read_text().splitlines()
+    assert path.suffix == '.folded' and lines
+    for line in lines:
+        stack, count = line.rsplit(' ', 1)
+        assert stack.startswith('job-worker-test;') and 'spin (test_profiling.py:' in stack
+        assert int(count) > 0
+
+
+def test_thread_sampling_route(client, profiler, busy_thread):
+    response = client.post('/api/admin/profiling/threads', json={'duration': 0.1, 'threads': 'job-worker-test'})
+    assert response.status_code == 202
+    assert client.post('/api/admin/profiling/threads', json={'duration': 0.1}).status_code == 409
+    profiling.get_stack_dumper()._thread.join()
+
+    download = client.get(f"/api/admin/profiling/{response.get_json()['profile']}")
+
+    assert download.status_code == 200
+    assert download.get_data(as_text=True).startswith('job-worker-test;')
@@ -0,0 +1,110 @@
+import os
+import stat
+
+import pytest
+
+from application.remote_keys import authorized_key_fingerprints
+from application.keys import openssh_fingerprint
+
+
+def server_for(sshd):
+    return {'id': '00000000-0000-0000-0000-000000000001', 'name': 'stub', 'hostname': '127.0.0.1',
+            'port': sshd.port, 'username': 'deploy', 'yubikey_serials': []}
+
+
+def authorized_keys(sshd):
+    return os.path.join(sshd.home, '.ssh', 'authorized_keys')
+
+
+def mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_install_creates_ssh_dir_in_one_round_trip(manager, sshd, openssh_key):
+    key = openssh_key('yubikey')
+
+    result = manager._install_key(server_for(sshd), key, 'secret')
+
+    assert result == {"success": True, "status": "added", "message": "Key deployed successfully"}
+    assert sshd.commands == 1
+    assert open(authorized_keys(sshd)).read() == key + '\n'
+    assert mode(os.path.dirname(authorized_keys(sshd))) == 0o700
+    assert mode(authorized_keys(sshd)) == 0o600
+
+
+def test_install_is_idempotent(manager, sshd, openssh_key):
+    key = openssh_key()
+    manager._install_key(server_for(sshd), key, 'secret')
+
+    result = manager._install_key(server_for(sshd), key, 'secret')
+
+    assert result["status"] == "present"
+    assert open(authorized_keys(sshd)).read().count(key) == 1
+
+
+def test_install_keeps_existing_keys(manager, sshd, openssh_key):
+    other = openssh_key('other')
+    os.makedirs(os.path.dirname(authorized_keys(sshd)))
+    # No trailing newline: the new key must still start on its own line
+    with open(authorized_keys(sshd), 'w') as f:
+        f.write(other)
+    key = openssh_key()
+
+    assert manager._install_key(server_for(sshd), key, 'secret')["status"] == "added"
+    assert open(authorized_keys(sshd)).read().splitlines() == [other, key]
+
+
+@pytest.mark.skipif(os.geteuid() == 0, reason="root can write read-only files")
+def test_install_reports_unwritable_file(manager, sshd, openssh_key):
+    os.makedirs(os.path.dirname(authorized_keys(sshd)))
+    open(authorized_keys(sshd), 'w').close()
+    os.chmod(authorized_keys(sshd), 0o400)
+
+    result = manager._install_key(server_for(sshd), openssh_key(), 'secret')
+
+    assert not result["success"] and result["status"] == "not_writable"
+
+
+def test_install_reports_failed_login(manager, sshd, openssh_key):
+    result = manager._install_key(server_for(sshd), openssh_key(), 'wrong')
+
+    assert not result["success"]
+    assert result["message"].startswith("Connection failed")
+
+
+def test_remove_drops_every_line_with_the_key(manager, sshd, openssh_key):
+    key, other = openssh_key('mine'), openssh_key('other')
+    os.makedirs(os.path.dirname(authorized_keys(sshd)))
+    with open(authorized_keys(sshd), 'w') as f:
+        f.write(f'{other}\n{key}\nfrom="10.0.0.0/8",no-pty {key.rsplit(" ", 1)[0]} laptop\n')
+
+    result = manager._remove_key(server_for(sshd), key, 'secret')
+
+    assert result["status"] == "removed" and result["lines_removed"] == 2
+    assert open(authorized_keys(sshd)).read() == other + '\n'
+    assert mode(authorized_keys(sshd)) == 0o600
+    assert manager._remove_key(server_for(sshd), key, 'secret')["status"] == "absent"
+
+
+def test_remove_without_authorized_keys(manager, sshd, openssh_key):
+    result = manager._remove_key(server_for(sshd), openssh_key(), 'secret')
+
+    assert result == {"success": True, "status": "absent", "message": "Key was not in authorized_keys",
+                      "lines_removed": 0}
+
+
+def test_revoke_clears_the_serial(manager, sshd, openssh_key):
+    key, other = openssh_key(), openssh_key()
+    server = dict(server_for(sshd), yubikey_serials=['111', '222'])
+    manager.inventory.add(server)
+    manager.key_cache.put('111', key)
+    for public_key in (key, other):
+        manager._install_key(server, public_key, 'secret')
+
+    results = list(manager.revoke_key('111', 'secret'))
+
+    assert results[-1]["summary"] and results[-1]["revoked"] == 1 and results[-1]["failed"] == 0
+    assert manager.get_server(server['id'])['yubikey_serials'] == ['222']
+    remaining = authorized_key_fingerprints(open(authorized_keys(sshd)).read())
+    assert remaining == [openssh_fingerprint(other)]
+    assert manager.get_revocation_report('111')['hosts'][0]['status'] == 'removed'
@@ -0,0 +1,93 @@
+import json
+
+from backend import routes
+from tests.test_device_watcher import YUBIKEY_5
+
+
+def read_events(response, count):
+    """The first ``count`` SSE messages of a streaming response, as (event, id, data)."""
+    events = []
+    buffer = ''
+    for chunk in response.response:
+        buffer += chunk.decode() if isinstance(chunk, bytes) else chunk
+        while '\n\n' in buffer and len(events) < count:
+            message, buffer = buffer.split('\n\n', 1)
+            fields = dict(line.split(': ', 1) for line in message.splitlines() if ': ' in line)
+            if 'event' in fields:
+                events.append((fields['event'], fields.get('id'), json.loads(fields['data'])))
+        if len(events) >= count:
+            break
+    response.close()
+    return events
+
+
+def test_event_ids_carry_the_boot_id(client):
+    events = read_events(client.get('/api/events', buffered=False), 2)
+
+    assert [event for event, _, _ in events] == ['devices', 'inventory']
+    event_id = events[0][1]
+    assert event_id.startswith(routes.BOOT_ID + '-')
+    assert routes.parse_event_id(event_id)[:2] == (events[0][2]['generation'], events[1][2]['revision'])
+
+
+def test_event_id_from_another_boot_gets_a_full_resync(client, devices):
+    stale = "0ldb00t-1-1-"
+    assert routes.parse_event_id(stale) == (None, None, None)
+
+    events = read_events(client.get('/api/events', headers={'Last-Event-ID': stale}, buffered=False), 2)
+
+    assert [event for event, _, _ in events] == ['devices', 'inventory']
+
+
+def test_event_id_from_this_boot_resumes(client, devices):
+    current = read_events(client.get('/api/events', buffered=False), 1)[0][1]
+
+    response = client.get('/api/events', headers={'Last-Event-ID': current}, buffered=False)
+    devices.plug(YUBIKEY_5)
+    events = read_events(response, 1)
+
+    # Only the change since the id is sent, not the inventory again
+    assert [event for event, _, _ in events] == ['devices']
+    assert events[0][2]['yubikeys'] == [YUBIKEY_5]
+
+
+def test_state_etag_revalidates(client):
+    first = client.get('/api/state?fields=selected,servers')
+    etag = first.headers['ETag'].strip('"')
+
+    assert etag.startswith(routes.BOOT_ID + '-')
+    assert client.get('/api/state?fields=selected,servers', headers={'If-None-Match': f'"{etag}"'}).status_code == 304
+
+
+def test_state_etag_from_another_boot_does_not_match(client):
+    etag = client.get('/api/state').headers['ETag'].strip('"')
+    # The same counters as seen by a previous process
+    stale = '0ldb00t' + etag[len(routes.BOOT_ID):]
+
+    response = client.get('/api/state', headers={'If-None-Match': f'"{stale}"'})
+
+    assert response.status_code == 200
+    assert response.get_json()['version'].startswith(routes.BOOT_ID + '-')
+
+
+def test_state_etag_changes_with_the_inventory(client, manager):
+    etag = client.get('/api/state').headers['ETag']
+    manager.add_server({'name': 'web1', 'hostname': 'web1.example.com', 'username': 'deploy', 'port': 22})
+
+    response = client.get('/api/state', headers={'If-None-Match': etag})
+
+    assert response.status_code == 200
+    assert [server['name'] for server in response.get_json()['servers']] == ['web1']
+
+
+def test_ndjson_response_streams_with_the_transfer_serializer(app, monkeypatch):
+    serialized = []
+    dumps = routes.transfer.dumps
+    monkeypatch.setattr(routes.transfer, 'dumps', lambda obj: (serialized.append(obj), dumps(obj))[1])
+
+    with app.test_request_context():
+        response = routes.ndjson_response(iter([{'host': 'a'}, {'summary': True}]))
+        body = b''.join(response.response)
+
+    assert response.mimetype == 'application/x-ndjson'
+    assert [json.loads(line) for line in body.splitlines()] == serialized == [{'host': 'a'}, {'summary': True}]
@@ -0,0 +1,66 @@
+import pytest
+
+from application.search import InvalidQueryError, ServerIndex
+
+SERVERS = [
+    {'id': str(number), 'name': f'web{number:02d}', 'hostname': f'web{number:02d}.example.com',
+     'username': 'deploy', 'port': 2200 + (number * 7) % 10}
+    for number in range(1, 26)
+]
+
+
+def pages(index, **query):
+    """Every page of a query, following next_cursor to the end."""
+    names = []
+    cursor = None
+    while True:
+        page = index.search(limit=10, cursor=cursor, **query)
+        names.append([server['name'] for server in page['servers']])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return names
+
+
+def test_cursor_pages_through_every_server():
+    index = ServerIndex(SERVERS, revision=1)
+
+    names = pages(index)
+
+    assert [len(page) for page in names] == [10, 10, 5]
+    assert sum(names, []) == sorted(server['name'] for server in SERVERS)
+
+
+def test_cursor_pages_in_descending_port_order():
+    index = ServerIndex(SERVERS, revision=1)
+
+    names = sum(pages(index, sort='port', order='desc'), [])
+
+    expected = sorted(SERVERS, key=lambda server: (server['port'], server['id']), reverse=True)
+    assert names == [server['name'] for server in expected]
+
+
+@pytest.mark.parametrize('sort, order', [('name', 'asc'), ('port', 'desc'), ('hostname', 'asc')])
+def test_cursor_from_another_sort_is_rejected(sort, order):
+    index = ServerIndex(SERVERS, revision=1)
+    cursor = index.search(sort='port', limit=10)['next_cursor']
+
+    with pytest.raises(InvalidQueryError):
+        index.search(sort=sort, order=order, cursor=cursor)
+
+
+def test_malformed_cursor_is_rejected():
+    index = ServerIndex(SERVERS, revision=1)
+
+    with pytest.raises(InvalidQueryError):
+        index.search(cursor='not-a-cursor')
+
+
+def test_cursor_from_another_sort_is_a_bad_request(client, manager):
+    for server in SERVERS[:3]:
+        manager.add_server({key: value for key, value in server.items() if key != 'id'})
+    cursor = client.get('/api/servers?sort=port&limit=1').get_json()['next_cursor']
+
+    response = client.get(f'/api/servers?sort=name&limit=1&cursor={cursor}')
+
+    assert response.status_code == 400
+    assert 'sort=port' in response.get_json()['message']
@@ -0,0 +1,174 @@
+import os
+import textwrap
+
+import pytest
+
+from application.ssh_config import SSHConfigCache, SSHConfigError, SSHConfigParser, parse_known_hosts, plan_sync
+
+
+def write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(textwrap.dedent(text))
+    return path
+
+
+@pytest.fixture
+def ssh_dir(tmp_path):
+    return tmp_path / '.ssh'
+
+
+def hosts_by_alias(config, default_user='me'):
+    return {host['alias']: host for host in SSHConfigParser(config).parse().hosts(default_user)}
+
+
+def test_first_value_from_matching_blocks_wins(ssh_dir):
+    config = write(ssh_dir / 'config', """
+        User everyone
+
+        Host web1 web2
+            HostName %h.example.com
+            Port 2222
+
+        Host *.corp !bastion.corp
+            User corp
+            ProxyJump bastion.corp
+            Port 22
+
+        Host db.corp bastion.corp
+            Port=2200
+
+        Host *
+            User fallback
+    """)
+
+    hosts = hosts_by_alias(config)
+
+    assert list(hosts) == ['web1', 'web2', 'db.corp', 'bastion.corp']
+    assert hosts['web1'] == {'alias': 'web1', 'hostname': 'web1.example.com', 'port': 2222,
+                             'username': 'everyone', 'source': 'ssh_config'}
+    # The wildcard block comes first, so its Port wins over the concrete block's
+    assert hosts['db.corp']['port'] == 22
+    assert hosts['db.corp']['proxy_jump'] == 'bastion.corp'
+    # The negated pattern keeps the bastion out of the *.corp block
+    assert hosts['bastion.corp']['port'] == 2200
+    assert 'proxy_jump' not in hosts['bastion.corp']
+
+
+def test_include_follows_relative_globs(ssh_dir):
+    write(ssh_dir / 'conf.d' / 'a.conf', """
+        Host app
+            HostName app.internal
+    """)
+    write(ssh_dir / 'conf.d' / 'b.conf', """
+        Host cache
+            HostName cache.internal
+    """)
+    config = write(ssh_dir / 'config', """
+        Host jump
+            Include conf.d/*.conf
+            User admin
+    """)
+
+    parser = SSHConfigParser(config).parse()
+    hosts = {host['alias']: host for host in parser.hosts('me')}
+
+    assert list(hosts) == ['jump', 'app', 'cache']
+    assert hosts['app']['hostname'] == 'app.internal'
+    # Lines after the Include still belong to the block it appeared in
+    assert hosts['jump']['username'] == 'admin'
+    assert hosts['app']['username'] == 'me'
+    assert ssh_dir / 'conf.d' in parser.sources
+
+
+def test_match_blocks_are_skipped(ssh_dir):
+    config = write(ssh_dir / 'config', """
+        Match host web exec "true"
+            User matched
+
+        Host web
+            HostName web.example.com
+    """)
+
+    assert hosts_by_alias(config)['web']['username'] == 'me'
+
+
+def test_missing_config_is_an_error(ssh_dir):
+    with pytest.raises(SSHConfigError):
+        SSHConfigParser(ssh_dir / 'config').parse()
+
+
+def test_known_hosts_skips_hashed_and_marked_entries(ssh_dir):
+    known_hosts = write(ssh_dir / 'known_hosts', """
+        web.example.com,10.0.0.5 ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIA
+        |1|JfKTdBh7rNbXkVAQCRp4OQoPfmI=|USECr3SWf1JUPsms5AqfD5QfxkM= ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIB
+        [git.example.com]:2222 ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIC
+        @cert-authority *.example.com ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAID
+        *.corp ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIE
+        WEB.example.com ssh-rsa AAAAB3NzaC1yc2EAAAADAQABAAABAQ
+        # a comment
+    """)
+
+    hosts = parse_known_hosts(known_hosts, 'me')
+
+    assert hosts == [
+        {'alias': 'web.example.com', 'hostname': 'web.example.com', 'port': 22, 'username': 'me',
+         'source': 'known_hosts'},
+        {'alias': 'git.example.com:2222', 'hostname': 'git.example.com', 'port': 2222, 'username': 'me',
+         'source': 'known_hosts'},
+    ]
+
+
+def test_cache_is_reused_until_a_file_changes(tmp_path, ssh_dir):
+    config = write(ssh_dir / 'config', "Host web\n")
+    known_hosts = write(ssh_dir / 'known_hosts', "db.example.com ssh-ed25519 AAAA\n")
+    cache = SSHConfigCache(tmp_path)
+
+    first, cached = cache.hosts(config, known_hosts, 'me')
+    assert not cached
+    assert [host['alias'] for host in first] == ['web', 'db.example.com']
+    # A new cache object reads the persisted entry
+    assert SSHConfigCache(tmp_path).hosts(config, known_hosts, 'me') == (first, True)
+
+    write(ssh_dir / 'config', "Host web api\n")
+    os.utime(config, ns=(0, os.stat(config).st_mtime_ns + 10 ** 9))
+    hosts, cached = cache.hosts(config, known_hosts, 'me')
+
+    assert not cached
+    assert [host['alias'] for host in hosts] == ['web', 'api', 'db.example.com']
+
+
+def test_cache_notices_new_include_files(tmp_path, ssh_dir):
+    config = write(ssh_dir / 'config', "Include conf.d/*\n")
+    (ssh_dir / 'conf.d').mkdir()
+    cache = SSHConfigCache(tmp_path)
+    assert cache.hosts(config, None, 'me') == ([], False)
+
+    write(ssh_dir / 'conf.d' / 'web', "Host web\n")
+    os.utime(ssh_dir / 'conf.d', ns=(0, os.stat(ssh_dir / 'conf.d').st_mtime_ns + 10 ** 9))
+    hosts, cached = cache.hosts(config, None, 'me')
+
+    assert not cached
+    assert [host['alias'] for host in hosts] == ['web']
+
+
+def test_plan_sync_adds_updates_and_reports_stale():
+    hosts = [
+        {'alias': 'web', 'hostname': 'web.new', 'port': 22, 'username': 'me', 'source': 'ssh_config'},
+        {'alias': 'db', 'hostname': 'db.example.com', 'port': 22, 'username': 'me', 'source': 'ssh_config'},
+        {'alias': 'api', 'hostname': 'api.example.com', 'port': 22, 'username': 'me', 'source': 'ssh_config'},
+    ]
+    servers = [
+        {'id': '1', 'hostname': 'web.old', 'port': 22, 'username': 'me', 'proxy_jump': 'bastion',
+         'import_source': 'ssh_config', 'ssh_alias': 'web'},
+        {'id': '2', 'hostname': 'db.example.com', 'port': 22, 'username': 'me'},
+        {'id': '3', 'hostname': 'gone', 'port': 22, 'username': 'me',
+         'import_source': 'ssh_config', 'ssh_alias': 'gone'},
+    ]
+
+    changes = plan_sync(hosts, servers)
+
+    assert [(change['action'], change['alias']) for change in changes] == [
+        ('update', 'web'), ('exists', 'db'), ('add', 'api'), ('stale', 'gone')]
+    assert changes[0]['fields'] == {'hostname': 'web.new', 'proxy_jump': None}
+    assert changes[2]['server'] == {'name': 'api', 'import_source': 'ssh_config', 'ssh_alias': 'api',
+                                    'hostname': 'api.example.com', 'port': 22, 'username': 'me'}
@@ -0,0 +1,133 @@
+import time
+import threading
+
+import pytest
+
+from application.ssh_pool import PoolExhaustedError, SSHConnectionPool
+from benchmarks.sshd_stub import StubSSHServer
+
+
+@pytest.fixture
+def stubs():
+    servers = [StubSSHServer('secret'), StubSSHServer('secret')]
+    yield servers
+    for server in servers:
+        server.close()
+
+
+@pytest.fixture
+def pool():
+    pool = SSHConnectionPool(max_per_host=2)
+    yield pool
+    pool.close_all()
+
+
+def run(client, command='true'):
+    stdin, stdout, stderr = client.exec_command(command)
+    return stdout.channel.recv_exit_status()
+
+
+def closed(client):
+    return client.get_transport() is None or not client.get_transport().is_active()
+
+
+def test_reuses_connection_per_host_and_user(stubs, pool):
+    first, second = stubs
+    for _ in range(3):
+        with pool.connection('127.0.0.1', first.port, 'deploy', 'secret') as client:
+            assert run(client) == 0
+    with pool.connection('127.0.0.1', second.port, 'deploy', 'secret'):
+        pass
+    with pool.connection('127.0.0.1', first.port, 'other', 'secret'):
+        pass
+
+    assert first.connections == 2
+    assert second.connections == 1
+
+
+def test_different_password_gets_its_own_connection(stubs, pool):
+    stub = stubs[0]
+    with pool.connection('127.0.0.1', stub.port, 'deploy', 'secret'):
+        pass
+    stub.password = 'rotated'
+    with pool.connection('127.0.0.1', stub.port, 'deploy', 'rotated'):
+        pass
+    # The old password's connection is still pooled and reused
+    with pool.connection('127.0.0.1', stub.port, 'deploy', 'secret'):
+        pass
+
+    assert stub.connections == 2
+
+
+def test_per_host_limit(stubs, pool):
+    first, second = stubs
+    release = threading.Event()
+    checked_out = threading.Barrier(3)
+
+    def hold():
+        with pool.connection('127.0.0.1', first.port, 'deploy', 'secret'):
+            checked_out.wait()
+            release.wait(5)
+
+    holders = [threading.Thread(target=hold) for _ in range(2)]
+    for holder in holders:
+        holder.start()
+    checked_out.wait()
+    try:
+        with pytest.raises(PoolExhaustedError):
+            with pool.connection('127.0.0.1', first.port, 'deploy', 'secret', timeout=0.2):
+                pass
+        # Other hosts have their own slots
+        with pool.connection('127.0.0.1', second.port, 'deploy', 'secret', timeout=0.2) as client:
+            assert run(client) == 0
+    finally:
+        release.set()
+        for holder in holders:
+            holder.join()
+
+    with pool.connection('127.0.0.1', first.port, 'deploy', 'secret', timeout=0.2):
+        pass
+    assert first.connections == 2
+
+
+def test_evict_idle_closes_only_expired_clients(stubs, pool):
+    stub = stubs[0]
+    with pool.connection('127.0.0.1', stub.port, 'deploy', 'secret') as client:
+        pass
+
+    assert pool.evict_idle(max_idle=60) == 0
+    assert pool.evict_idle(max_idle=0) == 1
+    assert closed(client)
+
+    with pool.connection('127.0.0.1', stub.port, 'deploy', 'secret'):
+        pass
+    assert stub.connections == 2
+
+
+def test_reaper_evicts_after_idle_ttl(stubs):
+    stub = stubs[0]
+    pool = SSHConnectionPool(idle_ttl=0.1)
+    try:
+        with pool.connection('127.0.0.1', stub.port, 'deploy', 'secret') as client:
+            pass
+        # The reaper wakes at most once a second
+        time.sleep(1.5)
+        assert not pool._idle
+        assert closed(client)
+    finally:
+        pool.close_all()
+
+
+def test_pool_is_usable_after_close_all(stubs, pool):
+    stub = stubs[0]
+    with pool.connection('127.0.0.1', stub.port, 'deploy', 'secret') as held:
+        pool.close_all()
+        assert run(held) == 0
+    # Checked out across close_all: closed on return rather than pooled
+    assert closed(held)
+
+    for _ in range(2):
+        with pool.connection('127.0.0.1', stub.port, 'deploy', 'secret') as client:
+            assert run(client) == 0
+    assert stub.connections == 2
+    assert pool._reaper is not None
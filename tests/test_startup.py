@@ -0,0 +1,26 @@
+import os
+import statistics
+
+import pytest
+
+from benchmarks import startup
+
+TIMING_ENV_VAR = 'YUBIKEY_SSH_MANAGER_TIMING_TESTS'
+
+
+def test_app_import_loads_no_heavy_modules():
+    assert startup.loaded_heavy_modules('app') == []
+
+
+@pytest.mark.skipif(not os.environ.get(TIMING_ENV_VAR),
+                    reason=f"wall-clock limit; set {TIMING_ENV_VAR}=1 to check it")
+def test_app_import_time():
+    import_ms = [startup.import_ms_of(startup.importtime('app')) for _ in range(3)]
+
+    assert statistics.median(import_ms) <= startup.MAX_IMPORT_MS
+
+
+def test_cli_servers_list_loads_no_heavy_modules():
+    _, loaded = startup.cli_list(servers=100)
+
+    assert loaded == []
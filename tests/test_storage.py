@@ -0,0 +1,329 @@
+import json
+import time
+import uuid
+
+import pytest
+
+from application.storage import STORES, JSONInventoryStore, JournaledJSONInventoryStore, SQLiteInventoryStore
+
+
+def server(number, **fields):
+    return dict({'id': f'00000000-0000-0000-0000-{number:012d}', 'name': f'web{number}',
+                 'hostname': f'web{number}.example.com', 'username': 'deploy', 'port': 22,
+                 'yubikey_serials': []}, **fields)
+
+
+def sid(number):
+    return server(number)['id']
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    return tmp_path / 'servers.json'
+
+
+def journal_lines(path):
+    return path.with_suffix('.journal').read_bytes().splitlines(keepends=True)
+
+
+def test_journal_is_replayed_in_order(snapshot):
+    snapshot.write_text(json.dumps([server(1)]))
+    store = JournaledJSONInventoryStore(snapshot)
+    store.add(server(2))
+    store.update(sid(1), {'port': 2222})
+    store.add_serial(sid(2), '111')
+    store.add_serial(sid(2), '222')
+    store.remove_serial(sid(2), '111')
+    store.delete(sid(1))
+    store.apply_batch([{'op': 'add', 'server': server(3)}, {'op': 'update', 'id': sid(3), 'fields': {'name': 'db'}}])
+
+    # The snapshot is untouched; a fresh store rebuilds the state from the journal
+    assert json.loads(snapshot.read_text()) == [server(1)]
+    assert len(journal_lines(snapshot)) == 7
+    assert JournaledJSONInventoryStore(snapshot).all() == [server(2, yubikey_serials=['222']), server(3, name='db')]
+
+
+def test_torn_final_line_is_truncated(snapshot):
+    store = JournaledJSONInventoryStore(snapshot)
+    store.add(server(1))
+    valid = snapshot.with_suffix('.journal').read_bytes()
+    with open(snapshot.with_suffix('.journal'), 'ab') as journal:
+        journal.write(b'{"op":"add","server":{"id":')
+
+    reopened = JournaledJSONInventoryStore(snapshot)
+
+    assert reopened.all() == [server(1)]
+    assert snapshot.with_suffix('.journal').read_bytes() == valid
+    # The next record starts on its own line
+    reopened.add(server(2))
+    assert JournaledJSONInventoryStore(snapshot).all() == [server(1), server(2)]
+
+
+def test_compaction_replaces_the_snapshot_and_truncates_the_journal(snapshot, monkeypatch):
+    import os
+
+    store = JournaledJSONInventoryStore(snapshot)
+    for number in range(1, 4):
+        store.add(server(number))
+    steps = []
+    replace = os.replace
+    monkeypatch.setattr(os, 'replace', lambda src, dst: (steps.append((os.path.basename(src), str(dst))),
+                                                         replace(src, dst)))
+
+    store.compact()
+
+    assert steps == [(f'.servers.json.{os.getpid()}.tmp', str(snapshot))]
+    assert json.loads(snapshot.read_text()) == [server(1), server(2), server(3)]
+    assert snapshot.with_suffix('.journal').read_bytes() == b''
+    assert list(snapshot.parent.glob('.servers.json.*')) == []
+    assert JournaledJSONInventoryStore(snapshot).all() == store.all()
+
+
+def test_compaction_starts_once_the_journal_is_large(snapshot):
+    store = JournaledJSONInventoryStore(snapshot)
+    store.compact_bytes = 200
+    for number in range(1, 6):
+        store.add(server(number))
+
+    deadline = time.monotonic() + 5
+    while snapshot.with_suffix('.journal').stat().st_size and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert len(json.loads(snapshot.read_text())) >= 2
+    assert JournaledJSONInventoryStore(snapshot).all() == [server(number) for number in range(1, 6)]
+
+
+def test_replaying_a_journal_twice_has_no_further_effect(snapshot):
+    store = JournaledJSONInventoryStore(snapshot)
+    store.add(server(1))
+    store.add_serial(sid(1), '111')
+    store.add(server(2))
+    store.delete(sid(2))
+    journal = snapshot.with_suffix('.journal').read_bytes()
+    store.compact()
+    # A crash after the snapshot rename but before the truncation
+    snapshot.with_suffix('.journal').write_bytes(journal)
+
+    assert JournaledJSONInventoryStore(snapshot).all() == [server(1, yubikey_serials=['111'])]
+
+
+def test_json_backend_folds_in_the_journal(snapshot):
+    journaled = JournaledJSONInventoryStore(snapshot)
+    journaled.add(server(1))
+    journaled.add(server(2))
+    assert json.loads(snapshot.read_text()) == []
+
+    plain = JSONInventoryStore(snapshot)
+    assert plain.all() == [server(1), server(2)]
+    assert json.loads(snapshot.read_text()) == [server(1), server(2)]
+    assert snapshot.with_suffix('.journal').read_bytes() == b''
+
+    # A delete through the plain backend must not be undone by a later replay
+    plain.delete(sid(1))
+    assert JournaledJSONInventoryStore(snapshot).all() == [server(2)]
+
+
+def test_json_backend_sees_records_appended_later(snapshot):
+    plain = JSONInventoryStore(snapshot)
+    journaled = JournaledJSONInventoryStore(snapshot)
+    journaled.add(server(1))
+    assert plain.all() == [server(1)]
+
+    journaled.delete(sid(1))
+    plain.add(server(2))
+
+    assert JournaledJSONInventoryStore(snapshot).all() == [server(2)]
+
+
+def test_sqlite_import_includes_the_journal(snapshot):
+    journaled = JournaledJSONInventoryStore(snapshot)
+    journaled.add(server(1))
+    journaled.add_serial(sid(1), '111')
+    assert json.loads(snapshot.read_text()) == []
+
+    store = SQLiteInventoryStore(snapshot.with_name('servers.db'))
+
+    assert store.all() == [server(1, yubikey_serials=['111'])]
+
+
+@pytest.fixture(params=sorted(STORES))
+def backend(request):
+    return request.param
+
+
+@pytest.fixture
+def open_backend(tmp_path, backend):
+    """Open a new store object for the backend's file, as another process would."""
+    def make():
+        filename, store_class = STORES[backend]
+        return store_class(tmp_path / filename)
+    return make
+
+
+def test_changes_by_another_writer_are_seen(open_backend):
+    store, other = open_backend(), open_backend()
+    store.add(server(1))
+    assert other.get(sid(1))['name'] == 'web1'
+
+    other.update(sid(1), {'hostname': 'moved.example.com'})
+    other.add(server(2))
+
+    assert store.get(sid(1))['hostname'] == 'moved.example.com'
+    assert [s['id'] for s in store.find_by_hostname('web2.example.com')] == [sid(2)]
+
+
+def rewrite(path, text, keep_mtime=False, new_inode=False):
+    import os
+
+    stat = path.stat()
+    if new_inode:
+        tmp = path.with_name('replacement')
+        tmp.write_text(text)
+        os.replace(tmp, path)
+    else:
+        path.write_text(text)
+    if keep_mtime:
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    else:
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+@pytest.mark.parametrize('store_class', [JSONInventoryStore, JournaledJSONInventoryStore])
+@pytest.mark.parametrize('change', [
+    # Only one part of the (mtime, size, inode) signature changes in each case
+    dict(name='web9', keep_mtime=False),
+    dict(name='web10', keep_mtime=True),
+    dict(name='web9', keep_mtime=True, new_inode=True),
+])
+def test_json_file_is_reloaded_when_its_signature_changes(snapshot, store_class, change):
+    snapshot.write_text(json.dumps([server(1)]))
+    store = store_class(snapshot)
+    assert store.get(sid(1))['name'] == 'web1'
+
+    change = dict(change)
+    name = change.pop('name')
+    rewrite(snapshot, json.dumps([server(1, name=name)]), **change)
+
+    assert store.get(sid(1))['name'] == name
+
+
+@pytest.mark.parametrize('store_class', [JSONInventoryStore, JournaledJSONInventoryStore])
+def test_unchanged_json_file_is_not_parsed_again(snapshot, store_class, monkeypatch):
+    store = store_class(snapshot)
+    store.add(server(1))
+    loads = []
+    load = store._load
+    monkeypatch.setattr(store, '_load', lambda: (loads.append(1), load()))
+
+    for _ in range(3):
+        store.all()
+        store.get(sid(1))
+        store.find_by_serial('111')
+    store.add_serial(sid(1), '111')
+    store.find_by_serial('111')
+
+    assert loads == []
+
+
+def test_lookups_follow_mutations(open_backend):
+    store = open_backend()
+    store.add(server(1))
+    store.add(server(2))
+
+    store.update(sid(1), {'hostname': 'WEB2.example.com'})
+    assert [s['id'] for s in store.find_by_hostname('web2.example.com')] == [sid(1), sid(2)]
+    assert store.find_by_hostname('web1.example.com') == []
+
+    store.add_serial(sid(1), '111')
+    store.add_serial(sid(2), '111')
+    store.add_serial(sid(2), '222')
+    assert [s['id'] for s in store.find_by_serial('111')] == [sid(1), sid(2)]
+    assert store.get(sid(2))['yubikey_serials'] == ['111', '222']
+
+    store.remove_serial(sid(1), '111')
+    store.delete(sid(2))
+    assert store.find_by_serial('111') == []
+    assert store.find_by_serial('222') == []
+    assert [s['id'] for s in store.find_by_hostname('web2.example.com')] == [sid(1)]
+    assert store.get(sid(2)) is None
+
+
+def test_mutations_survive_a_reopen(open_backend):
+    store = open_backend()
+    store.add(server(1, proxy_jump='bastion'))
+    store.add(server(2))
+    store.apply_batch([{'op': 'add_serial', 'id': sid(1), 'serial': '111'},
+                       {'op': 'update', 'id': sid(2), 'fields': {'port': 2222}},
+                       {'op': 'delete', 'id': sid(2)},
+                       {'op': 'add', 'server': server(3)}])
+
+    reopened = open_backend()
+
+    assert [s['id'] for s in reopened.all()] == [sid(1), sid(3)]
+    assert reopened.get(sid(1))['yubikey_serials'] == ['111']
+    assert reopened.get(sid(1))['proxy_jump'] == 'bastion'
+
+
+def test_sqlite_imports_servers_json_only_once(snapshot):
+    snapshot.write_text(json.dumps([server(1), server(2)]))
+    database = snapshot.with_name('servers.db')
+    store = SQLiteInventoryStore(database)
+    assert [s['id'] for s in store.all()] == [sid(1), sid(2)]
+
+    store.delete(sid(1))
+    snapshot.write_text(json.dumps([server(1), server(2), server(3)]))
+    reopened = SQLiteInventoryStore(database)
+
+    # Neither the deleted server nor the later servers.json edit comes back
+    assert [s['id'] for s in reopened.all()] == [sid(2)]
+    assert reopened._conn.execute("SELECT value FROM meta WHERE key = 'json_imported'").fetchone()[0] == '2'
+
+
+def test_sqlite_import_normalizes_ids(snapshot):
+    snapshot.write_text(json.dumps([server(1, id=sid(1).upper()), server(2, id='not-a-uuid'),
+                                    {k: v for k, v in server(3).items() if k != 'id'}]))
+
+    servers = SQLiteInventoryStore(snapshot.with_name('servers.db')).all()
+
+    assert servers[0]['id'] == sid(1)
+    for imported in servers[1:]:
+        assert str(uuid.UUID(imported['id'])) == imported['id']
+    assert len({s['id'] for s in servers}) == 3
+
+
+def test_sqlite_round_trips_extra_fields(tmp_path):
+    store = SQLiteInventoryStore(tmp_path / 'servers.db')
+    store.add(server(1, yubikey_serials=['111'], proxy_jump='bastion', import_source='ssh_config',
+                     labels={'env': ['prod']}))
+    store.update(sid(1), {'ssh_alias': 'web', 'port': 2222, 'proxy_jump': None})
+
+    assert SQLiteInventoryStore(tmp_path / 'servers.db').get(sid(1)) == server(
+        1, yubikey_serials=['111'], port=2222, proxy_jump=None, import_source='ssh_config',
+        labels={'env': ['prod']}, ssh_alias='web')
+
+
+def test_sqlite_keeps_serial_order(tmp_path):
+    store = SQLiteInventoryStore(tmp_path / 'servers.db')
+    store.add(server(1, yubikey_serials=['333', '111']))
+    store.add_serial(sid(1), '222')
+    store.add_serial(sid(1), '111')
+    assert store.get(sid(1))['yubikey_serials'] == ['333', '111', '222']
+
+    store.remove_serial(sid(1), '111')
+    store.add_serial(sid(1), '111')
+    assert store.get(sid(1))['yubikey_serials'] == ['333', '222', '111']
+
+    store.update(sid(1), {'yubikey_serials': ['222', '333']})
+    assert store.get(sid(1))['yubikey_serials'] == ['222', '333']
+
+
+def test_sqlite_delete_cascades_to_serials(tmp_path):
+    store = SQLiteInventoryStore(tmp_path / 'servers.db')
+    store.add(server(1, yubikey_serials=['111', '222']))
+    store.add(server(2, yubikey_serials=['111']))
+
+    store.delete(sid(1))
+
+    rows = store._conn.execute('SELECT server_id, serial FROM server_yubikeys').fetchall()
+    assert [tuple(row) for row in rows] == [(sid(2), '111')]
+    assert [s['id'] for s in store.find_by_serial('111')] == [sid(2)]
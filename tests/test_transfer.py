@@ -0,0 +1,127 @@
+import json
+
+import pytest
+
+from application import transfer
+from application.storage import STORES, open_store
+
+SERVERS = [
+    {'id': f'00000000-0000-0000-0000-{number:012d}', 'name': f'web{number}', 'hostname': f'web{number}.example.com',
+     'username': 'deploy', 'port': 22, 'yubikey_serials': ['12345678'] if number % 2 else []}
+    for number in range(1, 6)
+]
+
+
+@pytest.fixture(params=sorted(STORES))
+def store_of(request, tmp_path):
+    """Open a fresh store of each backend in its own directory."""
+    def make(name: str):
+        (tmp_path / name).mkdir()
+        return open_store(tmp_path / name, request.param)
+    return make
+
+
+@pytest.fixture(params=['orjson', 'json'])
+def serializer(request, monkeypatch):
+    if request.param == 'orjson':
+        pytest.importorskip('orjson')
+    else:
+        monkeypatch.setattr(transfer, 'orjson', None)
+    return request.param
+
+
+def filled(store, servers=SERVERS):
+    store.apply_batch([{'op': 'add', 'server': dict(server)} for server in servers])
+    return store
+
+
+def inventory(store):
+    # yubikey_serials is optional in a record; SQLite leaves it out when empty
+    return sorted((dict({'yubikey_serials': []}, **server) for server in store.all()), key=lambda s: s['id'])
+
+
+def export_lines(store):
+    return b''.join(transfer.export_servers(store)).splitlines()
+
+
+def test_round_trip_keeps_ids_and_fields(store_of, serializer):
+    source = filled(store_of('source'))
+    target = store_of('target')
+
+    results = list(transfer.import_servers(target, export_lines(source)))
+
+    assert results[-1] == {"summary": True, "success": True, "added": 5, "duplicate": 0, "invalid": 0}
+    assert [result['id'] for result in results[:-1]] == [server['id'] for server in SERVERS]
+    assert inventory(target) == SERVERS
+
+
+def test_export_is_one_json_object_per_line(store_of, monkeypatch):
+    monkeypatch.setattr(transfer, 'EXPORT_BUFFER_BYTES', 200)
+    store = filled(store_of('source'))
+
+    chunks = list(transfer.export_servers(store))
+
+    assert len(chunks) > 1 and all(chunk.endswith(b'\n') for chunk in chunks)
+    assert [json.loads(line)['name'] for line in b''.join(chunks).splitlines()] == [s['name'] for s in SERVERS]
+
+
+def test_duplicates_and_invalid_lines_are_reported(store_of):
+    store = filled(store_of('target'), SERVERS[:1])
+    lines = [
+        json.dumps({'name': 'again', 'hostname': 'WEB1.example.com', 'username': 'deploy'}),
+        '',
+        '{not json',
+        json.dumps({'name': 'nohost', 'username': 'deploy'}),
+        json.dumps({'name': 'badport', 'hostname': 'x', 'username': 'deploy', 'port': 'ssh'}),
+        json.dumps({'name': 'new', 'hostname': 'new.example.com', 'username': 'deploy'}),
+        json.dumps({'name': 'new twice', 'hostname': 'new.example.com', 'username': 'deploy', 'port': '22'}),
+    ]
+
+    results = list(transfer.import_servers(store, lines))
+
+    assert [(result['line'], result['status']) for result in results[:-1]] == [
+        (1, 'duplicate'), (3, 'invalid'), (4, 'invalid'), (5, 'invalid'), (6, 'added'), (7, 'duplicate')]
+    assert results[2]['message'] == "missing hostname"
+    assert results[-1] == {"summary": True, "success": False, "added": 1, "duplicate": 2, "invalid": 3}
+    assert store.count() == 2
+
+
+def test_taken_or_malformed_ids_are_replaced(store_of):
+    store = filled(store_of('target'), SERVERS[:1])
+    lines = [
+        json.dumps({**SERVERS[1], 'id': SERVERS[0]['id']}),
+        json.dumps({**SERVERS[2], 'id': 'not-a-uuid'}),
+        json.dumps({**SERVERS[3], 'id': SERVERS[3]['id'].upper()}),
+    ]
+
+    added = [result['id'] for result in list(transfer.import_servers(store, lines))[:-1]]
+
+    assert added[0] != SERVERS[0]['id'] and added[1] != 'not-a-uuid'
+    assert added[2] == SERVERS[3]['id']
+    assert len({server['id'] for server in store.all()}) == 4
+
+
+def test_import_writes_in_chunks(store_of):
+    store = store_of('target')
+    batches = []
+    apply_batch = store.apply_batch
+    store.apply_batch = lambda records: (batches.append(len(records)), apply_batch(records))
+
+    results = transfer.import_servers(store, [json.dumps(server) for server in SERVERS], chunk_size=2)
+    first = next(results)
+
+    # A result is only yielded once its chunk has been written
+    assert first['status'] == 'added' and batches == [2]
+    list(results)
+    assert batches == [2, 2, 1]
+
+
+def test_import_and_export_routes(client, manager):
+    body = b''.join(json.dumps(server).encode() + b'\n' for server in SERVERS)
+
+    results = [json.loads(line) for line in client.post('/api/servers/import', data=body).data.splitlines()]
+    exported = client.get('/api/servers/export')
+
+    assert results[-1]['added'] == 5
+    assert exported.mimetype == 'application/x-ndjson'
+    assert [dict({'yubikey_serials': []}, **json.loads(line)) for line in exported.data.splitlines()] == SERVERS